@@ -0,0 +1,20 @@
+import math
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+from app.services.resilience import BackendUnavailable, CIRCUIT_RESET_SECONDS
+
+
+def retry_after_header(exc: BackendUnavailable):
+    """Retry-After header for a 503, using the backend's own hint when it gave one."""
+    retry_after = exc.retry_after if exc.retry_after is not None else CIRCUIT_RESET_SECONDS
+    return {"Retry-After": str(max(math.ceil(retry_after), 1))}
+
+
+def service_unavailable(exc: BackendUnavailable):
+    """HTTPException for routers to raise when a backend is unavailable."""
+    return HTTPException(status_code=503, detail=str(exc), headers=retry_after_header(exc))
+
+
+async def backend_unavailable_handler(request, exc):
+    """Exception handler turning BackendUnavailable into a 503 with Retry-After."""
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers=retry_after_header(exc))
@@ -0,0 +1,126 @@
+import asyncio
+import os
+import zipfile
+from functools import partial
+from typing import List
+from fastapi import APIRouter, Depends, File, UploadFile, HTTPException
+from app.services.async_form_extraction import AsyncW9FormExtraction
+from app.services.rate_limiter import tenant_rate_limiter
+from app.api.tenant_auth import authenticated_tenant
+from app.configuration.logger_setup import Logger
+
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "500"))
+BATCH_MAX_FILE_BYTES = int(os.getenv("BATCH_MAX_FILE_BYTES", str(20 * 1024 * 1024)))
+# Whole multipart request to /batch; replaces the app-wide single-upload limit for this route
+BATCH_MAX_BODY_BYTES = int(os.getenv("BATCH_MAX_BODY_BYTES", str(512 * 1024 * 1024)))
+
+router = APIRouter()
+w9_form_extractor = AsyncW9FormExtraction()
+
+
+def open_zip(filename, stream):
+    """
+    Opens a zip archive and plans its members from the directory alone, in archive order:
+    the ZipInfo of each PDF to extract, or a failure entry for anything skipped.
+    The caller closes the archive once the members have been read.
+    """
+    archive = zipfile.ZipFile(stream)
+    entries = []
+    for member in archive.infolist():
+        if member.is_dir():
+            continue
+        member_name = f"{filename}/{member.filename}"
+        if not member.filename.lower().endswith(".pdf"):
+            entries.append({"filename": member_name, "status": "failed", "error": "Only PDF files are allowed."})
+        elif member.file_size > BATCH_MAX_FILE_BYTES:
+            entries.append({"filename": member_name, "status": "failed", "error": "File exceeds the maximum allowed size."})
+        else:
+            entries.append(member)
+    return archive, entries
+
+
+async def extract_one(filename, read, tenant_id, semaphore):
+    """
+    Reads and extracts a single batch member; failures are reported in the entry instead of raised.
+
+    read() returns the PDF's bytes. It is only awaited under the semaphore, so no more
+    than BATCH_MAX_CONCURRENCY files of the batch are in memory at once.
+    """
+    async with semaphore:
+        try:
+            file_bytes = await read()
+            if len(file_bytes) > BATCH_MAX_FILE_BYTES:
+                return {"filename": filename, "status": "failed", "error": "File exceeds the maximum allowed size."}
+            await tenant_rate_limiter.acquire(tenant_id)
+            extracted_data = await w9_form_extractor.extract_form_bytes(file_bytes)
+        except Exception as e:
+            Logger.error("Batch extraction failed for %s: %s", filename, e)
+            return {"filename": filename, "status": "failed", "error": str(e)}
+
+    if not isinstance(extracted_data, dict) or "error" in extracted_data:
+        error = extracted_data.get("error") if isinstance(extracted_data, dict) else str(extracted_data)
+        return {"filename": filename, "status": "failed", "error": error}
+    return {"filename": filename, "status": "succeeded", "extracted_data": extracted_data}
+
+
+@router.post("/batch")
+async def extract_w9_batch(files: List[UploadFile] = File(...), tenant_id: str = Depends(authenticated_tenant)):
+    """
+    Extracts many W9 PDFs in one request. Accepts any mix of PDFs and zip archives of PDFs.
+
+    Files are extracted concurrently (at most BATCH_MAX_CONCURRENCY at a time,
+    paced by the tenant's rate limit) and each one gets its own result entry,
+    in the order the files (and the members of each zip) were sent.
+    The batch is checked against BATCH_MAX_FILES before any file is read.
+    """
+    if len(files) > BATCH_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"A batch may contain at most {BATCH_MAX_FILES} PDF files.")
+
+    # Starlette has spooled every upload; count the PDFs from the zip directories before reading any of them.
+    # entries holds, in input order, a result entry or the (filename, read) of a PDF still to extract.
+    entries, archives, file_count = [], [], 0
+    try:
+        for upload in files:
+            filename = upload.filename or "unnamed"
+            if filename.lower().endswith(".zip"):
+                try:
+                    archive, members = await asyncio.to_thread(open_zip, filename, upload.file)
+                except zipfile.BadZipFile:
+                    entries.append({"filename": filename, "status": "failed", "error": "Invalid zip archive."})
+                    continue
+                archives.append(archive)
+                for member in members:
+                    if isinstance(member, dict):
+                        entries.append(member)
+                    else:
+                        entries.append((f"{filename}/{member.filename}", partial(asyncio.to_thread, archive.read, member)))
+                        file_count += 1
+            elif not filename.lower().endswith(".pdf"):
+                entries.append({"filename": filename, "status": "failed", "error": "Only PDF files are allowed."})
+            elif upload.size is not None and upload.size > BATCH_MAX_FILE_BYTES:
+                entries.append({"filename": filename, "status": "failed", "error": "File exceeds the maximum allowed size."})
+            else:
+                entries.append((filename, upload.read))
+                file_count += 1
+            if file_count > BATCH_MAX_FILES:
+                raise HTTPException(status_code=413, detail=f"A batch may contain at most {BATCH_MAX_FILES} PDF files.")
+
+        Logger.info("Extracting batch of %s PDFs for tenant %s", file_count, tenant_id)
+        semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+
+        async def result(entry):
+            return entry if isinstance(entry, dict) else await extract_one(*entry, tenant_id, semaphore)
+
+        results = await asyncio.gather(*(result(entry) for entry in entries))
+    finally:
+        for archive in archives:
+            archive.close()
+
+    succeeded = sum(1 for entry in results if entry["status"] == "succeeded")
+    return {
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "results": results,
+    }
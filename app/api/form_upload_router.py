@@ -1,37 +1,54 @@
-import tempfile
-from pathlib import Path
-from fastapi import APIRouter, File, UploadFile, HTTPException
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, File, Header, UploadFile, HTTPException
 from fastapi.responses import JSONResponse
-from app.services.form_extraction import W9FormExtraction
+from app.services.async_form_extraction import AsyncW9FormExtraction
+from app.services.upload_stream import hash_stream, detach_upload, UploadTooLarge, MAX_UPLOAD_BYTES
+from app.services.metrics import track_stage
+from app.services.resilience import BackendUnavailable
+from app.services.request_coalescer import IdempotencyKeyReused
+from app.services.image_normalization import IMAGE_SUFFIXES
+from app.api.backend_errors import service_unavailable
 from app.configuration.logger_setup import Logger
 
 router = APIRouter()
-w9_form_extractor = W9FormExtraction()
+w9_form_extractor = AsyncW9FormExtraction()
 
 @router.post("/")
-def extract_w9_form_data(file: UploadFile = File(...)):
+async def extract_w9_form_data(file: UploadFile = File(...), idempotency_key: Optional[str] = Header(None)):
 
     try:
 
-        if not file.filename.endswith(".pdf"):
-            raise HTTPException(status_code=400, detail="Only PDF files are allowed.")
-        
+        if not file.filename.lower().endswith((".pdf",) + IMAGE_SUFFIXES):
+            raise HTTPException(status_code=400, detail="Only PDF, PNG, JPEG or TIFF files are allowed.")
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
-            temp_file.write(file.file.read())  
-            temp_file_path = temp_file.name 
+        if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+            raise UploadTooLarge(MAX_UPLOAD_BYTES)
 
-        Logger.info("✅ PDF Uploaded Successfully. Extracting data now...")
-        extracted_data = w9_form_extractor.extract_form_data(temp_file_path)
+        # Starlette has already spooled the upload; hash it in place and hand that same stream to Azure
+        with track_stage("upload_hash"):
+            digest = await asyncio.to_thread(hash_stream, file.file)
+
+        Logger.info("✅ File Uploaded Successfully. Extracting data now...")
+        extracted_data = await w9_form_extractor.extract_document(detach_upload(file), digest, idempotency_key)
         Logger.info("✅ Data Extraction Complete.")
-  
-        Path(temp_file_path).unlink(missing_ok=True)
 
         return JSONResponse(content=extracted_data)
 
        
     
-    except Exception as e:
-        print (f" Error occurred: {str(e)}")
-        return f"An error occurred : {str(e)}"
+    except HTTPException:
+        raise
+
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
 
+    except IdempotencyKeyReused as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    except BackendUnavailable as e:
+        raise service_unavailable(e)
+
+    except Exception as e:
+        Logger.error("Error occurred: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail=f"An error occurred : {str(e)}")
@@ -0,0 +1,56 @@
+import threading
+from typing import Optional
+from fastapi import APIRouter, File, Form, UploadFile, HTTPException
+from fastapi.responses import JSONResponse
+from app.services.job_queue import JobQueue, InvalidWebhookUrl
+from app.services.upload_stream import MAX_UPLOAD_BYTES
+from app.configuration.logger_setup import Logger
+
+router = APIRouter()
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Opens this process's connection to the job queue on first use, so gunicorn workers never share one forked from the master."""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue()
+    return _job_queue
+
+
+@router.post("/jobs", status_code=202)
+def submit_extraction_job(file: UploadFile = File(...), webhook_url: Optional[str] = Form(None)):
+    """
+    Queues a W9 PDF for extraction and returns its job id immediately.
+
+    Poll GET /jobs/{job_id} for the result, or pass webhook_url (https, on a host in
+    WEBHOOK_ALLOWED_HOSTS) to be told when the job finishes. Jobs are run by
+    `python -m app.services.job_queue`.
+    """
+    if not file.filename.endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="Only PDF files are allowed.")
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds the maximum allowed size of {MAX_UPLOAD_BYTES} bytes.")
+
+    try:
+        job_id = get_job_queue().submit(file.file.read(), filename=file.filename, webhook_url=webhook_url)
+    except InvalidWebhookUrl as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    Logger.info("Queued extraction job %s for %s", job_id, file.filename)
+    return JSONResponse(status_code=202, content={"job_id": job_id, "status": "queued"})
+
+
+@router.get("/jobs/metrics")
+def job_metrics():
+    """Queue depth and job latency percentiles."""
+    return get_job_queue().metrics()
+
+
+@router.get("/jobs/{job_id}")
+def get_extraction_job(job_id: str):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
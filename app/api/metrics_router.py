@@ -0,0 +1,60 @@
+import os
+import time
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, REGISTRY, generate_latest
+from prometheus_client import multiprocess
+from app.services.metrics import REQUEST_SECONDS, REQUESTS_IN_FLIGHT, cache_stats_collector
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+def metrics():
+    """
+    Prometheus scrape endpoint: per-stage latency histograms, in-flight gauges,
+    error counts and cache lookups. Under gunicorn, set PROMETHEUS_MULTIPROC_DIR
+    so every worker's samples are aggregated into each scrape.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        # Collected at scrape time rather than written to the shared files, so these describe the worker that answered
+        registry.register(cache_stats_collector)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording HTTP latency by method, route template and status,
+    plus the number of requests in flight.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            # The router stores the matched route in the scope; label by its template so /jobs/{job_id} is one series
+            route = scope.get("route")
+            REQUEST_SECONDS.labels(scope["method"], route.path if route is not None else "unmatched", str(status)).observe(
+                time.perf_counter() - start
+            )
@@ -0,0 +1,46 @@
+import asyncio
+from fastapi import APIRouter, File, UploadFile, HTTPException
+from fastapi.responses import JSONResponse
+from app.services.async_form_extraction import AsyncW9FormExtraction
+from app.services.upload_stream import hash_stream, detach_upload, UploadTooLarge, MAX_UPLOAD_BYTES
+from app.services.metrics import track_stage
+from app.services.resilience import BackendUnavailable
+from app.api.backend_errors import service_unavailable
+from app.configuration.logger_setup import Logger
+
+router = APIRouter()
+w9_form_extractor = AsyncW9FormExtraction()
+
+@router.post("/packet")
+async def extract_w9_packet(file: UploadFile = File(...)):
+    """Extracts every W9 of a multi-page PDF, returning one record per form with the pages it was found on."""
+
+    try:
+
+        if not file.filename.endswith(".pdf"):
+            raise HTTPException(status_code=400, detail="Only PDF files are allowed.")
+
+        if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+            raise UploadTooLarge(MAX_UPLOAD_BYTES)
+
+        with track_stage("upload_hash"):
+            digest = await asyncio.to_thread(hash_stream, file.file)
+
+        Logger.info("✅ Packet Uploaded Successfully. Extracting data now...")
+        extracted_data = await w9_form_extractor.extract_packet(detach_upload(file), digest)
+        Logger.info("✅ Packet Extraction Complete.")
+
+        return JSONResponse(content=extracted_data)
+
+    except HTTPException:
+        raise
+
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    except BackendUnavailable as e:
+        raise service_unavailable(e)
+
+    except Exception as e:
+        Logger.error("Error occurred: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail=f"An error occurred : {str(e)}")
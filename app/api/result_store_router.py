@@ -0,0 +1,51 @@
+import sqlite3
+from typing import Optional
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel, Field
+from app.services.result_store import result_store, RESULT_STORE_QUERY_LIMIT
+from app.configuration.logger_setup import Logger
+
+router = APIRouter()
+
+
+class ResultQuery(BaseModel):
+    # Sent in the body rather than the URL so TINs do not end up in access logs
+    tin: Optional[str] = None
+    name: Optional[str] = None
+    name_prefix: Optional[str] = None
+    revision: Optional[str] = None
+    limit: int = Field(20, ge=1, le=RESULT_STORE_QUERY_LIMIT)
+
+
+def _query(**filters):
+    if result_store is None:
+        raise HTTPException(status_code=404, detail="The result store is disabled (RESULT_STORE_DB_PATH or RESULT_STORE_TIN_KEY is empty).")
+    try:
+        return result_store.query(**filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except sqlite3.Error as e:
+        Logger.error("Result store query failed: %s", e)
+        raise HTTPException(status_code=500, detail="Result store query failed.")
+
+
+@router.post("/results/search")
+def search_results(query: ResultQuery):
+    """
+    Looks up stored extraction results by EIN/SSN, entity name (exact or
+    prefix, ignoring case and punctuation) and form revision, newest first.
+    Every given filter must match. Returned TINs are redacted.
+    """
+    filters = query.model_dump(exclude={"limit"}, exclude_none=True)
+    if not filters:
+        raise HTTPException(status_code=400, detail="Pass at least one of tin, name, name_prefix or revision.")
+    return {"results": _query(limit=query.limit, **filters)}
+
+
+@router.get("/results/{document_hash}")
+def get_result(document_hash: str):
+    """The stored results of one document, by the SHA-256 of the uploaded file."""
+    results = _query(document_hash=document_hash)
+    if not results:
+        raise HTTPException(status_code=404, detail="No stored result for this document.")
+    return {"results": results}
@@ -0,0 +1,23 @@
+import hmac
+import os
+from typing import Optional
+from fastapi import Header, HTTPException, Request
+
+# "key1:tenant-a,key2:tenant-b"; when set, batch callers must send one of the keys in X-API-Key
+TENANT_API_KEYS = dict(
+    entry.strip().split(":", 1) for entry in os.getenv("TENANT_API_KEYS", "").split(",") if ":" in entry
+)
+
+
+def authenticated_tenant(request: Request, x_api_key: Optional[str] = Header(None)):
+    """
+    The tenant a request is paced as: the one its X-API-Key belongs to, or, when no
+    keys are configured, the client address. Never a value the caller can simply choose.
+    """
+    if not TENANT_API_KEYS:
+        return f"ip:{request.client.host}" if request.client else "ip:unknown"
+    if x_api_key:
+        for api_key, tenant_id in TENANT_API_KEYS.items():
+            if hmac.compare_digest(api_key.encode(), x_api_key.encode()):
+                return tenant_id
+    raise HTTPException(status_code=401, detail="A valid X-API-Key header is required.")
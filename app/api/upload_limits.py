@@ -0,0 +1,69 @@
+from starlette.responses import JSONResponse
+from app.services.upload_stream import UploadTooLarge, MAX_UPLOAD_BYTES
+
+
+async def upload_too_large_handler(request, exc):
+    """Exception handler turning UploadTooLarge into a 413 response."""
+    return JSONResponse(status_code=413, content={"detail": str(exc)})
+
+
+class MaxBodySizeMiddleware:
+    """
+    ASGI middleware that rejects request bodies larger than max_bytes with a 413.
+
+    route_max_bytes maps request paths to their own limit (e.g. a batch
+    endpoint taking many files); every other path gets max_bytes.
+    A declared Content-Length is checked before any of the body is read;
+    chunked bodies are counted as they arrive. Once one goes over the limit
+    the middleware answers 413 itself and the app only sees a disconnect:
+    an exception raised from receive() would be caught by the app's own body
+    parsing and turned into some other error.
+    """
+
+    def __init__(self, app, max_bytes=MAX_UPLOAD_BYTES, route_max_bytes=None):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.route_max_bytes = route_max_bytes or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Runs before routing, so the limit is looked up by the raw path
+        max_bytes = self.route_max_bytes.get(scope["path"].rstrip("/") or "/", self.max_bytes)
+        too_large = JSONResponse(status_code=413, content={"detail": str(UploadTooLarge(max_bytes))})
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > max_bytes:
+            await too_large(scope, receive, send)
+            return
+
+        received = 0
+        rejected = False
+        answered = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, rejected, answered
+            if rejected:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    rejected = True
+                    if not response_started:
+                        await too_large(scope, receive, send)
+                        answered = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            if answered:
+                return  # the 413 has been sent; whatever the app answers to the disconnect is dropped
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        await self.app(scope, limited_receive, guarded_send)
@@ -0,0 +1,10 @@
+from dotenv import load_dotenv
+
+
+def load_environment():
+    """
+    Loads .env into the process environment. Entry points call it before
+    importing the app modules, which read their settings when first imported;
+    variables already set in the environment win.
+    """
+    load_dotenv()
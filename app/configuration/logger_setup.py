@@ -1,52 +1,201 @@
+import atexit
+import json
 import logging
+import os
+import queue
+import re
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" writes one JSON object per line for log aggregation; "text" keeps the classic human-readable lines
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# W9 taxpayer identification numbers: SSNs (123-45-6789) and EINs (12-3456789), dashed, spaced or bare
+TIN_PATTERN = re.compile(r"\b(?:\d{3}[- ]?\d{2}[- ]?\d{4}|\d{2}[- ]?\d{7})\b")
+TIN_REDACTION = "[REDACTED TIN]"
+
+# Attributes every LogRecord has; anything else was passed as a structured field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def redact(text):
+    """Masks every SSN/EIN-shaped number in text."""
+    return TIN_PATTERN.sub(TIN_REDACTION, text)
+
+
+class RedactionFilter(logging.Filter):
+    """Masks SSNs and EINs in the rendered message and in string fields before a record is written anywhere."""
+
+    def filter(self, record):
+        record.msg = redact(record.getMessage())
+        record.args = None
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and isinstance(value, str):
+                setattr(record, key, redact(value))
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object, including any fields passed to Logger as keyword arguments."""
+
+    def format(self, record):
+        entry = {
+            "timestamp": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
 
 class Logger:
-    """Logger class with static methods for info and error logging."""
-    
+    """
+    Logger class with static methods for leveled logging.
+
+    Messages take %-style arguments that are only interpolated when the level
+    is enabled (`Logger.debug("payload: %s", payload)`), and keyword arguments
+    become structured fields. Records are handed to a queue and written by a
+    background listener thread, so slow log I/O never blocks a request, and
+    SSNs/EINs are redacted on the way out.
+    """
+
+    _loggers = {}
+    _lock = threading.Lock()
+    _queue_handler = None
+    _listener = None
+
+    @staticmethod
+    def _build_output_handler():
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+        handler.addFilter(RedactionFilter())
+        return handler
+
+    @staticmethod
+    def _start_listener():
+        log_queue = queue.SimpleQueue()
+        if Logger._queue_handler is None:
+            Logger._queue_handler = QueueHandler(log_queue)
+        else:
+            Logger._queue_handler.queue = log_queue
+        Logger._listener = QueueListener(log_queue, Logger._build_output_handler(), respect_handler_level=True)
+        Logger._listener.start()
+
+    @staticmethod
+    def _stop_listener():
+        if Logger._listener is not None:
+            Logger._listener.stop()
+            Logger._listener = None
+
     @staticmethod
-    def setup_logger(name: str = __name__, level: int = logging.INFO) -> logging.Logger:
+    def configure(level: str = LOG_LEVEL) -> None:
+        """Routes the root logger through the queue listener. Safe to call repeatedly; only the first call acts."""
+        with Logger._lock:
+            if Logger._queue_handler is not None:
+                return
+            Logger._start_listener()
+            root = logging.getLogger()
+            root.addHandler(Logger._queue_handler)
+            root.setLevel(level)
+            atexit.register(Logger._stop_listener)
+            # The listener thread does not survive fork (gunicorn workers), so each child starts its own
+            os.register_at_fork(after_in_child=Logger._start_listener)
+
+    @staticmethod
+    def setup_logger(name: str = __name__, level: int = None) -> logging.Logger:
         """
-        Sets up and returns a logger with the specified name and log level.
-        
+        Returns the cached logger with the specified name, configuring logging on first use.
+
         Args:
             name (str): Name of the logger. Defaults to __name__.
-            level (int): Logging level. Defaults to logging.INFO.
-        
+            level (int): Optional level override for this logger.
+
         Returns:
             logging.Logger: Configured logger instance.
         """
-        logger = logging.getLogger(name)
-        if not logger.hasHandlers():
-            logging.basicConfig(
-                level=level,
-                format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-            )
+        logger = Logger._loggers.get(name)
+        if logger is None:
+            Logger.configure()
+            logger = logging.getLogger(name)
+            if level is not None:
+                logger.setLevel(level)
+            Logger._loggers[name] = logger
         return logger
 
     @staticmethod
-    def info(message: str, name: str = __name__) -> None:
+    def is_enabled(level: int, name: str = __name__) -> bool:
+        """Whether a message at level would be written; check before building an expensive message."""
+        return Logger.setup_logger(name).isEnabledFor(level)
+
+    @staticmethod
+    def _log(level, message, args, name, fields):
+        logger = Logger.setup_logger(name)
+        if logger.isEnabledFor(level):
+            exc_info = fields.pop("exc_info", None)
+            logger.log(level, message, *args, exc_info=exc_info, extra=fields or None, stacklevel=3)
+
+    @staticmethod
+    def debug(message: str, *args, name: str = __name__, **fields) -> None:
+        """
+        Logs a debug message, e.g. full payloads that are too large for INFO.
+
+        Args:
+            message (str): The message, with optional %-style placeholders.
+            *args: Values for the placeholders, interpolated only if DEBUG is enabled.
+            name (str): Name of the logger. Defaults to __name__.
+            **fields: Structured fields added to the record.
+        """
+        Logger._log(logging.DEBUG, message, args, name, fields)
+
+    @staticmethod
+    def info(message: str, *args, name: str = __name__, **fields) -> None:
         """
         Logs an informational message.
-        
+
         Args:
-            message (str): The message to log.
+            message (str): The message, with optional %-style placeholders.
+            *args: Values for the placeholders, interpolated only if INFO is enabled.
             name (str): Name of the logger. Defaults to __name__.
+            **fields: Structured fields added to the record.
         """
-        logger = Logger.setup_logger(name)
-        logger.info(message)
+        Logger._log(logging.INFO, message, args, name, fields)
+
+    @staticmethod
+    def warning(message: str, *args, name: str = __name__, **fields) -> None:
+        """
+        Logs a warning message.
+
+        Args:
+            message (str): The message, with optional %-style placeholders.
+            *args: Values for the placeholders.
+            name (str): Name of the logger. Defaults to __name__.
+            **fields: Structured fields added to the record.
+        """
+        Logger._log(logging.WARNING, message, args, name, fields)
 
     @staticmethod
-    def error(message: str, name: str = __name__) -> None:
+    def error(message: str, *args, name: str = __name__, **fields) -> None:
         """
         Logs an error message.
-        
+
         Args:
-            message (str): The message to log.
+            message (str): The message, with optional %-style placeholders.
+            *args: Values for the placeholders.
             name (str): Name of the logger. Defaults to __name__.
+            **fields: Structured fields added to the record; exc_info=True attaches the current traceback.
         """
-        logger = Logger.setup_logger(name)
-        logger.error(message)
+        Logger._log(logging.ERROR, message, args, name, fields)
 
 
 
-logging.getLogger("azure.core.pipeline.policies.http_logging_policy").setLevel(logging.WARNING)
\ No newline at end of file
+logging.getLogger("azure.core.pipeline.policies.http_logging_policy").setLevel(logging.WARNING)
@@ -0,0 +1,83 @@
+import io
+import os
+import re
+from PyPDF2 import PdfReader
+from app.configuration.logger_setup import Logger
+from app.services.analysis_record import CompactAnalysis
+
+ACROFORM_ENABLED = os.getenv("ACROFORM_FAST_PATH", "true").lower() == "true"
+
+# Keys use the same wording Azure's prebuilt-document model reports, so format_extracted_json maps them unchanged.
+# Matched against the field tooltip (/TU) that IRS fillable W9s carry for every box.
+TOOLTIP_LABELS = [
+    (re.compile(r"^\W*(?:line\s*)?1\b.*\bname\b", re.IGNORECASE), "Name"),
+    (re.compile(r"business name", re.IGNORECASE), "Business name"),
+    (re.compile(r"city, state,? and zip", re.IGNORECASE), "City, state, and ZIP code"),
+    (re.compile(r"^\W*(?:line\s*)?5\b.*\baddress\b", re.IGNORECASE), "Address"),
+    (re.compile(r"social security number", re.IGNORECASE), "Social security number"),
+    (re.compile(r"employer identification number", re.IGNORECASE), "Employer identification number"),
+]
+
+# Fallback for fields without tooltips: page-1 field names of the IRS fillable W9 (Rev. October 2018)
+FIELD_NAME_LABELS = {
+    "f1_1": "Name",
+    "f1_2": "Business name",
+    "f1_7": "Address",
+    "f1_8": "City, state, and ZIP code",
+    "f1_11": "Social security number", "f1_12": "Social security number", "f1_13": "Social security number",
+    "f1_14": "Employer identification number", "f1_15": "Employer identification number",
+}
+
+# SSN and EIN are split into several boxes; their parts are joined in field order with these separators
+TIN_SEPARATOR = {"Social security number": "-", "Employer identification number": "-"}
+
+def _label_for(field_name, field):
+    tooltip = field.get("/TU") or ""
+    for pattern, label in TOOLTIP_LABELS:
+        if pattern.search(tooltip):
+            return label
+    short_name = re.sub(r"\[\d+\]$", "", field_name.rsplit(".", 1)[-1])
+    return FIELD_NAME_LABELS.get(short_name)
+
+
+def extract_acroform_fields(document):
+    """
+    Reads a digitally-filled W9 straight from its AcroForm field dictionary.
+
+    Args:
+        document (bytes | BinaryIO): The PDF. Streams are rewound afterwards.
+
+    Returns:
+        CompactAnalysis: The same record Azure analyses are reduced to, or None
+        when the PDF has no filled W9 fields (scanned or flattened forms), in
+        which case the caller should use Azure.
+    """
+    stream = io.BytesIO(document) if isinstance(document, (bytes, bytearray)) else document
+    try:
+        stream.seek(0)
+        reader = PdfReader(stream)
+        if reader.is_encrypted:
+            return None
+        fields = reader.get_fields() or {}
+
+        values = {}
+        for field_name, field in fields.items():
+            value = field.get("/V")
+            label = _label_for(field_name, field)
+            if label is None or not isinstance(value, str) or not value.strip():
+                continue
+            values.setdefault(label, []).append(value.strip())
+
+        # Only trust the fast path when the form is actually filled in
+        if "Name" not in values or not ("Social security number" in values or "Employer identification number" in values):
+            return None
+
+        content = reader.pages[0].extract_text() or ""
+    except Exception as e:
+        Logger.warning("AcroForm extraction could not read document: %s", e)
+        return None
+    finally:
+        stream.seek(0)
+
+    fields = {label: TIN_SEPARATOR.get(label, " ").join(parts) for label, parts in values.items()}
+    return CompactAnalysis.from_fields(content, fields)
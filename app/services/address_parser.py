@@ -0,0 +1,203 @@
+import re
+from collections import namedtuple
+from app.configuration.logger_setup import Logger
+
+STATE_NAME_TO_ABBR = {
+    # US States
+    "Alabama": "AL", "Alaska": "AK", "Arizona": "AZ", "Arkansas": "AR", 
+    "California": "CA", "Colorado": "CO", "Connecticut": "CT", "Delaware": "DE",
+    "Florida": "FL", "Georgia": "GA", "Hawaii": "HI", "Idaho": "ID",
+    "Illinois": "IL", "Indiana": "IN", "Iowa": "IA", "Kansas": "KS",
+    "Kentucky": "KY", "Louisiana": "LA", "Maine": "ME", "Maryland": "MD",
+    "Massachusetts": "MA", "Michigan": "MI", "Minnesota": "MN", "Mississippi": "MS",
+    "Missouri": "MO", "Montana": "MT", "Nebraska": "NE", "Nevada": "NV",
+    "New Hampshire": "NH", "New Jersey": "NJ", "New Mexico": "NM", "New York": "NY",
+    "North Carolina": "NC", "North Dakota": "ND", "Ohio": "OH", "Oklahoma": "OK",
+    "Oregon": "OR", "Pennsylvania": "PA", "Rhode Island": "RI", "South Carolina": "SC",
+    "South Dakota": "SD", "Tennessee": "TN", "Texas": "TX", "Utah": "UT",
+    "Vermont": "VT", "Virginia": "VA", "Washington": "WA", "West Virginia": "WV",
+    "Wisconsin": "WI", "Wyoming": "WY", "District of Columbia": "DC",
+    
+    # Indian States
+    "Rajasthan": "RJ",
+    "Andhra Pradesh": "AP", "Arunachal Pradesh": "AR", "Assam": "AS", "Bihar": "BR", 
+    "Chhattisgarh": "CG", "Goa": "GA", "Gujarat": "GJ", "Haryana": "HR", 
+    "Himachal Pradesh": "HP", "Jharkhand": "JH", "Karnataka": "KA", "Kerala": "KL", 
+    "Madhya Pradesh": "MP", "Maharashtra": "MH", "Manipur": "MN", "Meghalaya": "ML", 
+    "Mizoram": "MZ", "Nagaland": "NL", "Odisha": "OD", "Punjab": "PB", 
+    "Sikkim": "SK", "Tamil Nadu": "TN", "Telangana": "TG", "Tripura": "TR", 
+    "Uttar Pradesh": "UP", "Uttarakhand": "UK", "West Bengal": "WB"
+}
+
+# List of US States (Full Names and Abbreviations)
+STATES = {
+    "Alabama", "Alaska", "Arizona", "Arkansas", "California", "Colorado", "Connecticut",
+    "Delaware", "Florida", "Georgia", "Hawaii", "Idaho", "Illinois", "Indiana", "Iowa",
+    "Kansas", "Kentucky", "Louisiana", "Maine", "Maryland", "Massachusetts", "Michigan",
+    "Minnesota", "Mississippi", "Missouri", "Montana", "Nebraska", "Nevada", "New Hampshire",
+    "New Jersey", "New Mexico", "New York", "North Carolina", "North Dakota", "Ohio",
+    "Oklahoma", "Oregon", "Pennsylvania", "Rhode Island", "South Carolina", "South Dakota",
+    "Tennessee", "Texas", "Utah", "Vermont", "Virginia", "Washington", "West Virginia","Rajasthan",
+    "Wisconsin", "Wyoming", "District of Columbia"
+}
+
+STATE_ABBREVIATIONS = {
+    "AL", "AK", "AZ", "AR", "CA", "CO", "CT", "DE", "FL", "GA", "HI", "ID", "IL", "IN", "IA",
+    "KS", "KY", "LA", "ME", "MD", "MA", "MI", "MN", "MS", "MO", "MT", "NE", "NV", "NH", "NJ",
+    "NM", "NY", "NC", "ND", "OH", "OK", "OR", "PA", "RI", "SC", "SD", "TN", "TX", "UT", "VT","RJ",
+    "VA", "WA", "WV", "WI", "WY", "DC"
+}
+
+INDIAN_STATES = {
+    "Andhra Pradesh", "Arunachal Pradesh", "Assam", "Bihar", "Chhattisgarh", "Goa", "Gujarat",
+    "Haryana", "Himachal Pradesh", "Jharkhand", "Karnataka", "Kerala", "Madhya Pradesh",
+    "Maharashtra", "Manipur", "Meghalaya", "Mizoram", "Nagaland", "Odisha", "Punjab",
+    "Rajasthan", "Sikkim", "Tamil Nadu", "Telangana", "Tripura", "Uttar Pradesh",
+    "Uttarakhand", "West Bengal"
+}
+
+# Create combined sets for easier validation
+ALL_STATES = STATES.union(STATE_ABBREVIATIONS).union(INDIAN_STATES)
+
+# First digit of a US ZIP code by state (USPS national areas); used to cross-check state against ZIP
+US_ZIP_FIRST_DIGIT = {
+    "CT": "0", "MA": "0", "ME": "0", "NH": "0", "NJ": "0", "RI": "0", "VT": "0",
+    "DE": "1", "NY": "1", "PA": "1",
+    "DC": "2", "MD": "2", "NC": "2", "SC": "2", "VA": "2", "WV": "2",
+    "AL": "3", "FL": "3", "GA": "3", "MS": "3", "TN": "3",
+    "IN": "4", "KY": "4", "MI": "4", "OH": "4",
+    "IA": "5", "MN": "5", "MT": "5", "ND": "5", "SD": "5", "WI": "5",
+    "IL": "6", "KS": "6", "MO": "6", "NE": "6",
+    "AR": "7", "LA": "7", "OK": "7", "TX": "7",
+    "AZ": "8", "CO": "8", "ID": "8", "NM": "8", "NV": "8", "UT": "8", "WY": "8",
+    "AK": "9", "CA": "9", "HI": "9", "OR": "9", "WA": "9",
+}
+
+US_ZIP_PATTERN = re.compile(r"^\d{5}(?:-\d{4})?$")
+INDIAN_PIN_PATTERN = re.compile(r"^[1-9]\d{5}$")
+TRAILING_ZIP_PATTERN = re.compile(r"(\d{5,6}(?:[- ]\d{4})?)\W*$")
+TOKEN_PATTERN = re.compile(r"[A-Za-z0-9.'&-]+")
+COUNTRY_SUFFIXES = {"us", "usa", "u.s.", "u.s.a.", "india"}
+# A country after the ZIP ("Boston MA 02110 USA") hides the ZIP from TRAILING_ZIP_PATTERN, so it is cut off first
+TRAILING_COUNTRY_PATTERN = re.compile(
+    r"[\s,]+(?:U\.?S\.?A?\.?|United\s+States(?:\s+of\s+America)?|India)\W*$", re.IGNORECASE
+)
+# Words of a street line; in the city they mean the street was read into this field, so the parse is not trusted.
+# Street types only count after the city's first word ("St Louis", "Dr Phillips"); unit words count anywhere.
+STREET_TYPE_TOKENS = {
+    "st", "street", "ave", "avenue", "rd", "road", "blvd", "boulevard", "dr", "drive", "ln", "lane",
+    "ct", "court", "pl", "place", "pkwy", "parkway", "hwy", "highway", "way", "ter", "terrace", "cir", "circle",
+}
+UNIT_TOKENS = {"apt", "apartment", "suite", "ste", "unit", "#", "po", "p.o.", "box", "floor", "fl", "bldg", "rm"}
+
+
+class ParsedAddress(namedtuple("ParsedAddress", ["city", "state", "zip_code", "confidence"])):
+    """City/State/ZIP parsed locally, with a 0..1 confidence used to decide whether to fall back to the LLM."""
+
+    __slots__ = ()
+
+    def to_dict(self):
+        """Returns the same shape extract_city_state_zip returns from Bedrock."""
+        return {"City": self.city, "State": self.state, "Zip Code": self.zip_code}
+
+
+def _build_state_trie():
+    """
+    Builds a trie over state names read from their LAST word backwards, so a
+    single walk from the token just before the ZIP finds the longest state
+    name ("West Virginia" over "Virginia") without re-joining word windows.
+    Each terminal node stores (abbreviation, is_abbreviation, is_indian).
+    """
+    trie = {}
+
+    def insert(words, entry):
+        node = trie
+        for word in reversed(words):
+            node = node.setdefault(word.casefold(), {})
+        node[None] = entry
+
+    for name in STATES | INDIAN_STATES:
+        insert(name.split(), (STATE_NAME_TO_ABBR.get(name, name), False, name in INDIAN_STATES))
+    for abbreviation in STATE_ABBREVIATIONS:
+        insert([abbreviation], (abbreviation, True, abbreviation not in US_ZIP_FIRST_DIGIT))
+    return trie
+
+
+STATE_TRIE = _build_state_trie()
+
+
+def _match_state(tokens, end):
+    """Longest state ending at tokens[end - 1]; returns (start index, entry) or None."""
+    node, match = STATE_TRIE, None
+    for index in range(end - 1, -1, -1):
+        node = node.get(tokens[index].strip(".").casefold())
+        if node is None:
+            break
+        if None in node:
+            match = (index, node[None])
+    return match
+
+
+def parse_city_state_zip(text):
+    """
+    Parses a "City, state, and ZIP code" line without calling an LLM.
+
+    Args:
+        text (str): Raw value read from the W9 form.
+
+    Returns:
+        ParsedAddress: Parsed fields and a confidence score. Confidence is 0 when
+        no ZIP code is present and is reduced for every inconsistency found
+        (state not next to the ZIP, ZIP not valid for the state, empty city...).
+    """
+    if not text:
+        return ParsedAddress(None, None, None, 0.0)
+
+    stripped = TRAILING_COUNTRY_PATTERN.sub("", text.strip())
+    zip_match = TRAILING_ZIP_PATTERN.search(stripped)
+    if not zip_match:
+        Logger.debug("No valid ZIP code found in: %s", text)
+        return ParsedAddress(None, None, None, 0.0)
+
+    zip_code = zip_match.group(1).replace(" ", "-")
+    tokens = TOKEN_PATTERN.findall(stripped[:zip_match.start()])
+    while tokens and tokens[-1].casefold() in COUNTRY_SUFFIXES:
+        tokens.pop()
+
+    confidence = 1.0
+    match = None
+    # The state normally sits right before the ZIP; anything further back is a weaker guess
+    for end in range(len(tokens), 0, -1):
+        match = _match_state(tokens, end)
+        if match:
+            if end != len(tokens):
+                confidence -= 0.3
+            break
+
+    if not match:
+        Logger.debug("No valid state found in: %s", text)
+        return ParsedAddress(" ".join(tokens) or None, None, zip_code, 0.2)
+
+    start, (state, is_abbreviation, is_indian) = match
+    city = " ".join(tokens[:start]).strip(" ,") or None
+
+    if is_abbreviation and not tokens[start].isupper():
+        confidence -= 0.2
+    if city is None:
+        confidence -= 0.5
+    else:
+        if any(character.isdigit() for character in city):
+            confidence -= 0.2
+        city_words = [token.strip(".,").casefold() for token in tokens[:start]]
+        if any(word in UNIT_TOKENS for word in city_words) or any(word in STREET_TYPE_TOKENS for word in city_words[1:]):
+            confidence -= 0.6
+
+    if is_indian:
+        if not INDIAN_PIN_PATTERN.match(zip_code):
+            confidence -= 0.4
+    elif not US_ZIP_PATTERN.match(zip_code):
+        confidence -= 0.4
+    elif state in US_ZIP_FIRST_DIGIT and US_ZIP_FIRST_DIGIT[state] != zip_code[0]:
+        confidence -= 0.3
+
+    return ParsedAddress(city, state, zip_code, round(max(confidence, 0.0), 2))
@@ -0,0 +1,141 @@
+import re
+
+
+# Only the bits of the page text anything downstream reads: the "Rev. October 2018" revision mark.
+# Kept in step with REVISION_PATTERN in formatting_result.py and main2.py so their first match is unchanged.
+CONTENT_SNIPPET_PATTERN = re.compile(r"\bRev\.\s*[A-Za-z]+\s*\d{4}", re.IGNORECASE)
+
+
+def content_snippets(content):
+    """Returns just the snippets of page text that the formatters search, joined by newlines."""
+    return "\n".join(CONTENT_SNIPPET_PATTERN.findall(content or ""))
+
+
+def page_snippets(result):
+    """{page_number: snippets} for the pages of an AnalyzeResult whose text has any, found through each page's spans."""
+    content = result.content or ""
+    snippets = {}
+    for page in result.pages or ():
+        text = "\n".join(content[span.offset:span.offset + span.length] for span in page.spans or ())
+        page_content = content_snippets(text)
+        if page_content:
+            snippets[page.page_number] = page_content
+    return snippets
+
+
+class KeyValueRecord:
+    """One key/value pair of an analysis, without the SDK's spans and bounding polygons."""
+
+    __slots__ = ("key", "value", "confidence", "page_number")
+
+    def __init__(self, key, value, confidence, page_number=None):
+        self.key = key
+        self.value = value
+        self.confidence = confidence
+        self.page_number = page_number
+
+    def __repr__(self):
+        return f"KeyValueRecord(key={self.key!r}, confidence={self.confidence!r}, page_number={self.page_number!r})"
+
+
+class CompactAnalysis:
+    """
+    What extraction keeps of an analysis: the key/value records, the content
+    snippets the formatters need (exposed as `.content`, and per page as
+    `.page_snippets`) and the page count.
+
+    Built straight after polling so the AnalyzeResult, with every page's
+    words, lines, spans and polygons, can be released before formatting.
+    """
+
+    __slots__ = ("content", "key_value_pairs", "page_count", "page_snippets")
+
+    def __init__(self, content, key_value_pairs, page_count=1, page_snippets=None):
+        self.content = content
+        self.key_value_pairs = key_value_pairs
+        self.page_count = page_count
+        self.page_snippets = page_snippets if page_snippets is not None else ({1: content} if content else {})
+
+    @classmethod
+    def from_analyze_result(cls, result):
+        """Copies what extraction needs out of an azure.ai.formrecognizer AnalyzeResult."""
+        records = []
+        for kv_pair in result.key_value_pairs or ():
+            key = kv_pair.key.content.strip() if kv_pair.key and kv_pair.key.content else None
+            if not key:
+                continue
+            value = kv_pair.value.content.strip() if kv_pair.value and kv_pair.value.content else None
+            regions = kv_pair.key.bounding_regions
+            records.append(KeyValueRecord(key, value, kv_pair.confidence, regions[0].page_number if regions else None))
+        return cls.from_records(result, records)
+
+    @classmethod
+    def from_records(cls, result, records):
+        """Builds the record from KeyValueRecords already read out of result, plus its page snippets."""
+        snippets = page_snippets(result)
+        # Results without page spans still get their snippets, just not split by page
+        content = "\n".join(snippets.values()) if snippets else content_snippets(result.content)
+        return cls(content, tuple(records), len(result.pages or ()), snippets)
+
+    @classmethod
+    def from_document_fields(cls, result, field_labels):
+        """
+        Copies the typed fields of the first document a W9-specific model found,
+        keyed by the printed label field_labels gives each field name so the
+        formatters read them exactly like key/value pairs. Fields missing from
+        field_labels or without a value are skipped.
+        """
+        documents = result.documents or ()
+        fields = (documents[0].fields or {}) if documents else {}
+        records = []
+        for name, field in fields.items():
+            label = field_labels.get(name)
+            if label is None or field is None:
+                continue
+            # The text as printed, like the key/value path; typed values without text (e.g. signatures) as a string
+            if field.content:
+                value = field.content.strip()
+            elif field.value is not None and field.value != "":
+                value = str(field.value)
+            else:
+                continue
+            regions = field.bounding_regions
+            records.append(KeyValueRecord(label, value, field.confidence, regions[0].page_number if regions else None))
+        return cls.from_records(result, records)
+
+    @classmethod
+    def from_fields(cls, content, fields, confidence=1.0, page_number=1):
+        """Builds a record from locally read {key: value} fields, e.g. a PDF's AcroForm."""
+        records = tuple(KeyValueRecord(key, value, confidence, page_number) for key, value in fields.items())
+        snippets = content_snippets(content)
+        return cls(snippets, records, page_snippets={page_number: snippets} if snippets else {})
+
+    def renumbered(self, page_numbers):
+        """
+        Copy with page n renamed to page_numbers[n - 1], e.g. to place an
+        analysis of a few pages split out of a packet back at their packet page numbers.
+        """
+        records = tuple(
+            KeyValueRecord(record.key, record.value, record.confidence, page_numbers[record.page_number - 1] if record.page_number else None)
+            for record in self.key_value_pairs
+        )
+        snippets = {page_numbers[page_number - 1]: snippet for page_number, snippet in self.page_snippets.items()}
+        return CompactAnalysis(self.content, records, self.page_count, snippets)
+
+    @classmethod
+    def merge(cls, analyses):
+        """Joins analyses of disjoint pages (already renumbered) into one, in page order."""
+        records = tuple(record for analysis in analyses for record in analysis.key_value_pairs)
+        snippets = dict(sorted((page, snippet) for analysis in analyses for page, snippet in analysis.page_snippets.items()))
+        return cls("\n".join(snippets.values()), records, sum(analysis.page_count for analysis in analyses), snippets)
+
+    def for_pages(self, pages):
+        """The part of this analysis on the given pages; records without a page number are dropped."""
+        pages = set(pages)
+        records = tuple(record for record in self.key_value_pairs if record.page_number in pages)
+        snippets = {page: snippet for page, snippet in self.page_snippets.items() if page in pages}
+        return CompactAnalysis("\n".join(snippets.values()), records, len(pages), snippets)
+
+    def to_extracted_json(self):
+        """{key: {"value", "confidence"}}, the shape format_extracted_json takes; a repeated key keeps its last value."""
+        return {record.key: {"value": record.value, "confidence": record.confidence} for record in self.key_value_pairs}
@@ -0,0 +1,216 @@
+import asyncio
+from pathlib import Path
+from app.services.formatting_result import format_extracted_json
+from app.services.client_registry import get_async_document_analysis_client
+from app.services.result_cache import document_hash, is_cacheable
+from app.services.upload_stream import hash_stream
+from app.services.pdf_preflight import preflight_pdf, format_page_ranges, PREFLIGHT_ENABLED
+from app.services.image_normalization import normalize_async, IMAGE_NORMALIZATION_ENABLED
+from app.services.acroform_extraction import extract_acroform_fields, ACROFORM_ENABLED
+from app.services.metrics import track_stage, timed
+from app.services.resilience import azure_backend
+from app.services.extraction_base import BaseW9FormExtraction, AnalysisTimeout, analysis_wait_windows, ENGINE_AZURE
+from app.services.analysis_record import CompactAnalysis
+from app.services.packet_extraction import plan_packet, split_forms, PACKET_CHUNK_PAGES, PACKET_MAX_CONCURRENCY
+from app.configuration.logger_setup import Logger
+
+
+async def wait_for_analysis_async(poller):
+    """Awaitable wait_for_analysis: awaits the same analysis operation, raising AnalysisTimeout past ANALYSIS_MAX_WAIT_SECONDS."""
+    polling = asyncio.ensure_future(poller.result())
+    try:
+        for window in analysis_wait_windows():
+            await asyncio.wait({polling}, timeout=window)
+            if polling.done():
+                return polling.result()
+        raise AnalysisTimeout(poller.continuation_token())
+    finally:
+        polling.cancel()
+
+
+def owned_stream(document):
+    """document when it is a stream the coalescer must close, None for bytes."""
+    return None if isinstance(document, (bytes, bytearray)) else document
+
+
+class AsyncW9FormExtraction(BaseW9FormExtraction):
+    """
+    asyncio counterpart of W9FormExtraction built on the aio DocumentAnalysisClient.
+
+    Awaiting Azure instead of blocking on poller.result() lets a single worker
+    keep hundreds of analyses in flight.
+    """
+
+    packet_chunk_pages = PACKET_CHUNK_PAGES
+
+    def client(self, endpoint):
+        """Return the shared aio Azure Form Recognizer client for a pool endpoint on the running event loop"""
+        return get_async_document_analysis_client(endpoint.endpoint, endpoint.api_key)
+
+    async def format_result(self, result, extracted_json):
+        return format_extracted_json(result, extracted_json)
+
+    async def extract_form_data(self, pdf_path):
+        pdf_path = Path(pdf_path)
+
+        if not pdf_path.exists():
+            return {"error": "PDF file not found"}
+
+        file = open(pdf_path, "rb")
+        try:
+            digest = await asyncio.to_thread(hash_stream, file, None)
+        except BaseException:
+            file.close()
+            raise
+        # extract_document closes the file once the extraction is done with it
+        return await self.extract_document(file, digest)
+
+    async def extract_form_bytes(self, file_bytes, idempotency_key=None):
+        """Extracts W9 data from in-memory PDF bytes."""
+        return await self.extract_document(file_bytes, document_hash(file_bytes), idempotency_key)
+
+    async def analyze(self, document):
+        """Awaitable W9FormExtraction.analyze(); the PDF parsing runs off the event loop."""
+        if IMAGE_NORMALIZATION_ENABLED:
+            with track_stage("image_normalization"):
+                document = await normalize_async(document)
+
+        if ACROFORM_ENABLED:
+            with track_stage("acroform"):
+                acroform = self.acroform_analysis(await asyncio.to_thread(extract_acroform_fields, document))
+            if acroform is not None:
+                return acroform
+
+        preflight = None
+        if PREFLIGHT_ENABLED:
+            with track_stage("preflight"):
+                preflight = await asyncio.to_thread(preflight_pdf, document)
+        analyze_kwargs = self.analyze_kwargs(preflight)
+
+        with track_stage("azure_analysis"):
+            analysis = await azure_backend.call_async(self.run_analysis, document, analyze_kwargs)
+
+        return analysis, analysis.to_extracted_json(), ENGINE_AZURE
+
+    async def run_analysis(self, document, analyze_kwargs):
+        """Awaitable W9FormExtraction.run_analysis()."""
+
+        async def analyze_with(model_id):
+            async def analyze_on(endpoint):
+                poller = await self.client(endpoint).begin_analyze_document(model_id, document=self.request_body(document), **analyze_kwargs)
+                return await wait_for_analysis_async(poller)
+
+            return await self.endpoint_pool.call_async(analyze_on)
+
+        return await self.model_router.analyze_async(analyze_with)
+
+    @timed("extraction")
+    async def extract_document(self, document, digest, idempotency_key=None):
+        """
+        Awaitable W9FormExtraction.extract_document().
+
+        A stream document is taken over and closed once the extraction is done with it: the extraction
+        may be shared with other requests and outlive the one that passed the stream (see detach_upload).
+
+        Raises:
+            IdempotencyKeyReused: When idempotency_key was already used for a different document.
+        """
+        cache_key = self.cache_key(digest)
+        owned = owned_stream(document)
+        extract = lambda owned=None: self.coalescer.run_async(cache_key, lambda: self._extract_document(document, digest, cache_key), cache_key, owned)
+        if idempotency_key:
+            return await self.coalescer.run_async(self.idempotency_key(idempotency_key), extract, cache_key, owned)
+        return await extract(owned)
+
+    async def _extract_document(self, document, digest, cache_key):
+        cached_json = self.cache.get(cache_key)
+        if cached_json is not None:
+            return cached_json
+
+        stored_json = await asyncio.to_thread(self.store.get, digest, self.result_version) if self.store is not None else None
+        if stored_json is not None:
+            self.cache.set(cache_key, stored_json)
+            return stored_json
+
+        try:
+            result, extracted_json, engine = await self.analyze(document)
+            Logger.debug("Extracted key/value pairs: %s", extracted_json)
+            formatted_json = self.with_engine(await self.format_result(result, extracted_json), engine)
+            if self.cache_result(cache_key, formatted_json):
+                await asyncio.to_thread(self.store.save, digest, self.result_version, formatted_json)
+            return formatted_json
+
+        except Exception as e:
+            return self.extraction_failed(e)
+
+    @timed("packet_extraction")
+    async def extract_packet(self, document, digest):
+        """
+        Extracts every W9 of a multi-page PDF (e.g. a vendor onboarding packet), one record per form.
+
+        The packet is split into chunks of a few pages that Azure analyses concurrently,
+        so the wall-clock time is that of the slowest chunk rather than the sum of all pages.
+        The merged pages are then cut into forms before each page that starts a W9.
+
+        Returns:
+            dict: {"page_count", "chunks", "forms": [formatted record with its "Pages", ...]}, or {"error": ...}.
+            A stream document is closed once the extraction is done with it, as in extract_document().
+        """
+        cache_key = self.cache_key(digest, "-packet")
+        return await self.coalescer.run_async(cache_key, lambda: self._extract_packet(document, digest, cache_key), cache_key, owned_stream(document))
+
+    async def _extract_packet(self, document, digest, cache_key):
+        cached_json = self.cache.get(cache_key)
+        if cached_json is not None:
+            return cached_json
+
+        stored_json = await asyncio.to_thread(self.store.get_packet, digest, self.result_version) if self.store is not None else None
+        if stored_json is not None:
+            self.cache.set(cache_key, stored_json)
+            return stored_json
+
+        try:
+            if IMAGE_NORMALIZATION_ENABLED:
+                with track_stage("image_normalization"):
+                    document = await normalize_async(document)
+
+            with track_stage("packet_split"):
+                plan = await asyncio.to_thread(plan_packet, document, self.packet_chunk_pages)
+            if plan is None:
+                # Unsplittable PDFs are still analysed, just in one piece
+                page_count, chunks = None, [(None, document)]
+            else:
+                page_count, chunks = plan
+            Logger.info("Analysing %s-page packet in %s chunk(s)", page_count, len(chunks))
+
+            semaphore = asyncio.Semaphore(PACKET_MAX_CONCURRENCY)
+
+            async def analyze_chunk(page_numbers, chunk):
+                async with semaphore:
+                    analysis = await azure_backend.call_async(self.run_analysis, chunk, {})
+                return analysis.renumbered(page_numbers) if page_numbers else analysis
+
+            with track_stage("azure_analysis"):
+                analyses = await asyncio.gather(*(analyze_chunk(page_numbers, chunk) for page_numbers, chunk in chunks))
+            packet = CompactAnalysis.merge(analyses)
+
+            page_numbers = sorted({page for page_numbers, _ in chunks for page in page_numbers or ()}) or list(range(1, packet.page_count + 1))
+            forms = split_forms(packet, page_numbers)
+            formatted_forms = await asyncio.gather(*(self.format_result(form, form.to_extracted_json()) for _, form in forms))
+            for (pages, _), formatted_json in zip(forms, formatted_forms):
+                if isinstance(formatted_json, dict):
+                    formatted_json["Pages"] = format_page_ranges(pages)
+                self.with_engine(formatted_json, ENGINE_AZURE)
+
+            packet_json = {"page_count": page_count or packet.page_count, "chunks": len(chunks), "forms": list(formatted_forms)}
+            # all() of no forms is True: a packet that yielded nothing must be re-analysed, not replayed
+            if formatted_forms and all(is_cacheable(formatted_json) for formatted_json in formatted_forms):
+                self.cache.set(cache_key, packet_json)
+                if self.store is not None:
+                    # Each form is stored on its own so /results/search finds it by TIN or name
+                    await asyncio.to_thread(self.store.save_packet, digest, self.result_version, packet_json)
+
+            return packet_json
+
+        except Exception as e:
+            return self.extraction_failed(e, "packet")
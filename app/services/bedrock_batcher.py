@@ -0,0 +1,97 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+BEDROCK_BATCH_WINDOW_MS = float(os.getenv("BEDROCK_BATCH_WINDOW_MS", "50"))
+BEDROCK_BATCH_MAX_ITEMS = int(os.getenv("BEDROCK_BATCH_MAX_ITEMS", "20"))
+
+
+class AddressBatcher:
+    """
+    Collects address lines submitted from any thread for up to window_ms (or
+    max_items lines) and resolves them with one batched Bedrock call.
+
+    invoke_batch(texts) must return one result per text or None; on None every
+    text is retried with invoke_single(text), so a malformed array response
+    never loses an answer. Those retries run concurrently on the executor and
+    each text's waiters are answered as soon as its own call returns.
+    """
+
+    def __init__(self, invoke_batch, invoke_single, executor, window_ms=BEDROCK_BATCH_WINDOW_MS, max_items=BEDROCK_BATCH_MAX_ITEMS):
+        self.invoke_batch = invoke_batch
+        self.invoke_single = invoke_single
+        self.executor = executor
+        self.window_seconds = window_ms / 1000
+        self.max_items = max_items
+        self._pending = queue.Queue()
+        self._collector = None
+        self._lock = threading.Lock()
+
+    def submit(self, text):
+        """Queues an address line and returns a Future for its parsed dict."""
+        future = Future()
+        self._pending.put((text, future))
+        if self._collector is None:
+            with self._lock:
+                if self._collector is None:
+                    self._collector = threading.Thread(target=self._collect, name="bedrock-batcher", daemon=True)
+                    self._collector.start()
+        return future
+
+    def _collect(self):
+        while True:
+            batch = [self._pending.get()]
+            deadline = time.monotonic() + self.window_seconds
+            while len(batch) < self.max_items:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            # Dispatch on the Bedrock pool so the next window starts collecting straight away
+            self.executor.submit(self._dispatch, batch)
+
+    def _dispatch(self, batch):
+        waiters = {}
+        for text, future in batch:
+            waiters.setdefault(text, []).append(future)
+        texts = list(waiters)
+
+        if len(texts) == 1:
+            self._resolve(waiters[texts[0]], lambda: self.invoke_single(texts[0]))
+            return
+
+        try:
+            results = self.invoke_batch(texts)
+        except Exception as e:
+            for futures in waiters.values():
+                for future in futures:
+                    future.set_exception(e)
+            return
+
+        if results is None:
+            # Not one after another on this thread: the slowest single call would hold up every waiter
+            for text in texts:
+                self.executor.submit(self._resolve, waiters[text], lambda text=text: self.invoke_single(text))
+            return
+
+        for text, result in zip(texts, results):
+            for future in waiters[text]:
+                future.set_result(result)
+
+    @staticmethod
+    def _resolve(futures, call):
+        """Answers every future waiting on one text with call()'s result or exception."""
+        try:
+            result = call()
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        for future in futures:
+            future.set_result(result)
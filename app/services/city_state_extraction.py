@@ -1,63 +1,253 @@
+import asyncio
 import json
-import boto3
 import os
-import sys
-import botocore.config
-from dotenv import load_dotenv
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-load_dotenv()
-
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 from app.configuration.logger_setup import Logger
+from app.services.address_parser import parse_city_state_zip
+from app.services.result_cache import ResultCache, SqliteCacheTier
+from app.services.bedrock_batcher import AddressBatcher
+from app.services.metrics import track_stage, timed
+from app.services.resilience import bedrock_backend
 
-# Initialize AWS Bedrock Client
-session = boto3.Session(
-    aws_access_key_id=os.getenv("aws_access_key_id"),
-    aws_secret_access_key=os.getenv("aws_secret_access_key"),
-    region_name=os.getenv("AWS_REGION", "us-east-1")
-)
+BEDROCK_MAX_CONCURRENCY = int(os.getenv("BEDROCK_MAX_CONCURRENCY", "32"))
+# Local parses scoring at or below this fall back to Bedrock; at 0.8 any single inconsistency is enough
+ADDRESS_CONFIDENCE_THRESHOLD = float(os.getenv("ADDRESS_CONFIDENCE_THRESHOLD", "0.8"))
 
-bedrock_client = session.client(
-    "bedrock-runtime",
-    region_name="us-east-1",
-    config=botocore.config.Config(read_timeout=120)
+ADDRESS_CACHE_MAX_ITEMS = int(os.getenv("ADDRESS_CACHE_MAX_ITEMS", "10000"))
+ADDRESS_CACHE_TTL_SECONDS = int(os.getenv("ADDRESS_CACHE_TTL_SECONDS", str(90 * 24 * 3600)))
+ADDRESS_CACHE_DB_PATH = os.getenv("ADDRESS_CACHE_DB_PATH")  # persistent tier is disabled when unset
+
+# Bedrock answers keyed on the normalized address line; a city shared by many vendors is only sent once
+address_cache = ResultCache(
+    max_items=ADDRESS_CACHE_MAX_ITEMS,
+    ttl_seconds=ADDRESS_CACHE_TTL_SECONDS,
+    disk_tier=SqliteCacheTier(ADDRESS_CACHE_DB_PATH, table="address_cache", ttl_seconds=ADDRESS_CACHE_TTL_SECONDS) if ADDRESS_CACHE_DB_PATH else None,
+    name="Address",
 )
 
+BEDROCK_BATCHING_ENABLED = os.getenv("BEDROCK_BATCHING", "true").lower() == "true"
+
+MODEL_ID = "anthropic.claude-3-5-sonnet-20240620-v1:0"  # Make sure this model ID exists in your AWS region
+# Overrides the Bedrock runtime URL, e.g. to point at the stub server in benchmarks/load_test
+BEDROCK_ENDPOINT_URL = os.getenv("BEDROCK_ENDPOINT_URL")
+
+ADDRESS_JSON_EXAMPLE = "{\n    \"City\": \"Extracted City\",\n    \"State\": \"Extracted State Abbreviation\",\n    \"Zip Code\": \"Extracted Zip Code\"\n}"
+STATE_ABBREVIATION_NOTE = "IMPORTANT: For the State field, please return the two-letter state abbreviation (e.g., 'CA' for California, 'NY' for New York) instead of the full state name."
+
+
+_NON_ALPHANUMERIC = re.compile(r"[\W_]+")
+
+# Built on first use: most addresses are parsed locally, so boto3 is not imported or configured at startup
+_bedrock_client = None
+_bedrock_client_lock = threading.Lock()
+
+# boto3 has no asyncio API, so async callers run Bedrock requests on this dedicated pool
+# instead of the event loop or the web framework's shared threadpool
+_bedrock_executor = ThreadPoolExecutor(max_workers=BEDROCK_MAX_CONCURRENCY, thread_name_prefix="bedrock")
+
+
+def get_bedrock_client():
+    """Returns the process-wide Bedrock runtime client, importing boto3 and creating it on first use."""
+    global _bedrock_client
+    if _bedrock_client is not None:
+        return _bedrock_client
+
+    with _bedrock_client_lock:
+        if _bedrock_client is None:
+            import boto3
+            import botocore.config
+
+            session = boto3.Session(
+                aws_access_key_id=os.getenv("aws_access_key_id"),
+                aws_secret_access_key=os.getenv("aws_secret_access_key"),
+                region_name=os.getenv("AWS_REGION", "us-east-1")
+            )
+            _bedrock_client = session.client(
+                "bedrock-runtime",
+                region_name="us-east-1",
+                endpoint_url=BEDROCK_ENDPOINT_URL,
+                # botocore's own retries are off: bedrock_backend retries with backoff and feeds the circuit breaker
+                config=botocore.config.Config(read_timeout=120, max_pool_connections=BEDROCK_MAX_CONCURRENCY, retries={"max_attempts": 1, "mode": "standard"})
+            )
+            Logger.info("Created Bedrock runtime client")
+    return _bedrock_client
+
+
+def normalize_address_key(text):
+    """Folds case, punctuation and whitespace so trivially different spellings of an address share a cache entry."""
+    return _NON_ALPHANUMERIC.sub(" ", text).casefold().strip()
+
+
+def is_parsed_address(parsed_data):
+    """False for the all-None fallback returned when Bedrock fails; those are never cached."""
+    return isinstance(parsed_data, dict) and any(parsed_data.get(field) for field in ("City", "State", "Zip Code"))
+
+
+@timed("address_lookup")
 def extract_city_state_zip(text):
     """
     Uses AWS Bedrock's Claude 3 API to extract and separate City, State, and Zip Code.
+    Successful answers are memoized in address_cache.
     """
-    messages = [
-    {"role": "user", "content": f"Extract and separate City, State, and Zip Code from the following address:\n\n{text}\n\nReturn the output strictly in JSON format like this:\n\n{{\n    \"City\": \"Extracted City\",\n    \"State\": \"Extracted State Abbreviation\",\n    \"Zip Code\": \"Extracted Zip Code\"\n}}\n\nIMPORTANT: For the State field, please return the two-letter state abbreviation (e.g., 'CA' for California, 'NY' for New York) instead of the full state name."}
-    ]
+    if not text:
+        return {"City": None, "State": None, "Zip Code": None}
+
+    cache_key = normalize_address_key(text)
+    cached_data = address_cache.get(cache_key)
+    if cached_data is not None:
+        return cached_data
+
+    if BEDROCK_BATCHING_ENABLED:
+        parsed_data = address_batcher.submit(text).result()
+    else:
+        parsed_data = invoke_bedrock_city_state_zip(text)
+    if is_parsed_address(parsed_data):
+        address_cache.set(cache_key, parsed_data)
+    return parsed_data
 
-    model_id = "anthropic.claude-3-5-sonnet-20240620-v1:0"  # Make sure this model ID exists in your AWS region
 
+def invoke_claude(prompt, max_tokens):
+    """Sends a single-turn prompt to Claude on Bedrock and returns the assistant's text, or None if the response has no content."""
     request_body = {
         "anthropic_version": "bedrock-2023-05-31",  # REQUIRED for Claude 3 in AWS Bedrock
-        "messages": messages,
-        "max_tokens": 200,
+        "messages": [{"role": "user", "content": prompt}],
+        "max_tokens": max_tokens,
         "temperature": 0.2
     }
 
-    try:
-        response = bedrock_client.invoke_model(
-            modelId=model_id,
+    def invoke():
+        response = get_bedrock_client().invoke_model(
+            modelId=MODEL_ID,
             body=json.dumps(request_body)
         )
+        return json.loads(response["body"].read().decode("utf-8"))
+
+    with track_stage("bedrock"):
+        result = bedrock_backend.call(invoke)
+    Logger.debug("Bedrock raw response: %s", result)
 
-        result = json.loads(response["body"].read().decode("utf-8"))
-        Logger.info(f"Bedrock raw response: {result}")
+    if "content" in result and isinstance(result["content"], list):
+        return result["content"][0].get("text", "").strip()
+    Logger.warning("Bedrock response missing expected content field.")
+    return None
 
-        if "content" in result and isinstance(result["content"], list):
-            assistant_response = result["content"][0].get("text", "").strip()
-            parsed_data = json.loads(assistant_response)  # Convert response to JSON
-            Logger.info(f"Extracted City/State/Zip: {parsed_data}")
-            return parsed_data
-        else:
-            Logger.warning("Bedrock response missing expected content field.")
+
+def invoke_bedrock_city_state_zip(text):
+    """
+    Sends a single address to Bedrock, bypassing the cache.
+    """
+    prompt = (
+        f"Extract and separate City, State, and Zip Code from the following address:\n\n{text}\n\n"
+        f"Return the output strictly in JSON format like this:\n\n{ADDRESS_JSON_EXAMPLE}\n\n{STATE_ABBREVIATION_NOTE}"
+    )
+
+    try:
+        assistant_response = invoke_claude(prompt, max_tokens=200)
+        if assistant_response is None:
             return {"City": None, "State": None, "Zip Code": None}
 
+        parsed_data = json.loads(assistant_response)  # Convert response to JSON
+        Logger.debug("Extracted City/State/Zip: %s", parsed_data)
+        return parsed_data
+
     except Exception as e:
-        Logger.error(f"Error extracting City, State, Zip Code: {str(e)}")
+        Logger.error("Error extracting City, State, Zip Code: %s", e)
         return {"City": None, "State": None, "Zip Code": None}
+
+
+def invoke_bedrock_city_state_zip_batch(texts):
+    """
+    Sends several addresses to Bedrock in one prompt that asks for a JSON array in input order.
+
+    Returns:
+        list: One parsed dict per input, or None when the response is not an
+        array of exactly len(texts) objects (callers then fall back to single calls).
+    """
+    numbered = "\n".join(f"{index}. {text}" for index, text in enumerate(texts, start=1))
+    prompt = (
+        f"Extract and separate City, State, and Zip Code from each of the following {len(texts)} addresses:\n\n{numbered}\n\n"
+        f"Return the output strictly as a JSON array with exactly {len(texts)} objects, in the same order as the "
+        f"addresses above, each in this format:\n\n{ADDRESS_JSON_EXAMPLE}\n\n{STATE_ABBREVIATION_NOTE}"
+    )
+
+    try:
+        assistant_response = invoke_claude(prompt, max_tokens=60 * len(texts) + 100)
+        if assistant_response is None:
+            return None
+
+        # Tolerate prose or code fences around the array
+        parsed_data = json.loads(assistant_response[assistant_response.find("["):assistant_response.rfind("]") + 1])
+    except Exception as e:
+        Logger.error("Error extracting batched City, State, Zip Code: %s", e)
+        return None
+
+    if not isinstance(parsed_data, list) or len(parsed_data) != len(texts) or not all(isinstance(item, dict) for item in parsed_data):
+        Logger.warning("Batched Bedrock response did not contain %s address objects", len(texts))
+        return None
+    return parsed_data
+
+
+# Cache misses are funnelled through one batcher so concurrent lookups share a Bedrock round trip
+address_batcher = AddressBatcher(
+    invoke_batch=invoke_bedrock_city_state_zip_batch,
+    invoke_single=invoke_bedrock_city_state_zip,
+    executor=_bedrock_executor,
+)
+
+
+@timed("address_lookup")
+async def extract_city_state_zip_async(text):
+    """
+    Awaitable version of extract_city_state_zip for use from async request handlers.
+    """
+    if not text:
+        return {"City": None, "State": None, "Zip Code": None}
+
+    cache_key = normalize_address_key(text)
+    cached_data = address_cache.get(cache_key)
+    if cached_data is not None:
+        return cached_data
+
+    if BEDROCK_BATCHING_ENABLED:
+        parsed_data = await asyncio.wrap_future(address_batcher.submit(text))
+    else:
+        loop = asyncio.get_running_loop()
+        parsed_data = await loop.run_in_executor(_bedrock_executor, invoke_bedrock_city_state_zip, text)
+    if is_parsed_address(parsed_data):
+        address_cache.set(cache_key, parsed_data)
+    return parsed_data
+
+
+def resolve_city_state_zip(text):
+    """
+    Splits City, State and Zip Code with the local rule-based parser, only
+    calling Bedrock when the parse confidence is not above ADDRESS_CONFIDENCE_THRESHOLD.
+    """
+    parsed = parse_city_state_zip(text)
+    if parsed.confidence > ADDRESS_CONFIDENCE_THRESHOLD:
+        return parsed.to_dict()
+    Logger.info("Local address parse confidence %s not above threshold, using Bedrock", parsed.confidence)
+    parsed_data = extract_city_state_zip(text)
+    if is_parsed_address(parsed_data):
+        return parsed_data
+    # Bedrock failed or is unavailable: a low-confidence local parse beats returning nulls
+    Logger.warning("Bedrock address lookup failed, falling back to the local parse")
+    return parsed.to_dict()
+
+
+async def resolve_city_state_zip_async(text):
+    """
+    Awaitable version of resolve_city_state_zip; Bedrock is only awaited for low-confidence parses.
+    """
+    parsed = parse_city_state_zip(text)
+    if parsed.confidence > ADDRESS_CONFIDENCE_THRESHOLD:
+        return parsed.to_dict()
+    Logger.info("Local address parse confidence %s not above threshold, using Bedrock", parsed.confidence)
+    parsed_data = await extract_city_state_zip_async(text)
+    if is_parsed_address(parsed_data):
+        return parsed_data
+    Logger.warning("Bedrock address lookup failed, falling back to the local parse")
+    return parsed.to_dict()
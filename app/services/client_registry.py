@@ -0,0 +1,151 @@
+import asyncio
+import os
+import socket
+import threading
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from azure.ai.formrecognizer import DocumentAnalysisClient
+from azure.ai.formrecognizer.aio import DocumentAnalysisClient as AsyncDocumentAnalysisClient
+from azure.core.credentials import AzureKeyCredential
+from azure.core.pipeline.transport import RequestsTransport, AioHttpTransport
+from app.configuration.logger_setup import Logger
+
+AZURE_POOL_SIZE = int(os.getenv("AZURE_POOL_SIZE", "20"))
+AZURE_KEEP_ALIVE_SECONDS = int(os.getenv("AZURE_KEEP_ALIVE_SECONDS", "60"))
+AZURE_CONNECTION_TIMEOUT = int(os.getenv("AZURE_CONNECTION_TIMEOUT", "10"))
+AZURE_READ_TIMEOUT = int(os.getenv("AZURE_READ_TIMEOUT", "60"))
+AZURE_ASYNC_POOL_SIZE = int(os.getenv("AZURE_ASYNC_POOL_SIZE", "200"))
+# Retries are handled by app.services.resilience; SDK retries on top would multiply every attempt
+AZURE_SDK_RETRY_TOTAL = int(os.getenv("AZURE_SDK_RETRY_TOTAL", "0"))
+
+# One client (and pooled HTTP session) per endpoint/key pair for the lifetime of the process
+_clients = {}
+_sessions = {}
+_lock = threading.Lock()
+
+# aio clients are bound to the event loop that created their aiohttp session
+_async_clients = {}
+
+
+class KeepAliveHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that enables TCP keep-alive so idle pooled connections are not dropped by middleboxes."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        socket_options = list(HTTPConnection.default_socket_options)
+        socket_options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+        if hasattr(socket, "TCP_KEEPIDLE"):
+            socket_options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, AZURE_KEEP_ALIVE_SECONDS))
+        kwargs["socket_options"] = socket_options
+        super().init_poolmanager(*args, **kwargs)
+
+
+def _build_session(pool_size):
+    session = requests.Session()
+    adapter = KeepAliveHTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Connection"] = "keep-alive"
+    return session
+
+
+def get_document_analysis_client(endpoint=None, api_key=None, pool_size=AZURE_POOL_SIZE):
+    """
+    Returns the shared DocumentAnalysisClient for an endpoint, creating it on first use.
+
+    Args:
+        endpoint (str): Document Intelligence endpoint. Defaults to AZURE_ENDPOINT.
+        api_key (str): API key for the endpoint. Defaults to AZURE_API_KEY.
+        pool_size (int): Maximum pooled connections kept open to the endpoint.
+
+    Returns:
+        DocumentAnalysisClient: Client whose transport reuses pooled keep-alive connections.
+    """
+    endpoint = endpoint or os.getenv("AZURE_ENDPOINT")
+    api_key = api_key or os.getenv("AZURE_API_KEY")
+    registry_key = (endpoint, api_key)
+
+    client = _clients.get(registry_key)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _clients.get(registry_key)
+        if client is None:
+            session = _build_session(pool_size)
+            transport = RequestsTransport(
+                session=session,
+                session_owner=False,
+                connection_timeout=AZURE_CONNECTION_TIMEOUT,
+                read_timeout=AZURE_READ_TIMEOUT,
+            )
+            client = DocumentAnalysisClient(endpoint, AzureKeyCredential(api_key), transport=transport, retry_total=AZURE_SDK_RETRY_TOTAL)
+            _clients[registry_key] = client
+            _sessions[registry_key] = session
+            Logger.info("Created pooled DocumentAnalysisClient for %s (pool size %s)", endpoint, pool_size)
+    return client
+
+
+def close_all_clients():
+    """Closes every registered client and its pooled session. Called from FastAPI lifespan shutdown."""
+    with _lock:
+        for registry_key, client in _clients.items():
+            try:
+                client.close()
+            finally:
+                _sessions[registry_key].close()
+        _clients.clear()
+        _sessions.clear()
+    Logger.info("Closed all pooled DocumentAnalysisClients")
+
+
+def get_async_document_analysis_client(endpoint=None, api_key=None, pool_size=AZURE_ASYNC_POOL_SIZE):
+    """
+    Returns the shared aio DocumentAnalysisClient for an endpoint on the running event loop.
+
+    Args:
+        endpoint (str): Document Intelligence endpoint. Defaults to AZURE_ENDPOINT.
+        api_key (str): API key for the endpoint. Defaults to AZURE_API_KEY.
+        pool_size (int): Maximum concurrent connections kept open to the endpoint.
+
+    Returns:
+        azure.ai.formrecognizer.aio.DocumentAnalysisClient: Client on a pooled keep-alive aiohttp session.
+    """
+    endpoint = endpoint or os.getenv("AZURE_ENDPOINT")
+    api_key = api_key or os.getenv("AZURE_API_KEY")
+    loop = asyncio.get_running_loop()
+    registry_key = (endpoint, api_key, id(loop))
+
+    entry = _async_clients.get(registry_key)
+    if entry is not None:
+        return entry[0]
+
+    connector = aiohttp.TCPConnector(
+        limit=pool_size,
+        limit_per_host=pool_size,
+        keepalive_timeout=AZURE_KEEP_ALIVE_SECONDS,
+    )
+    session = aiohttp.ClientSession(connector=connector)
+    transport = AioHttpTransport(
+        session=session,
+        session_owner=False,
+        connection_timeout=AZURE_CONNECTION_TIMEOUT,
+        read_timeout=AZURE_READ_TIMEOUT,
+    )
+    client = AsyncDocumentAnalysisClient(endpoint, AzureKeyCredential(api_key), transport=transport, retry_total=AZURE_SDK_RETRY_TOTAL)
+    _async_clients[registry_key] = (client, session)
+    Logger.info("Created pooled async DocumentAnalysisClient for %s (pool size %s)", endpoint, pool_size)
+    return client
+
+
+async def close_all_async_clients():
+    """Closes every aio client created on the running event loop. Called from FastAPI lifespan shutdown."""
+    loop_id = id(asyncio.get_running_loop())
+    for registry_key in [key for key in _async_clients if key[2] == loop_id]:
+        client, session = _async_clients.pop(registry_key)
+        try:
+            await client.close()
+        finally:
+            await session.close()
+    Logger.info("Closed all pooled async DocumentAnalysisClients")
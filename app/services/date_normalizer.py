@@ -0,0 +1,135 @@
+import os
+import re
+from datetime import date
+from functools import lru_cache
+from app.configuration.logger_setup import Logger
+
+# How to read all-numeric dates like 03/04/2024 when both parts could be the month.
+# "US" (month first) suits W9s, which are US forms; "EU" reads them day first.
+DATE_ORDER = os.getenv("DATE_ORDER", "US").upper()
+DATE_CACHE_SIZE = int(os.getenv("DATE_CACHE_SIZE", "4096"))
+
+MONTH_NUMBERS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12
+}
+_MONTH = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?"
+_DAY = r"\d{1,2}(?:st|nd|rd|th)?"
+
+# Every layout W9 signature dates are written in, as (name, pattern) with groups year/month/day,
+# or first/second for all-numeric dates whose order depends on DATE_ORDER
+DATE_LAYOUTS = (
+    ("year_first", r"(?P<year>\d{4})(?P<sep>[-/.])(?P<month>\d{1,2})(?P=sep)(?P<day>\d{1,2})"),
+    ("numeric", r"(?P<first>\d{1,2})(?P<sep>[-/.])(?P<second>\d{1,2})(?P=sep)(?P<year>\d{4}|\d{2})"),
+    ("month_name_first", rf"(?P<month>{_MONTH})\s+(?P<day>{_DAY}),?\s+(?P<year>\d{{4}})"),
+    ("day_first_month_name", rf"(?P<day>{_DAY})\s+(?:of\s+)?(?P<month>{_MONTH}),?\s+(?P<year>\d{{4}})"),
+    ("year_first_month_name", rf"(?P<year>\d{{4}})\s+(?P<month>{_MONTH})\s+(?P<day>{_DAY})"),
+    # Handwriting read by OCR: any three digit groups, e.g. "3 14 2024" or "3/14-24"
+    ("digits", r"(?P<first>\d{1,2})(?P<sep>\D+?)(?P<second>\d{1,2})\D+(?P<year>\d{4}|\d{2})(?!\d)"),
+)
+
+_LAYOUT_PATTERNS = {name: re.compile(pattern, re.IGNORECASE) for name, pattern in DATE_LAYOUTS}
+# Group names must be unique across alternatives, so each layout's groups are prefixed with its name
+_CLASSIFIER = re.compile(
+    "|".join(
+        f"(?P<{name}>" + re.sub(r"\(\?P([<=])(\w+)", rf"(?P\g<1>{name}__\g<2>", pattern) + ")"
+        for name, pattern in DATE_LAYOUTS
+    ),
+    re.IGNORECASE,
+)
+_ORDINAL_SUFFIX = re.compile(r"(?:st|nd|rd|th)$", re.IGNORECASE)
+
+
+def _expand_year(year):
+    """Two-digit years pivot at 50 as the original parser did: 00-49 is 20xx, 50-99 is 19xx."""
+    if len(year) == 2:
+        return int(year) + (2000 if int(year) < 50 else 1900)
+    return int(year)
+
+
+class DateNormalizer:
+    """
+    Normalizes W9 signature dates to YYYY-MM-DD.
+
+    The layout is classified in one pass by a single compiled alternation over
+    DATE_LAYOUTS instead of trying strptime formats until one stops raising.
+    The layouts recent inputs matched are remembered and tried first on their
+    own (one anchored match when a batch is all written the same way), and
+    exact strings are memoized since the same dates recur across a batch.
+
+    All-numeric dates are resolved explicitly: a part above 12 can only be the
+    day; otherwise "/" and "-" dates follow `order` ("US" month first, "EU" day
+    first) and "." dates are read day first, as they are written in Europe.
+    """
+
+    def __init__(self, order=DATE_ORDER, cache_size=DATE_CACHE_SIZE, recent_layouts=2):
+        self.order = order
+        self.recent_layouts = recent_layouts
+        self._recent = []
+        self.parse = lru_cache(maxsize=cache_size)(self._parse)
+
+    def _month_first(self, first, second, separator):
+        if first > 12:
+            return False
+        if second > 12:
+            return True
+        if separator and separator.strip() == ".":
+            return False
+        return self.order != "EU"
+
+    def _build(self, groups):
+        year = _expand_year(groups["year"])
+        if groups.get("first") is not None:
+            first, second = int(groups["first"]), int(groups["second"])
+            if self._month_first(first, second, groups.get("sep")):
+                month, day = first, second
+            else:
+                month, day = second, first
+        else:
+            month = groups["month"]
+            month = int(month) if month.isdigit() else MONTH_NUMBERS[month[:3].lower()]
+            day = int(_ORDINAL_SUFFIX.sub("", groups["day"]))
+        try:
+            return date(year, month, day)
+        except ValueError:
+            return None
+
+    def _remember(self, name):
+        if self._recent[:1] != [name]:
+            # Rebinding the list is atomic, so concurrent callers never see it half-updated
+            self._recent = ([name] + [recent for recent in self._recent if recent != name])[:self.recent_layouts]
+
+    def _parse(self, text):
+        """Returns the datetime.date written in text, or None when it holds no valid date."""
+        text = text.strip()
+        for name in self._recent:
+            match = _LAYOUT_PATTERNS[name].fullmatch(text)
+            if match:
+                return self._build(match.groupdict())
+
+        match = _CLASSIFIER.search(text)
+        if match is None:
+            return None
+        name = match.lastgroup
+        prefix = f"{name}__"
+        groups = {key[len(prefix):]: value for key, value in match.groupdict().items() if key.startswith(prefix)}
+        parsed = self._build(groups)
+        if parsed is not None and _LAYOUT_PATTERNS[name].fullmatch(text):
+            self._remember(name)
+        return parsed
+
+    def normalize(self, text):
+        """Returns text as YYYY-MM-DD, or stripped but otherwise unchanged when it cannot be parsed."""
+        parsed = self.parse(text)
+        if parsed is None:
+            Logger.warning("Could not parse date: %s", text)
+            return text.strip()
+        return parsed.isoformat()
+
+
+date_normalizer = DateNormalizer()
+
+
+def normalize_date(text):
+    """Normalizes a W9 date string to YYYY-MM-DD with the shared DateNormalizer."""
+    return date_normalizer.normalize(text)
@@ -0,0 +1,208 @@
+import os
+import threading
+import time
+from urllib.parse import urlparse
+from app.configuration.logger_setup import Logger
+from app.services.metrics import ENDPOINT_OUTSTANDING, ENDPOINT_EJECTIONS, ENDPOINT_HEALTHY
+from app.services.resilience import is_throttle, is_transient, retry_after_seconds
+
+# "endpoint|api_key[|weight];endpoint|api_key[|weight];..."; falls back to AZURE_ENDPOINT/AZURE_API_KEY
+AZURE_ENDPOINTS = os.getenv("AZURE_ENDPOINTS")
+# least_outstanding or weighted_round_robin
+AZURE_BALANCING = os.getenv("AZURE_BALANCING", "least_outstanding")
+AZURE_EJECT_SECONDS = float(os.getenv("AZURE_EJECT_SECONDS", "5"))
+AZURE_MAX_EJECT_SECONDS = float(os.getenv("AZURE_MAX_EJECT_SECONDS", "120"))
+
+LEAST_OUTSTANDING = "least_outstanding"
+WEIGHTED_ROUND_ROBIN = "weighted_round_robin"
+
+
+class NoEndpointsConfigured(Exception):
+    """Raised when a pool with no Azure endpoints is asked for one."""
+
+
+class AzureEndpoint:
+    """One Document Intelligence resource and its live balancing state."""
+
+    __slots__ = ("endpoint", "api_key", "weight", "label", "outstanding", "current_weight", "ejected_until", "ejections")
+
+    def __init__(self, endpoint, api_key, weight=1):
+        self.endpoint = endpoint
+        self.api_key = api_key
+        self.weight = max(int(weight), 1)
+        self.label = urlparse(endpoint).netloc or endpoint
+        self.outstanding = 0
+        self.current_weight = 0
+        self.ejected_until = 0.0
+        self.ejections = 0
+
+    def is_healthy(self, now):
+        return self.ejected_until <= now
+
+
+def parse_endpoints(spec=AZURE_ENDPOINTS):
+    """
+    Reads the endpoint pool from AZURE_ENDPOINTS, or the single AZURE_ENDPOINT/AZURE_API_KEY pair when it is unset.
+
+    Returns:
+        list: AzureEndpoint entries, empty when nothing is configured.
+    """
+    if not spec:
+        endpoint, api_key = os.getenv("AZURE_ENDPOINT"), os.getenv("AZURE_API_KEY")
+        return [AzureEndpoint(endpoint, api_key)] if endpoint and api_key else []
+
+    endpoints = []
+    for entry in filter(None, (part.strip() for part in spec.split(";"))):
+        parts = entry.split("|")
+        if len(parts) not in (2, 3):
+            raise ValueError(f"Invalid AZURE_ENDPOINTS entry, expected endpoint|api_key[|weight]: {parts[0]}")
+        endpoints.append(AzureEndpoint(*parts))
+    return endpoints
+
+
+class EndpointPool:
+    """
+    Spreads Azure analyses over several Document Intelligence resources so
+    throughput is not capped by one resource's TPS quota.
+
+    Endpoints are picked by least outstanding requests (scaled by weight) or
+    by smooth weighted round-robin. An endpoint answering 429, 5xx or timing
+    out is ejected for its Retry-After or an exponentially growing cooldown,
+    and the call fails over to the next healthy endpoint. It is re-admitted
+    once the cooldown passes; a success resets its backoff. When every
+    endpoint is ejected the one due back soonest is used anyway, so the pool
+    degrades to retrying rather than refusing work.
+    """
+
+    def __init__(self, endpoints, strategy=AZURE_BALANCING, eject_seconds=AZURE_EJECT_SECONDS, max_eject_seconds=AZURE_MAX_EJECT_SECONDS):
+        if strategy not in (LEAST_OUTSTANDING, WEIGHTED_ROUND_ROBIN):
+            raise ValueError(f"Unknown AZURE_BALANCING strategy: {strategy}")
+        self.endpoints = list(endpoints)
+        self.strategy = strategy
+        self.eject_seconds = eject_seconds
+        self.max_eject_seconds = max_eject_seconds
+        self._lock = threading.Lock()
+        for endpoint in self.endpoints:
+            ENDPOINT_HEALTHY.labels(endpoint.label).set(1)
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    def _pick(self, candidates):
+        # Called with the lock held
+        if self.strategy == LEAST_OUTSTANDING:
+            return min(candidates, key=lambda endpoint: endpoint.outstanding / endpoint.weight)
+        # Smooth weighted round-robin (as in nginx): heavier endpoints are picked more often but never in bursts
+        total = 0
+        for endpoint in candidates:
+            endpoint.current_weight += endpoint.weight
+            total += endpoint.weight
+        chosen = max(candidates, key=lambda endpoint: endpoint.current_weight)
+        chosen.current_weight -= total
+        return chosen
+
+    def acquire(self, exclude=()):
+        """Picks an endpoint for one request and counts it as outstanding; pair with release()."""
+        if not self.endpoints:
+            raise NoEndpointsConfigured("No Azure endpoints configured. Set AZURE_ENDPOINTS or AZURE_ENDPOINT/AZURE_API_KEY.")
+        now = time.monotonic()
+        with self._lock:
+            candidates = [endpoint for endpoint in self.endpoints if endpoint not in exclude] or self.endpoints
+            healthy = [endpoint for endpoint in candidates if endpoint.is_healthy(now)]
+            if healthy:
+                endpoint = self._pick(healthy)
+            else:
+                endpoint = min(candidates, key=lambda endpoint: endpoint.ejected_until)
+            endpoint.outstanding += 1
+        ENDPOINT_OUTSTANDING.labels(endpoint.label).inc()
+        return endpoint
+
+    def release(self, endpoint, error=None):
+        """Ends a request started by acquire(), ejecting the endpoint when error is a throttle or transient failure."""
+        ENDPOINT_OUTSTANDING.labels(endpoint.label).dec()
+        with self._lock:
+            endpoint.outstanding -= 1
+            if error is None:
+                if endpoint.ejections:
+                    Logger.info("Azure endpoint %s healthy again", endpoint.label)
+                    ENDPOINT_HEALTHY.labels(endpoint.label).set(1)
+                endpoint.ejections = 0
+                return
+            if not isinstance(error, Exception) or not is_transient(error):
+                return
+            now = time.monotonic()
+            already_ejected = not endpoint.is_healthy(now)
+            cooldown = retry_after_seconds(error)
+            if cooldown is None:
+                cooldown = min(self.eject_seconds * 2 ** endpoint.ejections, self.max_eject_seconds)
+            endpoint.ejected_until = max(endpoint.ejected_until, now + cooldown)
+            if already_ejected:
+                # Other requests that were in flight when it was ejected; they do not lengthen the backoff
+                return
+            endpoint.ejections += 1
+        reason = "throttled" if is_throttle(error) else type(error).__name__
+        ENDPOINT_EJECTIONS.labels(endpoint.label, reason).inc()
+        ENDPOINT_HEALTHY.labels(endpoint.label).set(0)
+        Logger.warning("Ejected Azure endpoint %s for %.1fs (%s)", endpoint.label, cooldown, reason)
+
+    def _should_fail_over(self, error, tried):
+        return is_transient(error) and len(tried) < len(self.endpoints)
+
+    def call(self, function):
+        """
+        Calls function(endpoint), failing over to other endpoints on throttling
+        and transient errors. The last error is raised once every endpoint has been tried.
+        """
+        tried = []
+        while True:
+            endpoint = self.acquire(exclude=tried)
+            tried.append(endpoint)
+            try:
+                result = function(endpoint)
+            except Exception as e:
+                self.release(endpoint, e)
+                if not self._should_fail_over(e, tried):
+                    raise
+                continue
+            except BaseException as e:
+                self.release(endpoint, e)
+                raise
+            self.release(endpoint)
+            return result
+
+    async def call_async(self, function):
+        """Awaitable version of call(); function(endpoint) returns a coroutine."""
+        tried = []
+        while True:
+            endpoint = self.acquire(exclude=tried)
+            tried.append(endpoint)
+            try:
+                result = await function(endpoint)
+            except Exception as e:
+                self.release(endpoint, e)
+                if not self._should_fail_over(e, tried):
+                    raise
+                continue
+            except BaseException as e:
+                self.release(endpoint, e)  # cancelled: counted as neither a success nor a failure
+                raise
+            self.release(endpoint)
+            return result
+
+    def status(self):
+        """Per-endpoint weight, outstanding requests and ejection state, for diagnostics."""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "endpoint": endpoint.label,
+                    "weight": endpoint.weight,
+                    "outstanding": endpoint.outstanding,
+                    "healthy": endpoint.is_healthy(now),
+                    "ejected_for_seconds": round(max(endpoint.ejected_until - now, 0.0), 1),
+                }
+                for endpoint in self.endpoints
+            ]
+
+
+azure_endpoint_pool = EndpointPool(parse_endpoints())
@@ -0,0 +1,138 @@
+import os
+import time
+from app.services.formatting_result import FORMATTER_VERSION
+from app.services.result_cache import result_cache, make_cache_key, is_cacheable
+from app.services.upload_stream import ResendableStream
+from app.services.pdf_preflight import NotW9Document
+from app.services.metrics import record_error
+from app.services.resilience import BackendUnavailable
+from app.services.endpoint_pool import azure_endpoint_pool
+from app.services.model_routing import w9_model_router
+from app.services.result_store import result_store
+from app.services.request_coalescer import request_coalescer
+from app.configuration.logger_setup import Logger
+
+# How long each wait on an Azure analysis lasts before logging that it is still running
+ANALYSIS_TIMEOUT_SECONDS = 30
+# An analysis still running after this long is given up on (without re-submitting it)
+ANALYSIS_MAX_WAIT_SECONDS = float(os.getenv("ANALYSIS_MAX_WAIT_SECONDS", "120"))
+
+# Reported in every response under "Extraction Engine"
+ENGINE_AZURE = "azure"
+ENGINE_ACROFORM = "acroform"
+
+
+class AnalysisTimeout(Exception):
+    """
+    An accepted Azure analysis was still running after ANALYSIS_MAX_WAIT_SECONDS.
+
+    Not a transient error on purpose: retrying would submit (and bill) the same
+    analysis again, and a slow operation says nothing about the endpoint's health.
+    continuation_token lets the operation be resumed with a poller's from_continuation_token.
+    """
+
+    def __init__(self, continuation_token=None):
+        super().__init__(f"Azure analysis still running after {ANALYSIS_MAX_WAIT_SECONDS:g} seconds")
+        self.continuation_token = continuation_token
+
+
+def analysis_wait_windows():
+    """
+    Yields how long to wait on an analysis operation each time round, until
+    ANALYSIS_MAX_WAIT_SECONDS are spent; the caller raises AnalysisTimeout once it runs out.
+    """
+    deadline = time.monotonic() + ANALYSIS_MAX_WAIT_SECONDS
+    while True:
+        remaining = deadline - time.monotonic()
+        yield max(min(ANALYSIS_TIMEOUT_SECONDS, remaining), 0)
+        if remaining <= ANALYSIS_TIMEOUT_SECONDS:
+            return
+        Logger.info("Azure analysis still running after %s seconds, polling the same operation", ANALYSIS_TIMEOUT_SECONDS)
+
+
+class BaseW9FormExtraction:
+    """
+    What W9FormExtraction and AsyncW9FormExtraction share: cache keys, what
+    AcroForm and preflight results mean for the analysis, keeping results and
+    turning failures into error responses. The subclasses only make the calls,
+    blocking or awaited.
+    """
+
+    formatter_version = FORMATTER_VERSION
+
+    def __init__(self, cache=result_cache, endpoint_pool=azure_endpoint_pool, model_router=w9_model_router, store=result_store, coalescer=request_coalescer):
+        self.endpoint_pool = endpoint_pool
+        self.model_router = model_router
+        self.cache = cache
+        self.store = store
+        self.coalescer = coalescer
+
+    def cache_key(self, digest, variant=""):
+        return make_cache_key(digest, self.model_router.cache_model_id, f"{self.formatter_version}{variant}")
+
+    def idempotency_key(self, idempotency_key):
+        return f"idempotency:{self.formatter_version}:{idempotency_key}"
+
+    @property
+    def result_version(self):
+        """Version results are stored under: the model route and formatter, as in the cache key."""
+        return f"{self.model_router.cache_model_id}:{self.formatter_version}"
+
+    @staticmethod
+    def acroform_analysis(acroform):
+        """(analysis, extracted_json, engine) for a digitally filled form, or None when Azure has to read it."""
+        if acroform is None:
+            return None
+        Logger.info("Filled AcroForm fields found, skipping Azure")
+        return acroform, acroform.to_extracted_json(), ENGINE_ACROFORM
+
+    @staticmethod
+    def analyze_kwargs(preflight):
+        """
+        begin_analyze_document options for a document given its preflight (None when preflight is off).
+
+        Raises:
+            NotW9Document: When preflight shows the PDF is not a W9.
+        """
+        if preflight is None:
+            return {}
+        if preflight.is_w9 is False:
+            Logger.info("Preflight found no W9 page in %s-page PDF, skipping Azure", preflight.page_count)
+            raise NotW9Document("Document does not appear to be a W9 form")
+        if preflight.pages:
+            Logger.info("Preflight limiting analysis to pages %s of %s", preflight.pages, preflight.page_count)
+            return {"pages": preflight.pages}
+        return {}
+
+    @staticmethod
+    def request_body(document):
+        # Every try must resend the stream from the start
+        return ResendableStream(document) if hasattr(document, "seek") else document
+
+    @staticmethod
+    def with_engine(formatted_json, engine):
+        if isinstance(formatted_json, dict):
+            formatted_json["Extraction Engine"] = engine
+        return formatted_json
+
+    def cache_result(self, cache_key, formatted_json):
+        """Caches a result worth keeping; True when it should be stored as well."""
+        if not is_cacheable(formatted_json):
+            return False
+        self.cache.set(cache_key, formatted_json)
+        return self.store is not None
+
+    def extraction_failed(self, error, what="form"):
+        """
+        The {"error": ...} response for an exception an extraction raised.
+
+        BackendUnavailable is re-raised so callers can answer 503 with Retry-After instead of an error body.
+        """
+        record_error("extraction", error)
+        if isinstance(error, NotW9Document):
+            return {"error": str(error)}
+        if isinstance(error, BackendUnavailable):
+            Logger.warning("Azure unavailable: %s", error)
+            raise error
+        Logger.error("An error occured during %s extraction: %s", what, error, exc_info=error)
+        return {"error": f"Error extracting {what}: {str(error)}"}
@@ -1,12 +1,15 @@
 import os
-import tempfile
 import base64
 import sys
 import streamlit as st
 
-
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))) #needed for streamlit to identify relative system paths
+from app.configuration.environment import load_environment
+
+load_environment()
 from app.services.form_extraction import W9FormExtraction    #add any module imports after  the above line
+from app.services.upload_stream import hash_stream
+from app.services.resilience import BackendUnavailable
 
 w9_form_extractor = W9FormExtraction()
 
@@ -67,9 +70,8 @@ if not st.session_state["authenticated"]:
 
 
 
-def display_pdf_viewer(pdf_path):
-        with open(pdf_path, "rb") as pdf_file:
-            base64_pdf = base64.b64encode(pdf_file.read()).decode("utf-8")
+def display_pdf_viewer(pdf_bytes):
+        base64_pdf = base64.b64encode(pdf_bytes).decode("utf-8")
         pdf_viewer = f'<iframe src="data:application/pdf;base64,{base64_pdf}" width="100%" height="850px"></iframe>'
         st.markdown(pdf_viewer, unsafe_allow_html=True)
 
@@ -95,29 +97,25 @@ def main():
     )
 
     if uploaded_file:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-            tmp_file.write(uploaded_file.read())
-            temp_path = tmp_file.name  
-
-
-
+        # The upload is already an in-memory stream; hash it and hand it to Azure directly
         with st.spinner("⏳ Extracting data... Please wait!"):
-            extracted_data = w9_form_extractor.extract_form_data(temp_path)
+            try:
+                extracted_data = w9_form_extractor.extract_document(uploaded_file, hash_stream(uploaded_file))
+            except BackendUnavailable as e:
+                st.error(f"⚠️ {e}")
+                return
 
         
         col1, col2 = st.columns([0.5, 0.5])
 
         with col1:
             st.subheader("📑 PDF Viewer")
-            display_pdf_viewer(temp_path)
+            display_pdf_viewer(uploaded_file.getvalue())
 
         with col2:
             st.subheader("📜 Extracted W9 Data")
             st.json(extracted_data, expanded=True) 
 
 
-        os.remove(temp_path)
-
-
 if __name__ == "__main__":
     main()
\ No newline at end of file
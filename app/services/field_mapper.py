@@ -0,0 +1,41 @@
+import re
+from functools import lru_cache
+
+
+class FieldMapper:
+    """
+    Maps extracted key text to canonical W9 fields from a declarative table.
+
+    The table is a sequence of (substring, canonical field) pairs in priority
+    order: a key maps to the field of the FIRST entry whose substring occurs
+    in it, exactly like the if/elif chain it replaces. All substrings are
+    compiled once into a single lookahead alternation so one scan of the key
+    finds every candidate, and results are memoized per key because Azure
+    reports the same printed labels for every W9.
+    """
+
+    def __init__(self, table, output_fields, cache_size=4096):
+        self.table = tuple(table)
+        self.output_fields = tuple(output_fields)
+        self._priority = {}
+        for index, (substring, _) in enumerate(self.table):
+            self._priority.setdefault(substring, index)
+        # Zero-width lookahead so overlapping candidates are all seen; at any one position
+        # the alternation tries entries in table order, so the higher-priority one wins there too
+        self._pattern = re.compile("(?=(" + "|".join(re.escape(substring) for substring, _ in self.table) + "))")
+        self.match = lru_cache(maxsize=cache_size)(self._match)
+
+    def _match(self, key):
+        """Returns the canonical field for key, or None when no table entry applies."""
+        best = None
+        for candidate in self._pattern.finditer(key):
+            index = self._priority[candidate.group(1)]
+            if best is None or index < best:
+                best = index
+                if best == 0:
+                    break
+        return self.table[best][1] if best is not None else None
+
+    def empty_record(self):
+        """Returns a fresh {field: {"value": None, "confidence": None}} dict in output order."""
+        return {field: {"value": None, "confidence": None} for field in self.output_fields}
@@ -1,62 +1,136 @@
-import os
-import sys
 from pathlib import Path
-from azure.ai.formrecognizer import DocumentAnalysisClient
-from azure.core.credentials import AzureKeyCredential
-from dotenv import load_dotenv
+from app.services.formatting_result import format_extracted_json
+from app.services.client_registry import get_document_analysis_client
+from app.services.result_cache import document_hash
+from app.services.upload_stream import hash_stream
+from app.services.pdf_preflight import preflight_pdf, PREFLIGHT_ENABLED
+from app.services.image_normalization import normalize, IMAGE_NORMALIZATION_ENABLED
+from app.services.acroform_extraction import extract_acroform_fields, ACROFORM_ENABLED
+from app.services.metrics import track_stage, timed
+from app.services.resilience import azure_backend
+from app.services.extraction_base import BaseW9FormExtraction, AnalysisTimeout, analysis_wait_windows, ENGINE_AZURE
+from app.configuration.logger_setup import Logger
 
 
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))  #needed for streamlit to identify relative system paths
-from app.services.formatting_result import format_extracted_json     #add any module imports after  the above line
-from app.configuration.logger_setup import Logger
-load_dotenv()
+def wait_for_analysis(poller):
+    """Polls the same analysis operation until it finishes, raising AnalysisTimeout past ANALYSIS_MAX_WAIT_SECONDS."""
+    for window in analysis_wait_windows():
+        poller.wait(timeout=window)
+        if poller.done():
+            return poller.result()
+    raise AnalysisTimeout(poller.continuation_token())
+
 
-class W9FormExtraction:
+class W9FormExtraction(BaseW9FormExtraction):
 
-    def __init__ (self):
-        self.azure_endpoint = os.getenv("AZURE_ENDPOINT")
-        self.azure_api_key= os.getenv("AZURE_API_KEY")
+    def client(self, endpoint):
+        """Return the shared, connection-pooled Azure Form Recognizer client for a pool endpoint"""
+        return get_document_analysis_client(endpoint.endpoint, endpoint.api_key)
+
+    def format_result(self, result, extracted_json):
+        return format_extracted_json(result, extracted_json)
 
-    def client(self):
-        """Initialize Azure Form Recognizer client"""
-        return DocumentAnalysisClient(self.azure_endpoint, AzureKeyCredential(self.azure_api_key))
-    
     def extract_form_data(self, pdf_path):
         pdf_path = Path(pdf_path)
 
         if not pdf_path.exists():
             return {"error": "PDF file not found"}
-        
-       
-        try:
-            document_ai_client = self.client()
-
-            with open(pdf_path, "rb") as file:
-                poller = document_ai_client.begin_analyze_document("prebuilt-document", document=file)
-            
-            result = poller.result(timeout=30) 
-           
-            extracted_json = {}
-
-
-            for index, kv_pair in enumerate(result.key_value_pairs):
-                key = kv_pair.key.content.strip() if kv_pair.key and kv_pair.key.content else None
-                value = kv_pair.value.content.strip() if kv_pair.value and kv_pair.value.content else None
-                confidence = kv_pair.confidence
-                
-                if key:
-                    extracted_json[key] = {
-                       "value" : value,
-                       "confidence" : confidence
-                    }
-
-            Logger.info(f"printing extracted json:{extracted_json}")
-            formatted_json = format_extracted_json(result, extracted_json)
 
+        with open(pdf_path, "rb") as file:
+            return self.extract_document(file, hash_stream(file, max_bytes=None))
+
+    def extract_form_bytes(self, file_bytes, idempotency_key=None):
+        """Extracts W9 data from in-memory PDF bytes."""
+        return self.extract_document(file_bytes, document_hash(file_bytes), idempotency_key)
+
+    def analyze(self, document):
+        """
+        Reads the key/value pairs of a W9 PDF or image, locally from its AcroForm
+        fields when it was filled digitally and otherwise with Azure.
+
+        Returns:
+            tuple: (analysis, extracted_json, engine) where analysis is a CompactAnalysis.
+
+        Raises:
+            NotW9Document: When preflight shows the PDF is not a W9.
+            BackendUnavailable: When Azure is throttling or failing beyond the retry budget.
+        """
+        if IMAGE_NORMALIZATION_ENABLED:
+            # Image uploads become a PDF and oversized scans are shrunk before anything reads them
+            with track_stage("image_normalization"):
+                document = normalize(document)
+
+        if ACROFORM_ENABLED:
+            with track_stage("acroform"):
+                acroform = self.acroform_analysis(extract_acroform_fields(document))
+            if acroform is not None:
+                return acroform
+
+        preflight = None
+        if PREFLIGHT_ENABLED:
+            with track_stage("preflight"):
+                preflight = preflight_pdf(document)
+        analyze_kwargs = self.analyze_kwargs(preflight)
+
+        with track_stage("azure_analysis"):
+            analysis = azure_backend.call(self.run_analysis, document, analyze_kwargs)
+
+        return analysis, analysis.to_extracted_json(), ENGINE_AZURE
+
+    def run_analysis(self, document, analyze_kwargs):
+        """
+        One attempt at an Azure analysis, on the W9 model first when one is configured
+        and failing over across the endpoint pool; retried by azure_backend.
+        """
+
+        def analyze_with(model_id):
+            def analyze_on(endpoint):
+                poller = self.client(endpoint).begin_analyze_document(model_id, document=self.request_body(document), **analyze_kwargs)
+                return wait_for_analysis(poller)
+
+            return self.endpoint_pool.call(analyze_on)
+
+        # The router keeps only what formatting needs of each AnalyzeResult
+        return self.model_router.analyze(analyze_with)
+
+    @timed("extraction")
+    def extract_document(self, document, digest, idempotency_key=None):
+        """
+        Extracts W9 data from PDF bytes or a seekable binary stream, serving repeat documents from the result cache.
+
+        The stream is handed straight to Azure, so uploads never need to be copied to a temp file first.
+        digest is the document's SHA-256, usually computed while the upload was being received.
+        Concurrent calls for the same document, or with the same idempotency_key, share one extraction,
+        and its result is replayed to repeats for a short window (see RequestCoalescer).
+        BackendUnavailable is re-raised so callers can answer 503 with Retry-After instead of an error body.
+
+        Raises:
+            IdempotencyKeyReused: When idempotency_key was already used for a different document.
+        """
+        cache_key = self.cache_key(digest)
+        extract = lambda: self.coalescer.run(cache_key, lambda: self._extract_document(document, digest, cache_key), cache_key)
+        if idempotency_key:
+            return self.coalescer.run(self.idempotency_key(idempotency_key), extract, cache_key)
+        return extract()
+
+    def _extract_document(self, document, digest, cache_key):
+        cached_json = self.cache.get(cache_key)
+        if cached_json is not None:
+            return cached_json
+
+        # Results outlive the cache in the store, so a document seen before is never re-extracted
+        stored_json = self.store.get(digest, self.result_version) if self.store is not None else None
+        if stored_json is not None:
+            self.cache.set(cache_key, stored_json)
+            return stored_json
+
+        try:
+            result, extracted_json, engine = self.analyze(document)
+            Logger.debug("Extracted key/value pairs: %s", extracted_json)
+            formatted_json = self.with_engine(self.format_result(result, extracted_json), engine)
+            if self.cache_result(cache_key, formatted_json):
+                self.store.save(digest, self.result_version, formatted_json)
             return formatted_json
 
         except Exception as e:
-            import traceback
-            error_message = traceback.format_exc()
-            print("An error occured during processing:", error_message) 
-            return {"error": f"Error extracting form: {str(e)}"}
+            return self.extraction_failed(e)
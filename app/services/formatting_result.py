@@ -1,98 +1,47 @@
 import re
-import sys
-import os
-
-
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))  #needed for streamlit to identify relative system paths
-from app.configuration.logger_setup import Logger  #add any module imports after  the above line
-
-
+from app.configuration.logger_setup import Logger
+from app.services.field_mapper import FieldMapper
+from app.services.metrics import timed
+
+# Bump whenever the shape or content of format_extracted_json's output changes so cached results are not reused
+FORMATTER_VERSION = "3"
+
+
+# Substring in the extracted key -> canonical field, highest priority first
+W9_FIELD_TABLE = (
+    # Before "Name", which also occurs in business-name labels such as "2 Business Name/disregarded entity name"
+    ("Business name", "Business Name"),
+    ("Business Name", "Business Name"),
+    ("Name", "Entity Name"),
+    ("City, state, and ZIP code", "City/State/Zip Code"),
+    ("Employer identification number", "EIN"),
+    ("Social security number", "SSN"),
+    ("Date", "Date"),
+    ("Signature", "Signature"),
+    ("Address", "Address"),
+)
+W9_OUTPUT_FIELDS = ("Entity Name", "Business Name", "Address", "City/State/Zip Code", "SSN", "EIN", "Date", "Signature")
+
+W9_FIELD_MAPPER = FieldMapper(W9_FIELD_TABLE, W9_OUTPUT_FIELDS)
+REVISION_PATTERN = re.compile(r"\bRev\.\s*([A-Za-z]+)\s*(\d{4})", re.IGNORECASE)
+
+
+@timed("formatting")
 def format_extracted_json(result, extracted_json):
     try:
-        pattern = r"\bRev\.\s*([A-Za-z]+)\s*(\d{4})"
-        match = re.search(pattern, result.content, re.IGNORECASE)
-        if match:
-            revision = f"Rev. {match.group(1)} {match.group(2)}"
-        else:
-               revision = ""
-        formatted_json = {
-                                "Entity Name" :{
-                                        "value":None,
-                                        "confidence":None
-                                },
-                                "Business Name" :{
-                                        "value":None,
-                                        "confidence":None
-                                },
-                                "Address" :{
-                                        "value":None,
-                                        "confidence":None
-                                },
-                                "City/State/Zip Code" :{
-                                        "value":None,
-                                        "confidence":None
-                                },
-                                "SSN" :{
-                                        "value":None,
-                                        "confidence":None
-                                },
-                                "EIN" :{
-                                        "value":None,
-                                        "confidence":None
-                                },
-                                "Date" :{
-                                        "value":None,
-                                        "confidence":None
-                                },
-                                "Signature":{
-                                      "value":None,
-                                    "confidence":None
-                                },
-                                "Address": {
-                                        "value":None,
-                                    "confidence":None
-                                },
-                                
-                                "W9 Form Revision" : revision
-                        }
-        
- 
-        for k,v in extracted_json.items():
-                    
-                    if "Name" in k:
-                            formatted_json["Entity Name"]["value"] = v["value"]
-                            formatted_json["Entity Name"]["confidence"] = v["confidence"]
-
-                    elif "Business name" in k:
-                            formatted_json["Business Name"]["value"] = v["value"]
-                            formatted_json["Business Name"]["confidence"] = v["confidence"]
-
-                    elif "City, state, and ZIP code" in k:
-                            formatted_json["City/State/Zip Code"]["value"] = v["value"]
-                            formatted_json["City/State/Zip Code"]["confidence"] = v["confidence"]
-
-                    elif "Employer identification number" in k:
-                        formatted_json["EIN"]["value"] = v["value"]
-                        formatted_json["EIN"]["confidence"] = v["confidence"]
-
-                    elif "Social security number" in k:
-                        formatted_json["SSN"]["value"] = v["value"]
-                        formatted_json["SSN"]["confidence"] = v["confidence"]
-                    
-                    elif "Date" in k:
-                        formatted_json["Date"]["value"] = v["value"]
-                        formatted_json["Date"]["confidence"] = v["confidence"]
+        match = REVISION_PATTERN.search(result.content)
+        revision = f"Rev. {match.group(1)} {match.group(2)}" if match else ""
 
-                    elif "Signature" in k:
-                        formatted_json["Signature"]["value"] = v["value"]
-                        formatted_json["Signature"]["confidence"] = v["confidence"]
+        formatted_json = W9_FIELD_MAPPER.empty_record()
+        formatted_json["W9 Form Revision"] = revision
 
-                    elif "Address" in k:
-                        formatted_json["Address"]["value"] = v["value"]
-                        formatted_json["Address"]["confidence"] = v["confidence"]
+        for k, v in extracted_json.items():
+            field = W9_FIELD_MAPPER.match(k)
+            if field is not None:
+                formatted_json[field] = {"value": v["value"], "confidence": v["confidence"]}
 
         return formatted_json
 
     except Exception as e:
-          Logger.error(f"got error during formatting: {str(e)}")
-          return f"Error occurred during formatting: {str(e)}"
\ No newline at end of file
+          Logger.error("got error during formatting: %s", e)
+          return f"Error occurred during formatting: {str(e)}"
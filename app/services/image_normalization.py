@@ -0,0 +1,177 @@
+import asyncio
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from PIL import Image, ImageOps, ImageSequence
+from PyPDF2 import PdfReader, PdfWriter
+from app.services.pdf_preflight import PREFLIGHT_MIN_TEXT_CHARS
+from app.services.upload_stream import read_document
+from app.configuration.logger_setup import Logger
+
+IMAGE_NORMALIZATION_ENABLED = os.getenv("IMAGE_NORMALIZATION", "true").lower() == "true"
+# Scans above this resolution are downsampled to it; Azure reads printed and handwritten W9s reliably at 150-300 dpi
+IMAGE_TARGET_DPI = int(os.getenv("IMAGE_TARGET_DPI", "200"))
+# "grayscale" (JPEG) or "bilevel" (CCITT G4, far smaller but loses faint handwriting)
+IMAGE_COLOR_MODE = os.getenv("IMAGE_COLOR_MODE", "grayscale").lower()
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "75"))
+# Gray level at or below which a pixel turns black in bilevel mode
+IMAGE_BILEVEL_THRESHOLD = int(os.getenv("IMAGE_BILEVEL_THRESHOLD", "160"))
+# Scanned PDFs smaller than this are sent as they are; images are always converted to PDF
+IMAGE_NORMALIZATION_MIN_BYTES = int(os.getenv("IMAGE_NORMALIZATION_MIN_BYTES", str(2 * 1024 * 1024)))
+# "process" keeps the CPU-bound decoding and resampling off every request thread; "thread" avoids the worker processes
+IMAGE_NORMALIZATION_POOL = os.getenv("IMAGE_NORMALIZATION_POOL", "process").lower()
+IMAGE_NORMALIZATION_WORKERS = int(os.getenv("IMAGE_NORMALIZATION_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Uploads accepted besides PDFs; they are analysed as the PDF normalize_document builds from them
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg", ".tif", ".tiff")
+IMAGE_SIGNATURES = (b"\x89PNG\r\n\x1a\n", b"\xff\xd8\xff", b"II*\x00", b"MM\x00*")
+
+# Photos carry no meaningful DPI, so their resolution is judged against the long side of a Letter page
+LETTER_LONG_SIDE_INCHES = 11
+
+
+def is_image(document):
+    """True for PNG, JPEG and TIFF bytes, told apart from PDFs by their signature."""
+    return document.startswith(IMAGE_SIGNATURES)
+
+
+def prepare_page(image, dpi):
+    """Downsamples one page image scanned at dpi to IMAGE_TARGET_DPI and converts it to the configured color mode."""
+    image = ImageOps.exif_transpose(image)
+    if dpi > IMAGE_TARGET_DPI:
+        scale = IMAGE_TARGET_DPI / dpi
+        image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.Resampling.LANCZOS)
+        dpi = IMAGE_TARGET_DPI
+    image = image.convert("L")
+    if IMAGE_COLOR_MODE == "bilevel":
+        # A fixed threshold rather than convert("1")'s dithering, which breaks characters apart for OCR
+        image = image.point(lambda level: 255 if level > IMAGE_BILEVEL_THRESHOLD else 0, mode="1")
+    return image, dpi
+
+
+def write_pdf(pages):
+    """Builds a PDF from (image, dpi, rotation) pages, keeping each page its original physical size."""
+    writer = PdfWriter()
+    for image, dpi, rotation in pages:
+        page_pdf = io.BytesIO()
+        # Grayscale pages are stored as JPEG; bilevel ones as CCITT G4, which takes no quality
+        options = {"quality": IMAGE_JPEG_QUALITY} if image.mode == "L" else {}
+        image.save(page_pdf, "PDF", resolution=dpi, **options)
+        page = PdfReader(page_pdf).pages[0]
+        if rotation:
+            page.rotate(rotation)
+        writer.add_page(page)
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def image_to_pdf(document):
+    """Normalizes a PNG/JPEG/(multi-page) TIFF upload into a PDF with one page per frame."""
+    with Image.open(io.BytesIO(document)) as image:
+        pages = []
+        for frame in ImageSequence.Iterator(image):
+            dpi = max(frame.size) / LETTER_LONG_SIDE_INCHES
+            prepared, dpi = prepare_page(frame.copy(), dpi)
+            pages.append((prepared, dpi, 0))
+    return write_pdf(pages)
+
+
+def rebuild_scanned_pdf(document):
+    """
+    Rebuilds a PDF whose every page is a single scanned image with normalized copies of those images.
+
+    Returns:
+        bytes | None: The smaller PDF, or None when any page has a text layer (or AcroForm
+        fields) that rebuilding would lose, or an image that cannot be decoded.
+    """
+    reader = PdfReader(io.BytesIO(document))
+    if reader.is_encrypted or "/AcroForm" in reader.trailer["/Root"]:
+        return None
+    pages = []
+    for page in reader.pages:
+        if len((page.extract_text() or "").strip()) >= PREFLIGHT_MIN_TEXT_CHARS:
+            return None
+        images = page.images
+        if len(images) != 1:
+            return None
+        image = Image.open(io.BytesIO(images[0].data))
+        page_width_inches = float(page.mediabox.width) / 72
+        prepared, dpi = prepare_page(image, image.width / page_width_inches)
+        pages.append((prepared, dpi, page.get("/Rotate", 0) or 0))
+    return write_pdf(pages)
+
+
+def normalize_document(document):
+    """
+    Shrinks an upload before it is sent to Azure: image uploads become a PDF, and large
+    scanned PDFs are rebuilt with downsampled grayscale or bilevel images.
+
+    Args:
+        document (bytes): The uploaded file.
+
+    Returns:
+        bytes | None: The normalized PDF, or None when the original should be sent as it is.
+    """
+    try:
+        if is_image(document):
+            return image_to_pdf(document)
+        if len(document) < IMAGE_NORMALIZATION_MIN_BYTES:
+            return None
+        rebuilt = rebuild_scanned_pdf(document)
+    except Exception as e:
+        # Pillow and PyPDF2 raise all sorts of errors on odd files; Azure gets the original instead
+        Logger.warning("Could not normalize document images: %s", e)
+        return None
+    if rebuilt is None or len(rebuilt) >= len(document):
+        return None
+    Logger.info("Normalized scanned PDF from %s to %s bytes", len(document), len(rebuilt))
+    return rebuilt
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_image_pool():
+    """The worker pool for normalize_document, created on first use so gunicorn's preloaded master never forks it."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            if IMAGE_NORMALIZATION_POOL == "thread":
+                _pool = ThreadPoolExecutor(max_workers=IMAGE_NORMALIZATION_WORKERS, thread_name_prefix="image-normalization")
+            else:
+                # spawn, not fork: forking a worker with running threads and an event loop is unsafe
+                _pool = ProcessPoolExecutor(max_workers=IMAGE_NORMALIZATION_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def should_normalize(document):
+    """Whether document may be worth sending through the pool: any image, or a PDF of at least IMAGE_NORMALIZATION_MIN_BYTES."""
+    if isinstance(document, (bytes, bytearray)):
+        head, size = bytes(document[:8]), len(document)
+    else:
+        document.seek(0)
+        head = document.read(8)
+        size = document.seek(0, os.SEEK_END)
+        document.seek(0)
+    return is_image(head) or size >= IMAGE_NORMALIZATION_MIN_BYTES
+
+
+def normalize(document):
+    """normalize_document on the worker pool, skipping small PDFs without reading them."""
+    if not should_normalize(document):
+        return document
+    normalized = get_image_pool().submit(normalize_document, read_document(document)).result()
+    return document if normalized is None else normalized
+
+
+async def normalize_async(document):
+    """Awaitable normalize()."""
+    if not should_normalize(document):
+        return document
+    data = await asyncio.to_thread(read_document, document)
+    normalized = await asyncio.get_running_loop().run_in_executor(get_image_pool(), normalize_document, data)
+    return document if normalized is None else normalized
@@ -0,0 +1,359 @@
+import argparse
+import hashlib
+import hmac
+import json
+import multiprocessing
+import os
+import signal
+import sqlite3
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+import requests
+from app.configuration.environment import load_environment
+
+if __name__ == "__main__":
+    # Run as `python -m app.services.job_queue`: load .env before the settings below are read
+    load_environment()
+
+from app.configuration.logger_setup import Logger
+
+JOB_QUEUE_DB_PATH = os.getenv("JOB_QUEUE_DB_PATH", "w9_jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "0.5"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_STALE_AFTER_SECONDS = int(os.getenv("JOB_STALE_AFTER_SECONDS", "600"))
+WEBHOOK_TIMEOUT_SECONDS = float(os.getenv("WEBHOOK_TIMEOUT_SECONDS", "10"))
+# Webhooks may only go to these hosts over https; with none configured webhook_url is rejected
+WEBHOOK_ALLOWED_HOSTS = {host.strip().lower() for host in os.getenv("WEBHOOK_ALLOWED_HOSTS", "").split(",") if host.strip()}
+# Signs webhook bodies (X-W9-Signature: sha256=<hex HMAC>) so receivers can tell them from forgeries
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+# How often each worker looks for jobs a crashed worker left running
+JOB_STALE_CHECK_INTERVAL_SECONDS = float(os.getenv("JOB_STALE_CHECK_INTERVAL_SECONDS", "60"))
+# Longest a worker waits after a database error before claiming again
+JOB_DB_ERROR_MAX_BACKOFF_SECONDS = float(os.getenv("JOB_DB_ERROR_MAX_BACKOFF_SECONDS", "30"))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+
+class InvalidWebhookUrl(ValueError):
+    """Raised when a webhook_url is not https or its host is not in WEBHOOK_ALLOWED_HOSTS."""
+
+
+def validate_webhook_url(webhook_url):
+    """Raises InvalidWebhookUrl unless webhook_url is an https URL on an allowed host."""
+    parts = urlsplit(webhook_url)
+    if parts.scheme != "https" or not parts.hostname or parts.username or parts.password:
+        raise InvalidWebhookUrl("webhook_url must be an https URL.")
+    if parts.hostname.lower() not in WEBHOOK_ALLOWED_HOSTS:
+        raise InvalidWebhookUrl("webhook_url host is not allowed.")
+
+
+class JobQueue:
+    """
+    Durable extraction job queue stored in SQLite.
+
+    The API process only submits and reads jobs; worker processes claim them
+    with an IMMEDIATE transaction so each job is picked up exactly once.
+    """
+
+    def __init__(self, db_path=JOB_QUEUE_DB_PATH):
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, filename TEXT, document BLOB, "
+            "webhook_url TEXT, result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+            "submitted_at REAL NOT NULL, started_at REAL, finished_at REAL, claimed_at REAL, available_at REAL)"
+        )
+        # Queues created before jobs could be deferred lack the last two columns
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column in ("claimed_at", "available_at"):
+            if column not in columns:
+                try:
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} REAL")
+                except sqlite3.OperationalError:
+                    # Another worker added it first
+                    pass
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_submitted_at ON jobs (status, submitted_at)")
+
+    def submit(self, file_bytes, filename=None, webhook_url=None):
+        """
+        Queues a document for extraction and returns its job id.
+
+        Raises:
+            InvalidWebhookUrl: When webhook_url is given but not allowed.
+        """
+        if webhook_url:
+            validate_webhook_url(webhook_url)
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, filename, document, webhook_url, submitted_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, filename, file_bytes, webhook_url, time.time()),
+            )
+        return job_id
+
+    def claim(self):
+        """
+        Atomically moves the oldest queued job that is not deferred to running and
+        returns it, or None when there is none.
+
+        started_at keeps the first claim so wait metrics are not reset by retries;
+        claimed_at is the latest one, used to spot jobs a crashed worker left running.
+        """
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._conn.execute(
+                "SELECT id, filename, document, webhook_url FROM jobs "
+                "WHERE status = ? AND (available_at IS NULL OR available_at <= ?) ORDER BY submitted_at LIMIT 1",
+                (QUEUED, now),
+            ).fetchone()
+            if row is not None:
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, started_at = COALESCE(started_at, ?), claimed_at = ?, "
+                    "attempts = attempts + 1 WHERE id = ?",
+                    (RUNNING, now, now, row["id"]),
+                )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return dict(row) if row is not None else None
+
+    def complete(self, job_id, result):
+        # The document is dropped once a job finishes so the queue file does not grow without bound
+        self._conn.execute(
+            "UPDATE jobs SET status = ?, result = ?, document = NULL, finished_at = ? WHERE id = ?",
+            (SUCCEEDED, json.dumps(result), time.time(), job_id),
+        )
+
+    def fail(self, job_id, error):
+        """Records a failed attempt, re-queueing the job until it has used JOB_MAX_ATTEMPTS."""
+        row = self._conn.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is not None and row["attempts"] < JOB_MAX_ATTEMPTS:
+            self._conn.execute("UPDATE jobs SET status = ?, error = ? WHERE id = ?", (QUEUED, error, job_id))
+            return False
+        self._conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, document = NULL, finished_at = ? WHERE id = ?",
+            (FAILED, error, time.time(), job_id),
+        )
+        return True
+
+    def defer(self, job_id, error, delay_seconds):
+        """
+        Hands a job back to the queue for delay_seconds without spending one of its
+        JOB_MAX_ATTEMPTS, for when the backend is throttling or its circuit is open.
+        """
+        self._conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, attempts = MAX(attempts - 1, 0), available_at = ? WHERE id = ?",
+            (QUEUED, error, time.time() + delay_seconds, job_id),
+        )
+
+    def requeue_stale(self, stale_after_seconds=JOB_STALE_AFTER_SECONDS):
+        """
+        Returns jobs left running by a crashed worker to the queue. A job that has
+        already been claimed JOB_MAX_ATTEMPTS times is failed instead, so a document
+        that brings its worker down is not picked up again forever.
+
+        Returns:
+            tuple: (number of jobs re-queued, ids of the jobs failed).
+        """
+        stale_before = time.time() - stale_after_seconds
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            failed = [
+                row["id"] for row in self._conn.execute(
+                    "SELECT id FROM jobs WHERE status = ? AND COALESCE(claimed_at, started_at) < ? AND attempts >= ?",
+                    (RUNNING, stale_before, JOB_MAX_ATTEMPTS),
+                )
+            ]
+            self._conn.executemany(
+                "UPDATE jobs SET status = ?, error = ?, document = NULL, finished_at = ? WHERE id = ?",
+                [(FAILED, f"Worker stopped during each of {JOB_MAX_ATTEMPTS} attempts", time.time(), job_id) for job_id in failed],
+            )
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ? WHERE status = ? AND COALESCE(claimed_at, started_at) < ?",
+                (QUEUED, RUNNING, stale_before),
+            )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return cursor.rowcount, failed
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, filename, webhook_url, result, error, attempts, submitted_at, started_at, finished_at "
+                "FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def metrics(self, window=1000):
+        """Returns queue depth per status and wait/total latency percentiles over the last `window` finished jobs."""
+        counts = {status: 0 for status in (QUEUED, RUNNING, SUCCEEDED, FAILED)}
+        with self._lock:
+            for row in self._conn.execute("SELECT status, COUNT(*) AS total FROM jobs GROUP BY status"):
+                counts[row["status"]] = row["total"]
+
+            rows = self._conn.execute(
+                "SELECT started_at - submitted_at AS wait, finished_at - submitted_at AS total FROM jobs "
+                "WHERE finished_at IS NOT NULL ORDER BY finished_at DESC LIMIT ?",
+                (window,),
+            ).fetchall()
+        return {
+            "queue_depth": counts[QUEUED],
+            "jobs": counts,
+            "wait_seconds": _percentiles([row["wait"] for row in rows if row["wait"] is not None]),
+            "latency_seconds": _percentiles([row["total"] for row in rows]),
+        }
+
+    def close(self):
+        self._conn.close()
+
+
+def _percentiles(values):
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    values = sorted(values)
+    pick = lambda q: round(values[min(len(values) - 1, int(q * len(values)))], 3)
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99)}
+
+
+def send_webhook(job):
+    """
+    Tells the job's webhook_url that it finished. Only the id and status are sent;
+    the receiver fetches the result (which holds TINs) from GET /jobs/{id}.
+    Delivery failures are logged, not retried.
+    """
+    try:
+        validate_webhook_url(job["webhook_url"])
+    except InvalidWebhookUrl as e:
+        # The allowlist may have changed since the job was submitted
+        Logger.error("Webhook for job %s not sent: %s", job["id"], e)
+        return
+    body = json.dumps({"id": job["id"], "status": job["status"]}).encode()
+    headers = {"Content-Type": "application/json"}
+    if WEBHOOK_SECRET:
+        headers["X-W9-Signature"] = "sha256=" + hmac.new(WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    try:
+        # Redirects are not followed, so an allowed host cannot bounce the request elsewhere
+        response = requests.post(job["webhook_url"], data=body, headers=headers, timeout=WEBHOOK_TIMEOUT_SECONDS, allow_redirects=False)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        Logger.error("Webhook delivery failed for job %s: %s", job["id"], e)
+
+
+def requeue_stale_jobs(queue):
+    """Runs queue.requeue_stale(), logging what it did and notifying the webhooks of the jobs it failed."""
+    requeued, failed = queue.requeue_stale()
+    if requeued:
+        Logger.info("Re-queued %s stale jobs", requeued)
+    if failed:
+        Logger.warning("Failed %s stale jobs that used all %s attempts", len(failed), JOB_MAX_ATTEMPTS)
+    for job_id in failed:
+        job = queue.get(job_id)
+        if job is not None and job["webhook_url"]:
+            send_webhook(job)
+
+
+def worker_loop(db_path=JOB_QUEUE_DB_PATH):
+    """Claims and runs jobs until the process receives SIGTERM/SIGINT."""
+    # Imported here so the API process that only submits jobs never loads the Azure SDK
+    from app.services.form_extraction import W9FormExtraction
+    from app.services.resilience import BackendUnavailable
+
+    running = True
+
+    def stop(signum, frame):
+        nonlocal running
+        running = False
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    queue = JobQueue(db_path)
+    extractor = W9FormExtraction()
+    Logger.info("Job worker %s started", os.getpid())
+
+    db_backoff = JOB_POLL_INTERVAL_SECONDS
+    # A worker that crashes while the others keep running is only noticed here, not just at startup
+    next_stale_check = time.monotonic() + JOB_STALE_CHECK_INTERVAL_SECONDS
+    while running:
+        try:
+            if time.monotonic() >= next_stale_check:
+                next_stale_check = time.monotonic() + JOB_STALE_CHECK_INTERVAL_SECONDS
+                requeue_stale_jobs(queue)
+            job = queue.claim()
+        except sqlite3.Error as e:
+            # A locked or busy database must not end the worker; wait, longer each time, and try again
+            Logger.warning("Job worker %s could not read the job queue: %s", os.getpid(), e)
+            time.sleep(db_backoff)
+            db_backoff = min(db_backoff * 2, JOB_DB_ERROR_MAX_BACKOFF_SECONDS)
+            continue
+        db_backoff = JOB_POLL_INTERVAL_SECONDS
+        if job is None:
+            time.sleep(JOB_POLL_INTERVAL_SECONDS)
+            continue
+
+        try:
+            result = extractor.extract_form_bytes(job["document"])
+        except BackendUnavailable as e:
+            # Not the job's fault: put it back for when the backend expects to recover, without spending an attempt,
+            # and give the backend that long before claiming more work
+            backoff = e.retry_after or JOB_POLL_INTERVAL_SECONDS
+            queue.defer(job["id"], str(e), backoff)
+            time.sleep(backoff)
+            continue
+
+        if isinstance(result, dict) and "error" not in result:
+            queue.complete(job["id"], result)
+            finished = True
+        else:
+            error = result.get("error") if isinstance(result, dict) else str(result)
+            finished = queue.fail(job["id"], error)
+
+        if finished and job["webhook_url"]:
+            send_webhook(queue.get(job["id"]))
+
+    queue.close()
+    Logger.info("Job worker %s stopped", os.getpid())
+
+
+def run_workers(workers=JOB_WORKERS, db_path=JOB_QUEUE_DB_PATH):
+    """Starts a pool of worker processes draining the queue and waits for them to exit."""
+    queue = JobQueue(db_path)
+    requeue_stale_jobs(queue)
+    queue.close()
+
+    # spawn, not fork, so workers never inherit open SQLite handles or HTTP sessions
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=worker_loop, args=(db_path,), daemon=False) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        # Workers received the same SIGINT and finish their current job before exiting
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run W9 extraction job workers.")
+    parser.add_argument("--workers", type=int, default=JOB_WORKERS)
+    parser.add_argument("--db-path", default=JOB_QUEUE_DB_PATH)
+    args = parser.parse_args()
+    run_workers(args.workers, args.db_path)
@@ -0,0 +1,156 @@
+import functools
+import inspect
+import os
+import time
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import GaugeMetricFamily, REGISTRY
+from app.configuration.logger_setup import Logger
+
+# Spans are exported over OTLP/gRPC when this is set (e.g. http://localhost:4317) and the OpenTelemetry SDK is installed
+OTEL_EXPORTER_OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "w9-form-recogniser")
+
+# Stages run from sub-millisecond (cache, formatting) to Azure analyses polled for up to ANALYSIS_MAX_WAIT_SECONDS
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+STAGE_SECONDS = Histogram("w9_stage_duration_seconds", "Time spent in each extraction stage", ["stage"], buckets=STAGE_BUCKETS)
+STAGE_IN_FLIGHT = Gauge("w9_stage_in_flight", "Calls currently inside each extraction stage", ["stage"], multiprocess_mode="livesum")
+STAGE_ERRORS = Counter("w9_stage_errors_total", "Exceptions raised out of each extraction stage", ["stage", "error"])
+CACHE_LOOKUPS = Counter("w9_cache_lookups_total", "Cache lookups by cache and outcome (memory, disk, miss)", ["cache", "result"])
+
+REQUEST_SECONDS = Histogram("w9_http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"], buckets=STAGE_BUCKETS)
+REQUESTS_IN_FLIGHT = Gauge("w9_http_requests_in_flight", "HTTP requests currently being served", multiprocess_mode="livesum")
+
+BACKEND_RETRIES = Counter("w9_backend_retries_total", "Retried backend calls by backend and reason", ["backend", "reason"])
+CIRCUIT_OPEN = Gauge("w9_backend_circuit_open", "1 while a backend's circuit breaker is open", ["backend"], multiprocess_mode="max")
+CONCURRENCY_LIMIT = Gauge("w9_backend_concurrency_limit", "Current adaptive concurrency limit per backend", ["backend"], multiprocess_mode="livesum")
+ENDPOINT_OUTSTANDING = Gauge("w9_azure_endpoint_outstanding", "Requests in flight per Azure endpoint", ["endpoint"], multiprocess_mode="livesum")
+ENDPOINT_HEALTHY = Gauge("w9_azure_endpoint_healthy", "0 while an Azure endpoint is ejected from the pool", ["endpoint"], multiprocess_mode="min")
+ENDPOINT_EJECTIONS = Counter("w9_azure_endpoint_ejections_total", "Azure endpoint ejections by endpoint and reason", ["endpoint", "reason"])
+COALESCED_REQUESTS = Counter("w9_coalesced_requests_total", "Extractions answered by an identical in-flight (joined) or just-finished (replayed) request", ["outcome"])
+MODEL_ANALYSES = Counter("w9_model_analyses_total", "Azure analyses by model and how their result was used", ["model", "outcome"])
+
+
+def _build_tracer():
+    if not OTEL_EXPORTER_OTLP_ENDPOINT:
+        return None
+    try:
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        Logger.warning("OTEL_EXPORTER_OTLP_ENDPOINT is set but opentelemetry-sdk/exporter-otlp are not installed; tracing disabled")
+        return None
+
+    provider = TracerProvider(resource=Resource.create({"service.name": OTEL_SERVICE_NAME}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=OTEL_EXPORTER_OTLP_ENDPOINT)))
+    trace.set_tracer_provider(provider)
+    Logger.info("Exporting OpenTelemetry spans to %s", OTEL_EXPORTER_OTLP_ENDPOINT)
+    return trace.get_tracer("w9.extraction")
+
+
+tracer = _build_tracer()
+
+
+@functools.lru_cache(maxsize=None)
+def _stage_metrics(stage):
+    """(in-flight gauge, duration histogram) children for a stage; labels() is looked up once instead of on every call."""
+    return STAGE_IN_FLIGHT.labels(stage), STAGE_SECONDS.labels(stage)
+
+
+class StageTimer:
+    """
+    Context manager behind track_stage. A class rather than @contextmanager,
+    whose generator round trip cost more than the metrics it records on
+    sub-millisecond stages such as formatting.
+    """
+
+    __slots__ = ("stage", "in_flight", "seconds", "span", "start")
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.in_flight, self.seconds = _stage_metrics(stage)
+        self.span = None
+
+    def __enter__(self):
+        self.in_flight.inc()
+        self.start = time.perf_counter()
+        if tracer is not None:
+            self.span = tracer.start_as_current_span(f"w9.{self.stage}")
+            self.span.__enter__()
+
+    def __exit__(self, exc_type, exc, traceback):
+        try:
+            if self.span is not None:
+                self.span.__exit__(exc_type, exc, traceback)
+            if exc_type is not None and issubclass(exc_type, Exception):
+                STAGE_ERRORS.labels(self.stage, exc_type.__name__).inc()
+        finally:
+            self.in_flight.dec()
+            self.seconds.observe(time.perf_counter() - self.start)
+        return False
+
+
+def track_stage(stage):
+    """
+    Times the enclosed block as one extraction stage.
+
+    Records its duration, counts it as in flight while it runs, counts any
+    exception escaping it (by class name) and, when tracing is enabled,
+    wraps it in a span. Works around awaits as well as blocking code.
+    """
+    return StageTimer(stage)
+
+
+def timed(stage):
+    """Decorator running a sync or async function under track_stage(stage)."""
+    def decorator(function):
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with track_stage(stage):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with track_stage(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_error(stage, error):
+    """Counts an error a stage handled itself (e.g. turned into an {"error": ...} response) instead of raising."""
+    STAGE_ERRORS.labels(stage, type(error).__name__).inc()
+
+
+def record_cache_lookup(cache, result):
+    """Counts one cache lookup; result is "memory", "disk" or "miss"."""
+    CACHE_LOOKUPS.labels(cache, result).inc()
+
+
+class CacheStatsCollector:
+    """Publishes the hit ratio and size of registered ResultCaches at scrape time."""
+
+    def __init__(self):
+        self.caches = []
+
+    def register(self, cache):
+        self.caches.append(cache)
+
+    def collect(self):
+        hit_ratio = GaugeMetricFamily("w9_cache_hit_ratio", "Hits / lookups since this process started", labels=["cache"])
+        items = GaugeMetricFamily("w9_cache_memory_items", "Entries held in the in-memory tier", labels=["cache"])
+        for cache in self.caches:
+            stats = cache.stats()
+            hit_ratio.add_metric([cache.name.lower()], stats["hit_ratio"])
+            items.add_metric([cache.name.lower()], stats["memory_items"])
+        yield hit_ratio
+        yield items
+
+
+cache_stats_collector = CacheStatsCollector()
+REGISTRY.register(cache_stats_collector)
@@ -0,0 +1,122 @@
+import os
+import threading
+from azure.core.exceptions import HttpResponseError
+from app.configuration.logger_setup import Logger
+from app.services.analysis_record import CompactAnalysis
+from app.services.metrics import MODEL_ANALYSES
+
+# A W9-specific Document Intelligence model: the id of a custom model trained on W9s, or a tax prebuilt
+# the resource offers (e.g. prebuilt-tax.us.w9). Unset, every W9 is read with the generic key/value model.
+W9_MODEL_ID = os.getenv("W9_MODEL_ID")
+KEY_VALUE_MODEL_ID = "prebuilt-document"
+# A W9-model result with fewer recognised fields than this is re-analysed with the key/value model
+W9_MODEL_MIN_FIELDS = int(os.getenv("W9_MODEL_MIN_FIELDS", "2"))
+
+# Typed field name -> the printed W9 label the key/value model reports for the same box. Covers the
+# tax prebuilt's field names; label a custom model's fields with the same names.
+W9_DOCUMENT_FIELD_LABELS = {
+    "Name": "1 Name of entity/individual",
+    "BusinessName": "2 Business name/disregarded entity name",
+    "Address": "5 Address (number, street, and apt. or suite no.)",
+    "CityStateZip": "6 City, state, and ZIP code",
+    "SocialSecurityNumber": "Social security number",
+    "SSN": "Social security number",
+    "EmployerIdentificationNumber": "Employer identification number",
+    "EIN": "Employer identification number",
+    "Signature": "Signature of U.S. person",
+    "SignatureDate": "Date",
+}
+
+
+class ModelRouter:
+    """
+    Chooses the Document Intelligence model a W9 is analysed with.
+
+    With a W9 model configured it is tried first and its typed fields are read
+    directly, each already tied to a box on the form, instead of guessing from
+    key text. The generic key/value model stays the fallback: used when no W9
+    model is configured, once the W9 model turns out not to exist on the
+    resource, and for any document where it recognises fewer than min_fields
+    fields.
+    """
+
+    def __init__(self, model_id=W9_MODEL_ID, fallback_model_id=KEY_VALUE_MODEL_ID, min_fields=W9_MODEL_MIN_FIELDS, field_labels=W9_DOCUMENT_FIELD_LABELS):
+        self.model_id = model_id or None
+        self.fallback_model_id = fallback_model_id
+        self.min_fields = min_fields
+        self.field_labels = field_labels
+        self._lock = threading.Lock()
+        self._model_missing = False
+
+    @property
+    def cache_model_id(self):
+        """Identifies the route in cache keys, so results are not reused after W9_MODEL_ID changes."""
+        return f"{self.model_id}>{self.fallback_model_id}" if self.model_id else self.fallback_model_id
+
+    def model_ids(self):
+        """The models to try, in order."""
+        if self.model_id and not self._model_missing:
+            return (self.model_id, self.fallback_model_id)
+        return (self.fallback_model_id,)
+
+    def read(self, model_id, result):
+        """
+        Turns an AnalyzeResult from model_id into a CompactAnalysis.
+
+        Returns:
+            CompactAnalysis, or None when the W9 model recognised too few fields and the next model should be tried.
+        """
+        if model_id == self.fallback_model_id:
+            MODEL_ANALYSES.labels(model_id, "key_value").inc()
+            return CompactAnalysis.from_analyze_result(result)
+
+        analysis = CompactAnalysis.from_document_fields(result, self.field_labels)
+        if len(analysis.key_value_pairs) < self.min_fields:
+            MODEL_ANALYSES.labels(model_id, "too_few_fields").inc()
+            Logger.info("W9 model %s recognised %s fields, falling back to %s", model_id, len(analysis.key_value_pairs), self.fallback_model_id)
+            return None
+        MODEL_ANALYSES.labels(model_id, "typed_fields").inc()
+        return analysis
+
+    def _skip_missing_model(self, model_id, error):
+        """True when error says the W9 model does not exist; it is then skipped for the life of the process."""
+        if model_id == self.fallback_model_id or not isinstance(error, HttpResponseError) or error.status_code != 404:
+            return False
+        with self._lock:
+            first = not self._model_missing
+            self._model_missing = True
+        if first:
+            MODEL_ANALYSES.labels(model_id, "model_not_found").inc()
+            Logger.error("W9 model %s not found on the Azure resource, using %s instead: %s", model_id, self.fallback_model_id, error)
+        return True
+
+    def analyze(self, analyze_with):
+        """
+        Calls analyze_with(model_id) -> AnalyzeResult for each model in turn and
+        returns the first usable CompactAnalysis. Each AnalyzeResult is reduced
+        as soon as it arrives, so at most one is held at a time.
+        """
+        for model_id in self.model_ids():
+            try:
+                analysis = self.read(model_id, analyze_with(model_id))
+            except Exception as e:
+                if not self._skip_missing_model(model_id, e):
+                    raise
+                continue
+            if analysis is not None:
+                return analysis
+
+    async def analyze_async(self, analyze_with):
+        """Awaitable version of analyze(); analyze_with(model_id) returns a coroutine."""
+        for model_id in self.model_ids():
+            try:
+                analysis = self.read(model_id, await analyze_with(model_id))
+            except Exception as e:
+                if not self._skip_missing_model(model_id, e):
+                    raise
+                continue
+            if analysis is not None:
+                return analysis
+
+
+w9_model_router = ModelRouter()
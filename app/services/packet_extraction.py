@@ -0,0 +1,91 @@
+import io
+import os
+from PyPDF2 import PdfReader, PdfWriter
+from app.services.pdf_preflight import preflight_pdf, NotW9Document, PREFLIGHT_ENABLED
+from app.services.formatting_result import W9_FIELD_MAPPER
+from app.configuration.logger_setup import Logger
+
+# Pages per Azure analysis when a packet is split; smaller chunks finish sooner but cost more calls
+PACKET_CHUNK_PAGES = int(os.getenv("PACKET_CHUNK_PAGES", "4"))
+# Chunks of one packet analysed at once (Azure's adaptive limiter still caps the total)
+PACKET_MAX_CONCURRENCY = int(os.getenv("PACKET_MAX_CONCURRENCY", "16"))
+
+# Line 1 of a W9; the page it is on starts a new form
+FORM_START_FIELD = "Entity Name"
+
+
+def plan_packet(document, chunk_pages=PACKET_CHUNK_PAGES):
+    """
+    Splits a multi-page PDF into small PDFs of at most chunk_pages pages each,
+    leaving out pages whose text layer shows they are not part of a W9.
+
+    Args:
+        document (bytes | BinaryIO): The packet. Streams are rewound afterwards.
+
+    Returns:
+        tuple: (page_count, [(packet page numbers, PDF bytes of just those pages), ...]),
+        or None when the PDF cannot be split (encrypted or unreadable).
+
+    Raises:
+        NotW9Document: When preflight shows no page is a W9.
+    """
+    stream = io.BytesIO(document) if isinstance(document, (bytes, bytearray)) else document
+    try:
+        stream.seek(0)
+        reader = PdfReader(stream)
+        if reader.is_encrypted:
+            return None
+        page_count = len(reader.pages)
+        pages = list(range(1, page_count + 1))
+        if PREFLIGHT_ENABLED:
+            preflight = preflight_pdf(stream)
+            if preflight.is_w9 is False:
+                raise NotW9Document("Document does not appear to contain a W9 form")
+            if preflight.is_w9:
+                pages = sorted(set(preflight.w9_pages) | set(preflight.scanned_pages))
+
+        chunks = []
+        for start in range(0, len(pages), chunk_pages):
+            page_numbers = pages[start:start + chunk_pages]
+            writer = PdfWriter()
+            for page_number in page_numbers:
+                writer.add_page(reader.pages[page_number - 1])
+            output = io.BytesIO()
+            writer.write(output)
+            chunks.append((page_numbers, output.getvalue()))
+        return page_count, chunks
+    except NotW9Document:
+        raise
+    except Exception as e:
+        # PyPDF2 raises all sorts of errors on malformed PDFs; the packet is then analysed whole
+        Logger.warning("Could not split packet into page chunks: %s", e)
+        return None
+    finally:
+        stream.seek(0)
+
+
+def is_form_start(analysis, page_number):
+    """A page starts a W9 when it holds line 1 (the name) or the "Rev. <Month> <Year>" mark printed only on page 1."""
+    if page_number in analysis.page_snippets:
+        return True
+    return any(
+        record.page_number == page_number and W9_FIELD_MAPPER.match(record.key) == FORM_START_FIELD
+        for record in analysis.key_value_pairs
+    )
+
+
+def split_forms(analysis, page_numbers):
+    """
+    Splits the analysis of a packet into one part per W9, cutting before every page that starts a form.
+    Pages ahead of the first form start belong to the first form.
+
+    Returns:
+        list: (page numbers, CompactAnalysis) per form, in page order.
+    """
+    starts = {page_number for page_number in page_numbers if is_form_start(analysis, page_number)}
+    forms = []
+    for page_number in page_numbers:
+        if not forms or (page_number in starts and any(page in starts for page in forms[-1])):
+            forms.append([])
+        forms[-1].append(page_number)
+    return [(pages, analysis.for_pages(pages)) for pages in forms]
@@ -0,0 +1,98 @@
+import io
+import os
+import re
+from collections import namedtuple
+from PyPDF2 import PdfReader
+from app.configuration.logger_setup import Logger
+
+PREFLIGHT_ENABLED = os.getenv("PDF_PREFLIGHT", "true").lower() == "true"
+# Pages with fewer extractable characters than this are treated as scanned (no text layer)
+PREFLIGHT_MIN_TEXT_CHARS = int(os.getenv("PDF_PREFLIGHT_MIN_TEXT_CHARS", "50"))
+
+# Only the first page of a W9 carries the form title; later pages repeat "Form W-9 (Rev. ...) Page N"
+W9_TITLE_PATTERN = re.compile(r"Request\s+for\s+Taxpayer\s+Identification\s+Number", re.IGNORECASE)
+W9_FORM_PATTERN = re.compile(r"Form\s+W-?9\b", re.IGNORECASE)
+
+
+class NotW9Document(ValueError):
+    """Raised when preflight can tell from the text layer alone that a PDF is not a W9."""
+
+
+class PreflightResult(namedtuple("PreflightResult", ["page_count", "w9_pages", "scanned_pages", "is_w9"])):
+    """
+    Outcome of inspecting a PDF locally.
+
+    is_w9 is True when W9 pages were found in the text layer, False when every
+    page has a text layer and none of it looks like a W9, and None when the
+    PDF could not be judged (scanned pages, unreadable file).
+    """
+
+    __slots__ = ()
+
+    @property
+    def pages(self):
+        """
+        Azure `pages` argument ("1-2,5") restricting analysis to the W9 pages, or None to analyse everything.
+        Scanned pages are always kept since they may hold a W9 the text layer cannot show.
+        """
+        if not self.is_w9:
+            return None
+        pages = sorted(set(self.w9_pages) | set(self.scanned_pages))
+        if len(pages) == self.page_count:
+            return None
+        return format_page_ranges(pages)
+
+
+def format_page_ranges(page_numbers):
+    """Collapses sorted 1-based page numbers into Azure's range syntax, e.g. [1, 2, 3, 7] -> "1-3,7"."""
+    ranges = []
+    for page_number in page_numbers:
+        if ranges and page_number == ranges[-1][1] + 1:
+            ranges[-1][1] = page_number
+        else:
+            ranges.append([page_number, page_number])
+    return ",".join(str(start) if start == end else f"{start}-{end}" for start, end in ranges)
+
+
+def preflight_pdf(document):
+    """
+    Finds the W9 page(s) of a PDF from its text layer.
+
+    Args:
+        document (bytes | BinaryIO): The PDF. Streams are rewound afterwards.
+
+    Returns:
+        PreflightResult: Page count, 1-based W9 page numbers and the verdict.
+    """
+    stream = io.BytesIO(document) if isinstance(document, (bytes, bytearray)) else document
+    try:
+        stream.seek(0)
+        reader = PdfReader(stream)
+        if reader.is_encrypted:
+            return PreflightResult(None, [], [], None)
+
+        title_pages, form_pages, scanned_pages = [], [], []
+        for page_number, page in enumerate(reader.pages, start=1):
+            text = page.extract_text() or ""
+            if len(text.strip()) < PREFLIGHT_MIN_TEXT_CHARS:
+                scanned_pages.append(page_number)
+            elif W9_TITLE_PATTERN.search(text):
+                title_pages.append(page_number)
+            elif W9_FORM_PATTERN.search(text):
+                form_pages.append(page_number)
+        page_count = len(reader.pages)
+    except Exception as e:
+        # Malformed PDFs raise all sorts of errors from PyPDF2; preflight must never block extraction
+        Logger.warning("PDF preflight could not read document: %s", e)
+        return PreflightResult(None, [], [], None)
+    finally:
+        stream.seek(0)
+
+    w9_pages = title_pages or form_pages
+    if w9_pages:
+        is_w9 = True
+    elif scanned_pages:
+        is_w9 = None
+    else:
+        is_w9 = False
+    return PreflightResult(page_count, w9_pages, scanned_pages, is_w9)
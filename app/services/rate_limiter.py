@@ -0,0 +1,74 @@
+import asyncio
+import os
+import time
+
+
+TENANT_RATE_PER_SECOND = float(os.getenv("TENANT_RATE_PER_SECOND", "5"))
+TENANT_BURST = int(os.getenv("TENANT_BURST", "10"))
+# Buckets untouched this long are dropped; by then they have refilled, so a new one behaves the same
+TENANT_IDLE_SECONDS = float(os.getenv("TENANT_IDLE_SECONDS", "300"))
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at rate tokens per second, holding at most capacity tokens."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self):
+        """Takes a token if one is available and returns 0, otherwise returns the seconds until the next token."""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class TenantRateLimiter:
+    """
+    Per-tenant token buckets for pacing calls to the extraction backends.
+
+    acquire() waits for the tenant's next token rather than rejecting, so a
+    large batch from one tenant is spread out instead of failing. Buckets idle
+    for idle_seconds (at least long enough to refill) are evicted, so the map
+    only holds recently active tenants.
+    """
+
+    def __init__(self, rate=TENANT_RATE_PER_SECOND, burst=TENANT_BURST, idle_seconds=TENANT_IDLE_SECONDS):
+        self.rate = rate
+        self.burst = burst
+        self.idle_seconds = max(idle_seconds, burst / rate)
+        self._buckets = {}
+        self._lock = asyncio.Lock()
+        self._swept_at = time.monotonic()
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        if now - self._swept_at < self.idle_seconds:
+            return
+        self._swept_at = now
+        for tenant_id in [tenant_id for tenant_id, bucket in self._buckets.items() if now - bucket.updated_at >= self.idle_seconds]:
+            del self._buckets[tenant_id]
+
+    async def acquire(self, tenant_id):
+        while True:
+            async with self._lock:
+                self._evict_idle()
+                bucket = self._buckets.get(tenant_id)
+                if bucket is None:
+                    bucket = self._buckets[tenant_id] = TokenBucket(self.rate, self.burst)
+                wait_seconds = bucket.try_acquire()
+            if not wait_seconds:
+                return
+            await asyncio.sleep(wait_seconds)
+
+
+tenant_rate_limiter = TenantRateLimiter()
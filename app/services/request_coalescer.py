@@ -0,0 +1,135 @@
+import asyncio
+import concurrent.futures
+import copy
+import os
+import threading
+from cachetools import TTLCache
+from app.services.metrics import COALESCED_REQUESTS
+from app.services.result_cache import is_cacheable
+
+# How long a finished result is replayed to requests repeating it (client retries after a timeout)
+COALESCE_REPLAY_SECONDS = float(os.getenv("COALESCE_REPLAY_SECONDS", "60"))
+COALESCE_REPLAY_MAX_ITEMS = int(os.getenv("COALESCE_REPLAY_MAX_ITEMS", "1024"))
+
+
+class IdempotencyKeyReused(Exception):
+    """Raised when an Idempotency-Key arrives again with a different document."""
+
+    def __init__(self, key):
+        super().__init__("Idempotency-Key was already used for a different document")
+        self.key = key
+
+
+def close_owned(owned):
+    if owned is not None:
+        owned.close()
+
+
+class RequestCoalescer:
+    """
+    Single-flight for extractions: concurrent calls with the same key attach
+    to the one already running instead of starting their own backend calls,
+    and a successful result is replayed for replay_seconds after it finishes.
+
+    Every key carries a fingerprint (the document's cache key). Requests that
+    share an Idempotency-Key must also share the document; a mismatch raises
+    IdempotencyKeyReused instead of returning another document's result.
+    Errors are passed to every waiting caller but never replayed, so a retry
+    after a failure runs again.
+    """
+
+    def __init__(self, replay_seconds=COALESCE_REPLAY_SECONDS, max_replay_items=COALESCE_REPLAY_MAX_ITEMS):
+        self._lock = threading.Lock()
+        # key -> (fingerprint, concurrent.futures.Future), so sync and async callers can share a flight
+        self._in_flight = {}
+        self._replay = TTLCache(maxsize=max_replay_items, ttl=replay_seconds) if replay_seconds > 0 else None
+
+    def _join(self, key, fingerprint):
+        """Returns (future, is_leader, replayed_result) for one call."""
+        with self._lock:
+            replayed = self._replay.get(key) if self._replay is not None else None
+            if replayed is not None:
+                replay_fingerprint, result = replayed
+                if replay_fingerprint != fingerprint:
+                    raise IdempotencyKeyReused(key)
+                COALESCED_REQUESTS.labels("replayed").inc()
+                return None, False, copy.deepcopy(result)
+
+            flight = self._in_flight.get(key)
+            if flight is not None:
+                flight_fingerprint, future = flight
+                if flight_fingerprint != fingerprint:
+                    raise IdempotencyKeyReused(key)
+                COALESCED_REQUESTS.labels("joined").inc()
+                return future, False, None
+
+            future = concurrent.futures.Future()
+            self._in_flight[key] = (fingerprint, future)
+            return future, True, None
+
+    def _finish(self, key, fingerprint, future, result=None, error=None):
+        with self._lock:
+            self._in_flight.pop(key, None)
+            if error is None and self._replay is not None and is_cacheable(result):
+                self._replay[key] = (fingerprint, copy.deepcopy(result))
+        if error is None:
+            future.set_result(result)
+        elif isinstance(error, (asyncio.CancelledError, concurrent.futures.CancelledError)):
+            future.cancel()
+        else:
+            future.set_exception(error)
+
+    def run(self, key, function, fingerprint=None):
+        """Returns function()'s result, sharing it with every concurrent call for key."""
+        future, is_leader, replayed = self._join(key, fingerprint)
+        if replayed is not None:
+            return replayed
+        if not is_leader:
+            return copy.deepcopy(future.result())
+
+        try:
+            result = function()
+        except BaseException as e:
+            self._finish(key, fingerprint, future, error=e)
+            raise
+        self._finish(key, fingerprint, future, result)
+        return result
+
+    async def run_async(self, key, function, fingerprint=None, owned=None):
+        """
+        Awaitable version of run(); function() returns a coroutine.
+
+        It runs as its own task, so a caller that is cancelled (e.g. the client
+        that started it disconnected) does not cancel it for everyone else waiting.
+        owned is a file function() reads (e.g. the upload): run_async closes it
+        once the task that reads it is done, or straight away when another call
+        or a replay provides the result, however long the caller itself waits.
+        """
+        try:
+            future, is_leader, replayed = self._join(key, fingerprint)
+        except BaseException:
+            close_owned(owned)
+            raise
+        if replayed is not None or not is_leader:
+            close_owned(owned)
+        if replayed is not None:
+            return replayed
+        if not is_leader:
+            return copy.deepcopy(await asyncio.shield(asyncio.wrap_future(future)))
+
+        task = asyncio.ensure_future(function())
+
+        def finish(task):
+            close_owned(owned)
+            if task.cancelled():
+                self._finish(key, fingerprint, future, error=asyncio.CancelledError())
+            elif task.exception() is not None:
+                self._finish(key, fingerprint, future, error=task.exception())
+            else:
+                self._finish(key, fingerprint, future, task.result())
+
+        task.add_done_callback(finish)
+        return await asyncio.shield(task)
+
+
+request_coalescer = RequestCoalescer()
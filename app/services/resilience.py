@@ -0,0 +1,404 @@
+import asyncio
+import math
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from azure.core.exceptions import HttpResponseError, ServiceRequestError, ServiceResponseError
+from tenacity import AsyncRetrying, RetryError, Retrying, retry_if_exception, stop_after_attempt, stop_before_delay
+from tenacity.wait import wait_base, wait_random_exponential
+from app.configuration.logger_setup import Logger
+from app.services.metrics import BACKEND_RETRIES, CIRCUIT_OPEN, CONCURRENCY_LIMIT
+
+RETRY_BASE_SECONDS = float(os.getenv("RETRY_BASE_SECONDS", "0.5"))
+RETRY_MAX_BACKOFF_SECONDS = float(os.getenv("RETRY_MAX_BACKOFF_SECONDS", "20"))
+# Retries stop once the next wait would take a call past this many seconds in total
+RETRY_BUDGET_SECONDS = float(os.getenv("RETRY_BUDGET_SECONDS", "60"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+
+AZURE_MAX_ATTEMPTS = int(os.getenv("AZURE_MAX_ATTEMPTS", "4"))
+AZURE_CONCURRENCY_INITIAL = int(os.getenv("AZURE_CONCURRENCY_INITIAL", "16"))
+AZURE_CONCURRENCY_MAX = int(os.getenv("AZURE_CONCURRENCY_MAX", "200"))
+BEDROCK_MAX_ATTEMPTS = int(os.getenv("BEDROCK_MAX_ATTEMPTS", "3"))
+BEDROCK_CONCURRENCY_INITIAL = int(os.getenv("BEDROCK_CONCURRENCY_INITIAL", "8"))
+BEDROCK_CONCURRENCY_MAX = int(os.getenv("BEDROCK_CONCURRENCY_MAX", os.getenv("BEDROCK_MAX_CONCURRENCY", "32")))
+
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+THROTTLE_ERROR_CODES = {"ThrottlingException", "TooManyRequestsException"}
+TRANSIENT_ERROR_CODES = THROTTLE_ERROR_CODES | {"ServiceUnavailableException", "InternalServerException", "ModelNotReadyException", "ModelTimeoutException"}
+
+
+class BackendUnavailable(Exception):
+    """Raised when a backend's circuit is open or it kept failing after every retry; maps to HTTP 503."""
+
+    def __init__(self, backend, retry_after=None, reason="unavailable"):
+        self.backend = backend
+        self.retry_after = retry_after
+        super().__init__(f"{backend} is temporarily {reason}, please retry" + (f" in {math.ceil(retry_after)}s" if retry_after else ""))
+
+
+def _botocore_exceptions():
+    # botocore is only loaded once the Bedrock client is built; until then no error can come from it
+    return sys.modules.get("botocore.exceptions")
+
+
+def _is_client_error(error):
+    botocore_exceptions = _botocore_exceptions()
+    return botocore_exceptions is not None and isinstance(error, botocore_exceptions.ClientError)
+
+
+def _status_code(error):
+    if isinstance(error, HttpResponseError):
+        return error.status_code
+    if _is_client_error(error):
+        return error.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    return None
+
+
+def _error_code(error):
+    if _is_client_error(error):
+        return error.response.get("Error", {}).get("Code")
+    return None
+
+
+def is_throttle(error):
+    """True for 429s from Azure and throttling errors from Bedrock."""
+    return _status_code(error) == 429 or _error_code(error) in THROTTLE_ERROR_CODES
+
+
+def is_transient(error):
+    """True for errors worth retrying: throttling, 5xx, timeouts and dropped connections."""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ServiceRequestError, ServiceResponseError)):
+        return True
+    botocore_exceptions = _botocore_exceptions()
+    if botocore_exceptions is not None and isinstance(error, (botocore_exceptions.EndpointConnectionError, botocore_exceptions.HTTPClientError)):
+        return True
+    return _status_code(error) in TRANSIENT_STATUS_CODES or _error_code(error) in TRANSIENT_ERROR_CODES
+
+
+def retry_after_seconds(error):
+    """Seconds the backend asked us to wait (Retry-After / retry-after-ms headers), or None."""
+    if isinstance(error, HttpResponseError) and error.response is not None:
+        headers = error.response.headers
+    elif _is_client_error(error):
+        headers = error.response.get("ResponseMetadata", {}).get("HTTPHeaders", {})
+    else:
+        return None
+
+    lowered = {key.lower(): value for key, value in headers.items()}
+    for header, scale in (("retry-after-ms", 1000), ("x-ms-retry-after-ms", 1000), ("retry-after", 1)):
+        value = lowered.get(header)
+        if value is None:
+            continue
+        try:
+            return max(float(value) / scale, 0.0)
+        except ValueError:
+            try:
+                return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+            except (TypeError, ValueError):
+                continue
+    return None
+
+
+class wait_retry_after(wait_base):
+    """
+    Full-jitter exponential backoff, except that a Retry-After from the backend
+    is honoured (plus a little jitter so throttled callers do not retry in lockstep).
+    """
+
+    def __init__(self, base=RETRY_BASE_SECONDS, maximum=RETRY_MAX_BACKOFF_SECONDS):
+        self.base = base
+        self.backoff = wait_random_exponential(multiplier=base, max=maximum)
+
+    def __call__(self, retry_state):
+        retry_after = retry_after_seconds(retry_state.outcome.exception())
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.base)
+        return self.backoff(retry_state)
+
+
+class CircuitBreaker:
+    """
+    Stops calling a backend after failure_threshold consecutive transient
+    failures. After reset_seconds a single probe call is let through; any
+    answer from the backend (a success or e.g. a 400) closes the circuit and
+    a transient failure re-opens it. A probe that ends any other way (a
+    throttle, a local error, cancellation) is released by end_probe so the
+    next call probes again.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_seconds=CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """
+        Raises BackendUnavailable instead of letting a call through while the circuit is open.
+
+        Returns:
+            bool: True when the call is the half-open probe; the caller must then call end_probe() once it ends.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return False
+            if self.state == self.OPEN:
+                remaining = self._opened_at + self.reset_seconds - time.monotonic()
+                if remaining > 0:
+                    raise BackendUnavailable(self.name, retry_after=remaining)
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self._probe_in_flight:
+                raise BackendUnavailable(self.name, retry_after=self.reset_seconds)
+            self._probe_in_flight = True
+            return True
+
+    def end_probe(self):
+        """Lets the next call probe again if the probe ended without closing or re-opening the circuit."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                Logger.info("%s circuit closed", self.name)
+                CIRCUIT_OPEN.labels(self.name).set(0)
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    Logger.warning("%s circuit opened after %s consecutive failures", self.name, self._failures)
+                    CIRCUIT_OPEN.labels(self.name).set(1)
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD limit on concurrent calls to a backend.
+
+    Every success without throttling raises the limit by 1/limit (about +1 per
+    round trip of a full window); a throttled call halves it, at most once per
+    decrease_cooldown seconds so a burst of 429s from one window counts once.
+    Callers over the limit queue (threads and coroutines alike) rather than
+    being rejected, so load is smoothed to what the quota allows, not shed.
+    """
+
+    def __init__(self, name, initial, minimum=1, maximum=None, decrease_ratio=0.5, decrease_cooldown=1.0):
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum or max(initial, minimum)
+        self.limit = float(min(max(initial, minimum), self.maximum))
+        self.decrease_ratio = decrease_ratio
+        self.decrease_cooldown = decrease_cooldown
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+        CONCURRENCY_LIMIT.labels(name).set(self.limit)
+
+    def _grant_waiters(self):
+        # Called with the lock held; hands free slots to queued callers in FIFO order
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            self.in_flight += 1
+            if isinstance(waiter, threading.Event):
+                waiter.set()
+            else:
+                loop, future = waiter
+                loop.call_soon_threadsafe(self._resolve, future)
+
+    def _resolve(self, future):
+        if future.done():
+            # The waiting coroutine was cancelled after being granted a slot; give it back
+            self.release()
+        else:
+            future.set_result(None)
+
+    def acquire(self):
+        """Blocks the calling thread until a slot is free."""
+        with self._lock:
+            if not self._waiters and self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return
+            event = threading.Event()
+            self._waiters.append(event)
+        event.wait()
+
+    async def acquire_async(self):
+        """Waits on the event loop until a slot is free."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if not self._waiters and self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return
+            future = loop.create_future()
+            waiter = (loop, future)
+            self._waiters.append(waiter)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    raise
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+            self._grant_waiters()
+
+    def on_success(self):
+        with self._lock:
+            if self.limit < self.maximum:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+                CONCURRENCY_LIMIT.labels(self.name).set(self.limit)
+                self._grant_waiters()
+
+    def on_throttle(self):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_decrease < self.decrease_cooldown:
+                return
+            self._last_decrease = now
+            self.limit = max(self.minimum, self.limit * self.decrease_ratio)
+            CONCURRENCY_LIMIT.labels(self.name).set(self.limit)
+        Logger.warning("%s throttled, concurrency limit lowered to %s", self.name, int(self.limit))
+
+
+class ResilientBackend:
+    """
+    Wraps calls to one backend with the adaptive limiter, the circuit breaker
+    and jittered retries of transient errors. Exhausted retries and open
+    circuits both surface as BackendUnavailable.
+    """
+
+    def __init__(self, name, max_attempts, limiter, breaker=None, budget_seconds=RETRY_BUDGET_SECONDS):
+        self.name = name
+        self.max_attempts = max_attempts
+        self.limiter = limiter
+        self.breaker = breaker or CircuitBreaker(name)
+        self.budget_seconds = budget_seconds
+
+    def _retry_kwargs(self):
+        return dict(
+            stop=stop_after_attempt(self.max_attempts) | stop_before_delay(self.budget_seconds),
+            wait=wait_retry_after(),
+            retry=retry_if_exception(is_transient),
+            before_sleep=self._before_sleep,
+        )
+
+    def _before_sleep(self, retry_state):
+        error = retry_state.outcome.exception()
+        BACKEND_RETRIES.labels(self.name, "throttled" if is_throttle(error) else type(error).__name__).inc()
+        Logger.warning(
+            "%s call failed (%s), retrying in %.2fs (attempt %s of %s)",
+            self.name, error, retry_state.next_action.sleep, retry_state.attempt_number, self.max_attempts,
+        )
+
+    def _record_outcome(self, error):
+        if error is None:
+            self.breaker.record_success()
+            self.limiter.on_success()
+        elif is_throttle(error):
+            # The backend answered, it is just over quota: slow down, but do not trip the breaker
+            self.limiter.on_throttle()
+        elif is_transient(error):
+            self.breaker.record_failure()
+        elif _status_code(error) is not None:
+            # Any other answer (e.g. a 400 for a bad document) still shows the backend is up
+            self.breaker.record_success()
+
+    def _exhausted(self, error):
+        reason = "throttled" if is_throttle(error) else "unavailable"
+        return BackendUnavailable(self.name, retry_after=retry_after_seconds(error), reason=reason)
+
+    def call(self, function, *args, **kwargs):
+        """Calls function(*args, **kwargs) from a thread."""
+        try:
+            for attempt in Retrying(reraise=True, **self._retry_kwargs()):
+                with attempt:
+                    is_probe = self.breaker.before_call()
+                    try:
+                        self.limiter.acquire()
+                        try:
+                            result = function(*args, **kwargs)
+                        except Exception as e:
+                            self._record_outcome(e)
+                            raise
+                        finally:
+                            self.limiter.release()
+                        self._record_outcome(None)
+                        return result
+                    finally:
+                        if is_probe:
+                            self.breaker.end_probe()
+        except BackendUnavailable:
+            raise
+        except RetryError as e:
+            raise self._exhausted(e.last_attempt.exception()) from e
+        except Exception as e:
+            if is_transient(e):
+                raise self._exhausted(e) from e
+            raise
+
+    async def call_async(self, function, *args, **kwargs):
+        """Awaits function(*args, **kwargs), a coroutine function, on the running loop."""
+        try:
+            async for attempt in AsyncRetrying(reraise=True, **self._retry_kwargs()):
+                with attempt:
+                    is_probe = self.breaker.before_call()
+                    try:
+                        await self.limiter.acquire_async()
+                        try:
+                            result = await function(*args, **kwargs)
+                        except Exception as e:
+                            self._record_outcome(e)
+                            raise
+                        finally:
+                            self.limiter.release()
+                        self._record_outcome(None)
+                        return result
+                    finally:
+                        # Throttled, failed locally or cancelled (CancelledError is not an Exception): free the probe
+                        if is_probe:
+                            self.breaker.end_probe()
+        except BackendUnavailable:
+            raise
+        except Exception as e:
+            if is_transient(e):
+                raise self._exhausted(e) from e
+            raise
+
+
+azure_backend = ResilientBackend(
+    "azure",
+    max_attempts=AZURE_MAX_ATTEMPTS,
+    limiter=AdaptiveConcurrencyLimiter("azure", initial=AZURE_CONCURRENCY_INITIAL, maximum=AZURE_CONCURRENCY_MAX),
+)
+bedrock_backend = ResilientBackend(
+    "bedrock",
+    max_attempts=BEDROCK_MAX_ATTEMPTS,
+    limiter=AdaptiveConcurrencyLimiter("bedrock", initial=BEDROCK_CONCURRENCY_INITIAL, maximum=BEDROCK_CONCURRENCY_MAX),
+)
@@ -0,0 +1,223 @@
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from cachetools import TTLCache
+from app.configuration.logger_setup import Logger
+from app.services.metrics import record_cache_lookup, cache_stats_collector
+from app.services.tin_protection import build_tin_cipher, has_tin, redact_result, seal_tins, unseal_tins
+
+RESULT_CACHE_MAX_ITEMS = int(os.getenv("RESULT_CACHE_MAX_ITEMS", "512"))
+RESULT_CACHE_TTL_SECONDS = int(os.getenv("RESULT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+RESULT_CACHE_DB_PATH = os.getenv("RESULT_CACHE_DB_PATH")  # on-disk tier is disabled when unset
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Fernet key sealing the TINs of results on disk (defaults to the result store's); without it
+# results holding an EIN or SSN are only cached in memory
+RESULT_CACHE_ENCRYPTION_KEY = os.getenv("RESULT_CACHE_ENCRYPTION_KEY", os.getenv("RESULT_STORE_ENCRYPTION_KEY"))
+
+
+def document_hash(file_bytes):
+    """Returns the SHA-256 hex digest of the uploaded document bytes."""
+    return hashlib.sha256(file_bytes).hexdigest()
+
+
+def make_cache_key(digest, model_id, formatter_version):
+    """Builds the cache key for a document digest analysed by model_id and formatted by formatter_version."""
+    return f"{model_id}:{formatter_version}:{digest}"
+
+
+def is_cacheable(result):
+    """Only successful, fully formatted results are cached; error payloads are always recomputed."""
+    return isinstance(result, dict) and "error" not in result
+
+
+class SqliteCacheTier:
+    """
+    On-disk cache tier backed by a single SQLite table.
+
+    Entries expire after ttl_seconds and the least recently read entries are
+    evicted once the stored JSON exceeds max_bytes.
+    """
+
+    def __init__(self, db_path, table="result_cache", ttl_seconds=RESULT_CACHE_TTL_SECONDS, max_bytes=RESULT_CACHE_MAX_BYTES):
+        self.db_path = db_path
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = None
+
+    @property
+    def _conn(self):
+        # Opened on first use (with the lock held), so a gunicorn master that preloads the app never holds a connection its workers inherit
+        if self._db is None:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_accessed_at ON {self.table} (accessed_at)")
+            self._db.commit()
+        return self._db
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return json.loads(value)
+
+    def set(self, key, value):
+        payload = json.dumps(value)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload), now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        """Drops expired rows, then the least recently read rows until the tier fits in max_bytes."""
+        self._conn.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (now - self.ttl_seconds,))
+        total = self._conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute(
+            f"SELECT key, size FROM {self.table} ORDER BY accessed_at ASC"
+        ).fetchall():
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+class TinSealingCacheTier(SqliteCacheTier):
+    """
+    SqliteCacheTier for formatted W9 results that never writes a full EIN or SSN.
+
+    Results are stored with their TINs redacted and the full TINs sealed under
+    "_tins_sealed" with tin_cipher, to be restored on read. Without a cipher a
+    result holding a TIN is not written at all. Entries whose TINs cannot be
+    restored (including ones written in clear text before) read as misses.
+    """
+
+    SEALED_FIELD = "_tins_sealed"
+
+    def __init__(self, db_path, tin_cipher=None, **kwargs):
+        super().__init__(db_path, **kwargs)
+        self.tin_cipher = tin_cipher
+
+    def get(self, key):
+        value = super().get(key)
+        if not isinstance(value, dict) or not has_tin(value):
+            return value
+        tin_sealed = value.pop(self.SEALED_FIELD, None)
+        return unseal_tins(value, tin_sealed, self.tin_cipher)
+
+    def set(self, key, value):
+        if isinstance(value, dict) and has_tin(value):
+            if self.tin_cipher is None:
+                return
+            value = dict(redact_result(value), **{self.SEALED_FIELD: seal_tins(value, self.tin_cipher)})
+        super().set(key, value)
+
+
+class ResultCache:
+    """
+    Two-tier cache for formatted extraction results.
+
+    Lookups go to an in-process LRU (with TTL) first and then to the optional
+    on-disk tier; disk hits are promoted back into memory.
+    """
+
+    def __init__(self, max_items=RESULT_CACHE_MAX_ITEMS, ttl_seconds=RESULT_CACHE_TTL_SECONDS, disk_tier=None, name="Result"):
+        self.name = name
+        self._memory = TTLCache(maxsize=max_items, ttl=ttl_seconds)
+        self._disk = disk_tier
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        cache_stats_collector.register(self)
+
+    def get(self, key):
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self.memory_hits += 1
+        if value is not None:
+            record_cache_lookup(self.name.lower(), "memory")
+            Logger.debug("%s cache hit (memory) for %s", self.name, key)
+            return copy.deepcopy(value)
+
+        if self._disk is not None:
+            value = self._disk.get(key)
+            if value is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._memory[key] = value
+                record_cache_lookup(self.name.lower(), "disk")
+                Logger.debug("%s cache hit (disk) for %s", self.name, key)
+                return copy.deepcopy(value)
+
+        with self._lock:
+            self.misses += 1
+        record_cache_lookup(self.name.lower(), "miss")
+        Logger.debug("%s cache miss for %s", self.name, key)
+        return None
+
+    def set(self, key, value):
+        if not is_cacheable(value):
+            return
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._memory[key] = value
+        if self._disk is not None:
+            try:
+                self._disk.set(key, value)
+            except sqlite3.Error as e:
+                Logger.error("Could not write %s cache entry to disk: %s", self.name.lower(), e)
+
+    def stats(self):
+        """Returns hit/miss counters and the current hit ratio."""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_items": len(self._memory),
+            }
+
+    def close(self):
+        if self._disk is not None:
+            self._disk.close()
+
+
+result_cache = ResultCache(
+    disk_tier=TinSealingCacheTier(RESULT_CACHE_DB_PATH, build_tin_cipher(RESULT_CACHE_ENCRYPTION_KEY, "RESULT_CACHE_ENCRYPTION_KEY")) if RESULT_CACHE_DB_PATH else None
+)
@@ -0,0 +1,256 @@
+import hashlib
+import hmac
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from app.configuration.logger_setup import Logger
+from app.services.metrics import record_cache_lookup
+from app.services.tin_protection import TIN_FIELDS, value_of, normalize_tin, redact_result, has_tin, build_tin_cipher, seal_tins, unseal_tins
+
+RESULT_STORE_DB_PATH = os.getenv("RESULT_STORE_DB_PATH", "w9_results.db")  # set to "" to disable the store
+# Secret for the TIN lookup hashes, kept outside the database; the store stays disabled without it
+RESULT_STORE_TIN_KEY = os.getenv("RESULT_STORE_TIN_KEY")
+# Fernet key (cryptography package) sealing the full TINs; required for the store to serve repeat
+# extractions, as without it only the redacted TIN is kept and the store only answers /results lookups
+RESULT_STORE_ENCRYPTION_KEY = os.getenv("RESULT_STORE_ENCRYPTION_KEY")
+RESULT_STORE_QUERY_LIMIT = int(os.getenv("RESULT_STORE_QUERY_LIMIT", "100"))
+# Shorter name prefixes would match most of the store
+RESULT_STORE_MIN_PREFIX_CHARS = int(os.getenv("RESULT_STORE_MIN_PREFIX_CHARS", "3"))
+
+
+def normalize_name(name):
+    """Case- and punctuation-insensitive form of an entity name used for lookups."""
+    return " ".join(re.sub(r"[^\w\s]", " ", name or "").casefold().split()) or None
+
+
+def normalize_revision(revision):
+    """ "Rev. March 2024" and "March 2024" -> "march 2024"."""
+    revision = re.sub(r"^\s*rev\.?\s*", "", revision or "", flags=re.IGNORECASE)
+    return " ".join(revision.casefold().split()) or None
+
+
+class ResultStore:
+    """
+    Durable store of every formatted extraction result, keyed by document hash.
+
+    Each row is kept per result version (model route and formatter version,
+    as in the cache key) so a changed model or formatter never serves an old
+    shape. Rows are indexed by an HMAC of the EIN/SSN, so the raw TIN is
+    never usable as an index, and by normalized entity name and form
+    revision, making repeat lookups millisecond reads instead of new
+    extractions. WAL lets API and job worker processes read while another writes.
+
+    The stored result only holds a redacted TIN. With an encryption key the
+    full TIN is sealed in its own column and restored by get(), for
+    re-serving the extraction; query() never returns it. Without the key,
+    get() misses on every result that has a TIN, so the store only serves lookups.
+
+    A packet's forms are stored as results of their own (versions
+    "<result_version>:packet:<n>") so lookups find them, and the packet's
+    page and chunk counts in the packets table, for get_packet().
+    """
+
+    def __init__(self, db_path=RESULT_STORE_DB_PATH, tin_key=RESULT_STORE_TIN_KEY, encryption_key=RESULT_STORE_ENCRYPTION_KEY):
+        if not tin_key:
+            raise ValueError("ResultStore needs a TIN hash key (RESULT_STORE_TIN_KEY)")
+        self.db_path = db_path
+        self._tin_key = tin_key.encode()
+        self._tin_cipher = build_tin_cipher(encryption_key)
+        self.serves_tins = self._tin_cipher is not None
+        self._lock = threading.Lock()
+        self._db = None
+
+    @property
+    def _conn(self):
+        # Opened on first use (with the lock held), so a gunicorn master that preloads the app never holds a connection its workers inherit
+        if self._db is None:
+            self._db = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self._db.row_factory = sqlite3.Row
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "document_hash TEXT NOT NULL, result_version TEXT NOT NULL, result TEXT NOT NULL, "
+                "tin_hash TEXT, tin_type TEXT, entity_name TEXT, entity_name_key TEXT, revision TEXT, "
+                "stored_at REAL NOT NULL, tin_sealed TEXT, PRIMARY KEY (document_hash, result_version))"
+            )
+            try:
+                self._db.execute("ALTER TABLE results ADD COLUMN tin_sealed TEXT")
+            except sqlite3.OperationalError:
+                pass  # already there
+            self._db.execute("CREATE INDEX IF NOT EXISTS results_tin_hash ON results (tin_hash, stored_at)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS results_entity_name_key ON results (entity_name_key, stored_at)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS results_revision ON results (revision, stored_at)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS packets ("
+                "document_hash TEXT NOT NULL, result_version TEXT NOT NULL, page_count INTEGER, chunks INTEGER NOT NULL, "
+                "form_count INTEGER NOT NULL, stored_at REAL NOT NULL, PRIMARY KEY (document_hash, result_version))"
+            )
+            self._db.commit()
+        return self._db
+
+    def _tin_hash(self, tin):
+        """HMAC-SHA256 of a TIN's digits, or None when tin is not a nine-digit EIN/SSN. Called with the connection open."""
+        digits = normalize_tin(tin)
+        return hmac.new(self._tin_key, digits.encode(), hashlib.sha256).hexdigest() if digits else None
+
+    def save(self, document_hash, result_version, result):
+        """Stores (or replaces) the formatted result of a document. A failed write is logged, never raised."""
+        try:
+            self._save(document_hash, result_version, result)
+        except sqlite3.Error as e:
+            Logger.error("Could not store result for %s: %s", document_hash, e)
+
+    def _save(self, document_hash, result_version, result):
+        tin_type, tin = next(((field, value_of(result, field)) for field in TIN_FIELDS if normalize_tin(value_of(result, field))), (None, None))
+        entity_name = value_of(result, "Entity Name")
+        tin_sealed = seal_tins(result, self._tin_cipher)
+        with self._lock:
+            conn = self._conn
+            conn.execute(
+                "INSERT OR REPLACE INTO results (document_hash, result_version, result, tin_hash, tin_type, entity_name, "
+                "entity_name_key, revision, stored_at, tin_sealed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    document_hash, result_version, json.dumps(redact_result(result)), self._tin_hash(tin), tin_type, entity_name,
+                    normalize_name(entity_name), normalize_revision(result.get("W9 Form Revision")), time.time(), tin_sealed,
+                ),
+            )
+            conn.commit()
+
+    def get(self, document_hash, result_version):
+        """
+        The stored result of a document for this result version, with its full TIN, or None
+        (also when the TIN cannot be restored, or the store cannot be read).
+        """
+        try:
+            with self._lock:
+                result = self._get(document_hash, result_version)
+        except sqlite3.Error as e:
+            Logger.error("Could not read stored result for %s: %s", document_hash, e)
+            return None
+        record_cache_lookup("store", "disk" if result is not None else "miss")
+        return result
+
+    def _get(self, document_hash, result_version):
+        # Called with the lock held
+        row = self._conn.execute(
+            "SELECT result, tin_sealed FROM results WHERE document_hash = ? AND result_version = ?",
+            (document_hash, result_version),
+        ).fetchone()
+        if row is None:
+            return None
+        result = json.loads(row["result"])
+        return unseal_tins(result, row["tin_sealed"], self._tin_cipher) if has_tin(result) else result
+
+    def save_packet(self, document_hash, result_version, packet):
+        """Stores every form of an extracted packet plus its page and chunk counts. A failed write is logged, never raised."""
+        try:
+            for index, form in enumerate(packet["forms"], start=1):
+                self._save(document_hash, f"{result_version}:packet:{index}", form)
+            # Written last: a packet whose forms were not all stored is never served
+            with self._lock:
+                conn = self._conn
+                conn.execute(
+                    "INSERT OR REPLACE INTO packets (document_hash, result_version, page_count, chunks, form_count, stored_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (document_hash, result_version, packet["page_count"], packet["chunks"], len(packet["forms"]), time.time()),
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            Logger.error("Could not store packet %s: %s", document_hash, e)
+
+    def get_packet(self, document_hash, result_version):
+        """The stored packet of a document as extract_packet returns it, or None, as with get()."""
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT page_count, chunks, form_count FROM packets WHERE document_hash = ? AND result_version = ?",
+                    (document_hash, result_version),
+                ).fetchone()
+                forms = [self._get(document_hash, f"{result_version}:packet:{index}") for index in range(1, row["form_count"] + 1)] if row else None
+        except sqlite3.Error as e:
+            Logger.error("Could not read stored packet %s: %s", document_hash, e)
+            return None
+        packet = None
+        if forms is not None and all(form is not None for form in forms):
+            packet = {"page_count": row["page_count"], "chunks": row["chunks"], "forms": forms}
+        record_cache_lookup("store", "disk" if packet is not None else "miss")
+        return packet
+
+    def query(self, document_hash=None, tin=None, name=None, name_prefix=None, revision=None, limit=RESULT_STORE_QUERY_LIMIT):
+        """
+        Finds stored results matching every given filter, newest first.
+
+        Args:
+            document_hash: SHA-256 of the uploaded document.
+            tin: EIN or SSN, with or without dashes.
+            name: Entity name, matched ignoring case and punctuation.
+            name_prefix: Start of the entity name, matched the same way; at least
+                RESULT_STORE_MIN_PREFIX_CHARS characters once normalized.
+            revision: Form revision such as "March 2024".
+
+        Returns:
+            list: Dicts with the document hash, result version, entity name, revision, stored_at
+            and the result itself, whose TIN is redacted.
+
+        Raises:
+            ValueError: name_prefix is too short to narrow the search.
+        """
+        if name_prefix is not None:
+            prefix = normalize_name(name_prefix) or ""
+            if len(prefix) < RESULT_STORE_MIN_PREFIX_CHARS:
+                raise ValueError(f"name_prefix must have at least {RESULT_STORE_MIN_PREFIX_CHARS} letters or digits")
+        clauses, params = [], []
+        with self._lock:
+            conn = self._conn
+            if document_hash:
+                clauses.append("document_hash = ?")
+                params.append(document_hash)
+            if tin is not None:
+                tin_hash = self._tin_hash(tin)
+                if tin_hash is None:
+                    return []
+                clauses.append("tin_hash = ?")
+                params.append(tin_hash)
+            if name is not None:
+                clauses.append("entity_name_key = ?")
+                params.append(normalize_name(name))
+            if name_prefix is not None:
+                # A range rather than LIKE so the entity_name_key index is used
+                clauses.append("entity_name_key >= ? AND entity_name_key < ?")
+                params.extend((prefix, prefix + "\U0010ffff"))
+            if revision is not None:
+                clauses.append("revision = ?")
+                params.append(normalize_revision(revision))
+            where = " AND ".join(clauses) or "1 = 1"
+            rows = conn.execute(
+                f"SELECT document_hash, result_version, entity_name, revision, stored_at, result FROM results "
+                f"WHERE {where} ORDER BY stored_at DESC LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+        # Redacted again on the way out: rows written before TINs were redacted at rest still hold them
+        return [dict(row, result=redact_result(json.loads(row["result"]))) for row in rows]
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+def _build_result_store():
+    if not RESULT_STORE_DB_PATH:
+        return None
+    if not RESULT_STORE_TIN_KEY:
+        Logger.warning("RESULT_STORE_TIN_KEY is not set; the result store is disabled")
+        return None
+    store = ResultStore()
+    if not store.serves_tins:
+        Logger.warning("RESULT_STORE_ENCRYPTION_KEY is not set (or cryptography is missing); results with a TIN are stored redacted for lookups only and extracted again")
+    return store
+
+
+result_store = _build_result_store()
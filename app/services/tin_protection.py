@@ -0,0 +1,74 @@
+import json
+import re
+from app.configuration.logger_setup import Logger
+
+TIN_FIELDS = ("EIN", "SSN")
+
+
+def value_of(result, field):
+    entry = result.get(field)
+    return entry.get("value") if isinstance(entry, dict) else entry
+
+
+def normalize_tin(tin):
+    """The digits of an EIN or SSN, so 12-3456789 and 123456789 match; None when there are not nine."""
+    digits = re.sub(r"\D", "", tin or "")
+    return digits if len(digits) == 9 else None
+
+
+def redact_tin(tin):
+    """The last four digits of a nine-digit EIN/SSN behind asterisks; anything else is masked entirely."""
+    if str(tin).startswith("*"):
+        return tin  # already redacted
+    digits = normalize_tin(tin)
+    return f"*****{digits[-4:]}" if digits else "*****"
+
+
+def redact_result(result):
+    """A copy of a formatted result with its EIN and SSN redacted."""
+    for field in TIN_FIELDS:
+        if value_of(result, field):
+            result = _with_value(result, field, redact_tin(value_of(result, field)))
+    return result
+
+
+def _with_value(result, field, value):
+    """A copy of result with field's value replaced, keeping the {"value": ...} shape when it has one."""
+    entry = result.get(field)
+    return dict(result, **{field: dict(entry, value=value) if isinstance(entry, dict) else value})
+
+
+def has_tin(result):
+    return any(value_of(result, field) for field in TIN_FIELDS)
+
+
+def build_tin_cipher(key, setting="RESULT_STORE_ENCRYPTION_KEY"):
+    """The Fernet cipher for key, or None without a key (or without the cryptography package)."""
+    if not key:
+        return None
+    try:
+        from cryptography.fernet import Fernet
+    except ImportError:
+        Logger.warning("%s is set but cryptography is not installed; TINs are not kept at rest", setting)
+        return None
+    return Fernet(key)
+
+
+def seal_tins(result, tin_cipher):
+    """The EIN and SSN of result encrypted with tin_cipher, or None when it has neither (or there is no cipher)."""
+    tins = {field: value_of(result, field) for field in TIN_FIELDS if value_of(result, field)}
+    return tin_cipher.encrypt(json.dumps(tins).encode()).decode() if tins and tin_cipher is not None else None
+
+
+def unseal_tins(result, tin_sealed, tin_cipher):
+    """A redacted result with its TINs restored from tin_sealed, or None when they cannot be decrypted."""
+    if tin_sealed is None or tin_cipher is None:
+        return None
+    try:
+        tins = json.loads(tin_cipher.decrypt(tin_sealed.encode()))
+    except Exception as e:
+        Logger.warning("Could not decrypt stored TINs, re-extracting: %s", e)
+        return None
+    for field, value in tins.items():
+        result = _with_value(result, field, value)
+    return result
@@ -0,0 +1,123 @@
+import hashlib
+import io
+import os
+import tempfile
+
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+# Uploads up to this size stay in memory; larger ones spill to an anonymous (already unlinked) temp file
+UPLOAD_SPOOL_BYTES = int(os.getenv("UPLOAD_SPOOL_BYTES", str(1024 * 1024)))
+CHUNK_SIZE = 256 * 1024
+
+
+class UploadTooLarge(Exception):
+    """Raised as soon as an upload is known to exceed the configured maximum size."""
+
+    def __init__(self, max_bytes):
+        super().__init__(f"Upload exceeds the maximum allowed size of {max_bytes} bytes.")
+        self.max_bytes = max_bytes
+
+
+def hash_stream(stream, max_bytes=MAX_UPLOAD_BYTES):
+    """
+    Computes the SHA-256 of a seekable binary stream chunk by chunk and rewinds it.
+
+    Raises:
+        UploadTooLarge: As soon as more than max_bytes have been read (no limit when max_bytes is None).
+    """
+    digest = hashlib.sha256()
+    size = 0
+    stream.seek(0)
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if max_bytes is not None and size > max_bytes:
+            raise UploadTooLarge(max_bytes)
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def read_document(document):
+    """The bytes of document (bytes or a seekable stream, which is rewound)."""
+    if isinstance(document, (bytes, bytearray)):
+        return bytes(document)
+    document.seek(0)
+    try:
+        return document.read()
+    finally:
+        document.seek(0)
+
+
+def detach_upload(upload):
+    """
+    Takes the spooled file out of a Starlette UploadFile, which the framework
+    closes when the request ends. An extraction shared with other requests
+    (a coalesced one) outlives the request that started it, so it has to hold
+    the file itself and close it when done.
+    """
+    stream, upload.file = upload.file, io.BytesIO()
+    return stream
+
+
+async def spool_request_stream(chunks, max_bytes=MAX_UPLOAD_BYTES):
+    """
+    Spools an async iterator of body chunks (e.g. Request.stream()) into a
+    SpooledTemporaryFile, hashing as it goes.
+
+    Returns:
+        tuple: (rewound spooled file, SHA-256 hex digest). The caller closes the file.
+
+    Raises:
+        UploadTooLarge: Before the rest of an oversized body is read.
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(max_bytes)
+            digest.update(chunk)
+            spooled.write(chunk)
+    except BaseException:
+        spooled.close()
+        raise
+    spooled.seek(0)
+    return spooled, digest.hexdigest()
+
+
+class ResendableStream(io.RawIOBase):
+    """
+    View of a seekable stream, rewound to the start, whose close() leaves the
+    underlying stream open. aiohttp closes a request body once it is sent, so
+    each retry of an upload wraps the caller's stream in a fresh view.
+    """
+
+    def __init__(self, stream):
+        super().__init__()
+        self._stream = stream
+        stream.seek(0)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, size=-1):
+        return self._stream.read(size)
+
+    def readinto(self, buffer):
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._stream.seek(offset, whence)
+
+    def tell(self):
+        return self._stream.tell()
@@ -0,0 +1,101 @@
+"""
+Memory benchmark for the compact analysis record.
+
+Builds an AnalyzeResult the size of a real multi-page W9 packet (every page
+carrying its words, lines, spans and polygons) from the load-test fixture,
+and compares the memory it holds with the CompactAnalysis extraction keeps
+instead. Also checks both give the formatters identical input.
+
+    python benchmarks/bench_analysis_record.py [--pages 6] [--words-per-page 600]
+"""
+import argparse
+import copy
+import gc
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+from azure.ai.formrecognizer import AnalyzeResult
+from azure.ai.formrecognizer._generated.v2023_07_31.models import AnalyzeResult as GeneratedAnalyzeResult
+
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))  #needed to import the app modules from a checkout
+from app.services.analysis_record import CompactAnalysis
+from app.services.formatting_result import REVISION_PATTERN
+
+FIXTURE = Path(__file__).parent / "load_test" / "fixtures" / "analyze_result_typed.json"
+
+
+def legacy_collect_key_value_pairs(result):
+    """Frozen copy of the flattening form_extraction did on the full AnalyzeResult."""
+    extracted_json = {}
+    for kv_pair in result.key_value_pairs:
+        key = kv_pair.key.content.strip() if kv_pair.key and kv_pair.key.content else None
+        value = kv_pair.value.content.strip() if kv_pair.value and kv_pair.value.content else None
+        if key:
+            extracted_json[key] = {"value": value, "confidence": kv_pair.confidence}
+    return extracted_json
+
+
+def packet_payload(pages, words_per_page):
+    """The fixture's analyzeResult JSON, grown to `pages` pages of `words_per_page` words with one line per 5 words."""
+    payload = json.loads(FIXTURE.read_text())["analyzeResult"]
+    template_page = payload["pages"][0]
+    template_words = template_page["words"]
+    content = payload["content"]
+
+    payload["pages"] = []
+    for page_number in range(1, pages + 1):
+        page = copy.deepcopy(template_page)
+        page["pageNumber"] = page_number
+        page["words"] = [dict(template_words[index % len(template_words)]) for index in range(words_per_page)]
+        page["lines"] = [
+            {"content": " ".join(word["content"] for word in page["words"][start:start + 5]), "polygon": page["words"][start]["polygon"], "spans": [{"offset": start, "length": 40}]}
+            for start in range(0, words_per_page, 5)
+        ]
+        payload["pages"].append(page)
+    payload["content"] = "\n".join([content] * pages)
+    return payload
+
+
+def retained_bytes(build):
+    """Bytes still allocated after build() returns, with its result kept alive."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, kept
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=6)
+    parser.add_argument("--words-per-page", type=int, default=600)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    payload = packet_payload(args.pages, args.words_per_page)
+    deserialize = lambda: AnalyzeResult._from_generated(GeneratedAnalyzeResult.deserialize(payload))
+
+    full_bytes, result = retained_bytes(deserialize)
+    compact_bytes, compact = retained_bytes(lambda: CompactAnalysis.from_analyze_result(deserialize()))
+
+    assert compact.to_extracted_json() == legacy_collect_key_value_pairs(result)
+    full_match, compact_match = REVISION_PATTERN.search(result.content), REVISION_PATTERN.search(compact.content)
+    assert (full_match and full_match.groups()) == (compact_match and compact_match.groups())
+
+    build_seconds = min(timeit.repeat(lambda: CompactAnalysis.from_analyze_result(result), number=args.repeat, repeat=3)) / args.repeat
+
+    print(f"packet: {args.pages} pages x {args.words_per_page} words, {len(result.key_value_pairs)} key/value pairs")
+    print(f"AnalyzeResult held     {full_bytes / 1024:10.1f} KiB")
+    print(f"CompactAnalysis held   {compact_bytes / 1024:10.1f} KiB   ({full_bytes / max(compact_bytes, 1):.0f}x smaller)")
+    print(f"building the record    {build_seconds * 1e6:10.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark for W9 signature date normalization.
+
+Compares DateNormalizer against a frozen copy of the strptime loop it replaced
+in main2.format_extracted_json, over date strings as they come back from
+Azure for real W9s, and lists any inputs where the two disagree.
+
+    python benchmarks/bench_date_normalizer.py [--repeat 5] [--scale 200]
+"""
+import argparse
+import logging
+import os
+import re
+import sys
+import timeit
+from datetime import datetime
+
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))  #needed to import the app modules from a checkout
+from app.services.date_normalizer import DateNormalizer
+
+# Typed, handwritten (via OCR) and e-signature dates seen on W9 signature lines
+W9_DATE_CORPUS = (
+    "01/15/2024", "1/5/2024", "1/5/24", "12/31/2023", "03/04/2024", "3/4/24", "11/08/2022", "07/01/2021",
+    "01-15-2024", "12-31-19", "06-30-2022", "2024-01-15", "2023/11/02", "2021.07.01",
+    "15.08.2021", "03.04.2024", "15/01/2024", "31-12-2023",
+    "January 15, 2024", "Jan 15, 2024", "Jan. 15, 2024", "March 3rd, 2023", "Sept 9, 2022", "Dec 1 2023",
+    "15 January 2024", "7 Jun 2020", "2020 Jun 7", "4th of July, 2022",
+    "3 14 2024", "Date: 01/15/2024", "02/30/2024", "N/A", "",
+)
+
+
+def legacy_normalize(original_date, logger):
+    """Frozen copy of main2's exception-driven date branch, including its per-attempt logging."""
+    logger.info(f"Attempting to parse date: {original_date}")
+    date_str = original_date
+    month_pattern = re.compile(r'(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\.?\s+(\d{1,2})(?:st|nd|rd|th)?,?\s+(\d{4})', re.IGNORECASE)
+    month_match = month_pattern.search(date_str)
+    if month_match:
+        logger.info(f"Found month pattern match: {month_match.groups()}")
+        month_map = {
+            "jan": "01", "feb": "02", "mar": "03", "apr": "04", "may": "05", "jun": "06",
+            "jul": "07", "aug": "08", "sep": "09", "oct": "10", "nov": "11", "dec": "12"
+        }
+        return f"{month_match.group(3)}-{month_map[month_match.group(1).lower()]}-{str(int(month_match.group(2))).zfill(2)}"
+    date_formats = [
+        "%m/%d/%Y", "%d/%m/%Y", "%m-%d-%Y", "%d-%m-%Y", "%B %d, %Y",
+        "%d %B %Y", "%Y/%m/%d", "%Y-%m-%d", "%d.%m.%Y", "%m.%d.%Y", "%Y.%m.%d",
+        "%m-%d-%y", "%d-%m-%y", "%m/%d/%y", "%d/%m/%y",
+        "%b %d, %Y", "%d %b %Y", "%b %d %Y", "%Y %b %d"
+    ]
+    for fmt in date_formats:
+        try:
+            logger.info(f"Trying format: {fmt}")
+            parsed_date = datetime.strptime(date_str, fmt)
+            logger.info(f"Success with format: {fmt}")
+            return parsed_date.strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    logger.warning(f"All standard date parsing failed for: {date_str}")
+    digits = re.findall(r'\d+', date_str)
+    if len(digits) == 3 and len(digits[0]) <= 2 and int(digits[0]) <= 31 and len(digits[1]) <= 2 and int(digits[1]) <= 12:
+        year = digits[2]
+        if len(year) == 2:
+            year = ("20" if int(year) < 50 else "19") + year
+        return f"{year}-{digits[1].zfill(2)}-{digits[0].zfill(2)}"
+    return original_date
+
+
+def best_us(function, corpus, repeat):
+    """Best-of-repeat microseconds per date string."""
+    best = min(timeit.repeat(lambda: [function(text) for text in corpus], number=1, repeat=repeat))
+    return best / len(corpus) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--scale", type=int, default=200, help="copies of the corpus per timed run")
+    args = parser.parse_args()
+
+    logger = logging.getLogger("bench_date_normalizer.legacy")
+    logger.disabled = True
+    logging.getLogger("app.configuration.logger_setup").disabled = True
+
+    print(f"{'input':<22}{'legacy':<22}{'normalizer':<14}")
+    normalizer = DateNormalizer()
+    for text in W9_DATE_CORPUS:
+        before, after = legacy_normalize(text.strip(), logger), normalizer.normalize(text)
+        if before != after:
+            print(f"{text!r:<22}{before:<22}{after:<14}")
+
+    corpus = list(W9_DATE_CORPUS) * args.scale
+    legacy_us = best_us(lambda text: legacy_normalize(text.strip(), logger), corpus, args.repeat)
+    # Fresh normalizers without the exact-string cache show the classifier cost on its own
+    uncached_us = best_us(DateNormalizer(cache_size=0).normalize, corpus, args.repeat)
+    cached_us = best_us(DateNormalizer().normalize, corpus, args.repeat)
+
+    print()
+    print(f"{'implementation':<32}{'us/date':>10}{'speedup':>10}")
+    print(f"{'legacy strptime loop':<32}{legacy_us:>10.2f}{1:>9.2f}x")
+    print(f"{'DateNormalizer (no memo)':<32}{uncached_us:>10.2f}{legacy_us / uncached_us:>9.2f}x")
+    print(f"{'DateNormalizer':<32}{cached_us:>10.2f}{legacy_us / cached_us:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Micro-benchmark for per-document W9 formatting.
+
+Compares the table-driven FieldMapper formatters against frozen copies of the
+if/elif chains they replaced, over synthetic AnalyzeResult-like documents.
+The formatters are timed without their @timed metrics wrapper, whose cost is
+reported on its own row. The mapper is about as fast as the if/elif chain it
+replaced (its gain is the explicit priority table, not speed); main2's
+speedup comes from the shared date normalizer, which no longer rebuilds its
+regex and format list for every date.
+
+    python benchmarks/bench_formatting.py [--documents 2000] [--repeat 5]
+"""
+import argparse
+import logging
+import os
+import re
+import sys
+import timeit
+from collections import namedtuple
+from datetime import datetime
+
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))  #needed to import the app modules from a checkout
+from app.services.formatting_result import format_extracted_json
+import main2
+
+# Stands in for the stdlib logger main2 used to write to, disabled so only message building is timed
+legacy_logger = logging.getLogger("bench_formatting.legacy")
+legacy_logger.disabled = True
+
+FakeResult = namedtuple("FakeResult", ["content"])
+
+# Key wording as Azure's prebuilt-document model reports it for a Rev. October 2018 W9
+W9_KEYS = (
+    "1 Name (as shown on your income tax return). Name is required on this line; do not leave this line blank.",
+    "2 Business name/disregarded entity name, if different from above",
+    "5 Address (number, street, and apt. or suite no.) See instructions.",
+    "6 City, state, and ZIP code",
+    "Social security number",
+    "Employer identification number",
+    "Signature of U.S. person",
+    "Date",
+    "Requester's name and address (optional)",
+    "7 List account number(s) here (optional)",
+    "Exempt payee code (if any)",
+    "Exemption from FATCA reporting code (if any)",
+)
+DATES = ("March 3rd, 2023", "01/15/2024", "2022-11-30", "15.08.2021", "7 Jun 2020", "12-31-19")
+
+
+def make_documents(count):
+    documents = []
+    for index in range(count):
+        extracted_json = {key: {"value": f"value {index}", "confidence": 0.9} for key in W9_KEYS}
+        extracted_json["Date"]["value"] = DATES[index % len(DATES)]
+        extracted_json["6 City, state, and ZIP code"]["value"] = "Austin, TX 78701"
+        documents.append((FakeResult(f"Form W-9 (Rev. October 2018) Request for Taxpayer document {index}"), extracted_json))
+    return documents
+
+
+def legacy_format_extracted_json(result, extracted_json):
+    """Frozen copy of app.services.formatting_result.format_extracted_json before the field mapper."""
+    pattern = r"\bRev\.\s*([A-Za-z]+)\s*(\d{4})"
+    match = re.search(pattern, result.content, re.IGNORECASE)
+    revision = f"Rev. {match.group(1)} {match.group(2)}" if match else ""
+    formatted_json = {
+        "Entity Name": {"value": None, "confidence": None},
+        "Business Name": {"value": None, "confidence": None},
+        "Address": {"value": None, "confidence": None},
+        "City/State/Zip Code": {"value": None, "confidence": None},
+        "SSN": {"value": None, "confidence": None},
+        "EIN": {"value": None, "confidence": None},
+        "Date": {"value": None, "confidence": None},
+        "Signature": {"value": None, "confidence": None},
+        "W9 Form Revision": revision
+    }
+    for k, v in extracted_json.items():
+        if "Name" in k:
+            formatted_json["Entity Name"]["value"] = v["value"]
+            formatted_json["Entity Name"]["confidence"] = v["confidence"]
+        elif "Business name" in k:
+            formatted_json["Business Name"]["value"] = v["value"]
+            formatted_json["Business Name"]["confidence"] = v["confidence"]
+        elif "City, state, and ZIP code" in k:
+            formatted_json["City/State/Zip Code"]["value"] = v["value"]
+            formatted_json["City/State/Zip Code"]["confidence"] = v["confidence"]
+        elif "Employer identification number" in k:
+            formatted_json["EIN"]["value"] = v["value"]
+            formatted_json["EIN"]["confidence"] = v["confidence"]
+        elif "Social security number" in k:
+            formatted_json["SSN"]["value"] = v["value"]
+            formatted_json["SSN"]["confidence"] = v["confidence"]
+        elif "Date" in k:
+            formatted_json["Date"]["value"] = v["value"]
+            formatted_json["Date"]["confidence"] = v["confidence"]
+        elif "Signature" in k:
+            formatted_json["Signature"]["value"] = v["value"]
+            formatted_json["Signature"]["confidence"] = v["confidence"]
+        elif "Address" in k:
+            formatted_json["Address"]["value"] = v["value"]
+            formatted_json["Address"]["confidence"] = v["confidence"]
+    return formatted_json
+
+
+def legacy_main2_date(date_str):
+    """Frozen copy of main2's inline date branch, which rebuilt its regex and tables per call."""
+    legacy_logger.info(f"Attempting to parse date: {date_str}")
+    month_pattern = re.compile(r'(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\.?\s+(\d{1,2})(?:st|nd|rd|th)?,?\s+(\d{4})', re.IGNORECASE)
+    month_match = month_pattern.search(date_str)
+    if month_match:
+        legacy_logger.info(f"Found month pattern match: {month_match.groups()}")
+        month_map = {
+            "jan": "01", "feb": "02", "mar": "03", "apr": "04", "may": "05", "jun": "06",
+            "jul": "07", "aug": "08", "sep": "09", "oct": "10", "nov": "11", "dec": "12"
+        }
+        return f"{month_match.group(3)}-{month_map[month_match.group(1).lower()]}-{month_match.group(2).zfill(2)}"
+    date_formats = [
+        "%m/%d/%Y", "%d/%m/%Y", "%m-%d-%Y", "%d-%m-%Y", "%B %d, %Y",
+        "%d %B %Y", "%Y/%m/%d", "%Y-%m-%d", "%d.%m.%Y", "%m.%d.%Y", "%Y.%m.%d",
+        "%m-%d-%y", "%d-%m-%y", "%m/%d/%y", "%d/%m/%y",
+        "%b %d, %Y", "%d %b %Y", "%b %d %Y", "%Y %b %d"
+    ]
+    for fmt in date_formats:
+        try:
+            legacy_logger.info(f"Trying format: {fmt}")
+            parsed_date = datetime.strptime(date_str, fmt)
+            legacy_logger.info(f"Success with format: {fmt}")
+            return parsed_date.strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return date_str
+
+
+def legacy_main2_format(result, extracted_json, parsed_addresses):
+    """Frozen copy of main2.format_extracted_json before the field mapper."""
+    match = re.search(r"\bRev\.\s*([A-Za-z]+)\s*(\d{4})", result.content, re.IGNORECASE)
+    formatted_json = {
+        "Entity Name": {"value": None, "confidence": None},
+        "Business Name": {"value": None, "confidence": None},
+        "Address": {"value": None, "confidence": None},
+        "City": {"value": None, "confidence": None},
+        "State": {"value": None, "confidence": None},
+        "ZipCode": {"value": None, "confidence": None},
+        "SSN": {"value": None, "confidence": None},
+        "EIN": {"value": None, "confidence": None},
+        "Date": {"value": None, "confidence": None},
+        "Signature": {"value": None, "confidence": None},
+        "W9 Form Revision": f"{match.group(1)} {match.group(2)}" if match else ""
+    }
+    for k, v in extracted_json.items():
+        if "Name" in k:
+            formatted_json["Entity Name"] = {"value": v["value"], "confidence": v["confidence"]}
+        elif "Business name" in k:
+            formatted_json["Business Name"] = {"value": v["value"], "confidence": v["confidence"]}
+        elif "City, state, and ZIP code" in k:
+            parsed_address = parsed_addresses[k]
+            formatted_json["City"] = {"value": parsed_address.get("City"), "confidence": v["confidence"]}
+            formatted_json["State"] = {"value": parsed_address.get("State"), "confidence": v["confidence"]}
+            formatted_json["ZipCode"] = {"value": parsed_address.get("Zip Code"), "confidence": v["confidence"]}
+        elif "Employer identification number" in k:
+            formatted_json["EIN"] = {"value": v["value"], "confidence": v["confidence"]}
+        elif "Social security number" in k:
+            formatted_json["SSN"] = {"value": v["value"], "confidence": v["confidence"]}
+        elif "Date" in k:
+            formatted_json["Date"] = {"value": legacy_main2_date(v["value"].strip()), "confidence": v["confidence"]}
+        elif "Signature" in k:
+            formatted_json["Signature"] = {"value": v["value"], "confidence": v["confidence"]}
+        elif "Address" in k:
+            formatted_json["Address"] = {"value": v["value"], "confidence": v["confidence"]}
+    return formatted_json
+
+
+def per_document_us(function, documents, repeat):
+    """Best-of-repeat microseconds per document."""
+    best = min(timeit.repeat(lambda: [function(*document) for document in documents], number=1, repeat=repeat))
+    return best / len(documents) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    logging.getLogger("app.configuration.logger_setup").disabled = True
+    documents = make_documents(args.documents)
+    parsed = {"6 City, state, and ZIP code": {"City": "Austin", "State": "TX", "Zip Code": "78701"}}
+    main2_documents = [(result, extracted_json, parsed) for result, extracted_json in documents]
+
+    for result, extracted_json in documents[:len(DATES)]:
+        assert format_extracted_json(result, extracted_json) == legacy_format_extracted_json(result, extracted_json)
+    for document in main2_documents[:len(DATES)]:
+        assert main2.format_extracted_json(*document) == legacy_main2_format(*document)
+
+    cases = (
+        ("formatting_result", legacy_format_extracted_json, format_extracted_json.__wrapped__, documents),
+        ("main2", legacy_main2_format, main2.format_extracted_json.__wrapped__, main2_documents),
+        ("  + @timed", format_extracted_json.__wrapped__, format_extracted_json, documents),
+    )
+    print(f"{'formatter':<20}{'before (us/doc)':>18}{'after (us/doc)':>18}{'speedup':>10}")
+    for name, before, after, inputs in cases:
+        before_us = per_document_us(before, inputs, args.repeat)
+        after_us = per_document_us(after, inputs, args.repeat)
+        print(f"{name:<20}{before_us:>18.2f}{after_us:>18.2f}{before_us / after_us:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Upload size and CPU cost of image normalization.
+
+Builds a synthetic phone scan of a W9 (600 dpi colour pages with text, a
+paper-texture noise and a stamp of colour), stores it as a scanned PDF and as
+a JPEG photo, and runs normalize_document on each in the configured color
+modes. Reported per input: bytes before and after, the page size kept, and
+the time normalization takes on one core.
+
+    python benchmarks/bench_image_normalization.py [--pages 3] [--dpi 600]
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+from PIL import Image, ImageDraw, ImageFilter
+from PyPDF2 import PdfReader
+
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))  #needed to import the app modules from a checkout
+from app.services import image_normalization
+from app.services.image_normalization import normalize_document
+
+LINES = (
+    "Form W-9 (Rev. March 2024) Request for Taxpayer Identification Number and Certification",
+    "1 Name of entity/individual: Northwind Traders LLC",
+    "2 Business name/disregarded entity name, if different from above",
+    "5 Address (number, street, and apt. or suite no.): 1200 Congress Ave",
+    "6 City, state, and ZIP code: Austin, TX 78701",
+    "Employer identification number 12-3456789",
+    "Signature of U.S. person  Date 03/03/2024",
+)
+
+
+def scanned_page(dpi, seed):
+    """A Letter page at dpi with the W9 text, a tinted paper background and sensor noise, like a phone scan."""
+    width, height = int(8.5 * dpi), int(11 * dpi)
+    page = Image.new("RGB", (width, height), (246, 241, 228))
+    noise = Image.effect_noise((width // 4, height // 4), 24).resize((width, height)).convert("RGB")
+    page = Image.blend(page, noise, 0.12)
+    draw = ImageDraw.Draw(page)
+    rng = random.Random(seed)
+    for row in range(60):
+        text = LINES[row % len(LINES)]
+        draw.text((dpi // 2 + rng.randint(-4, 4), dpi // 2 + row * dpi // 6), text, fill=(30, 30, 40), font_size=dpi // 12)
+    draw.ellipse((width - 2 * dpi, height - 2 * dpi, width - dpi, height - dpi), outline=(40, 60, 170), width=dpi // 30)
+    return page.filter(ImageFilter.GaussianBlur(dpi / 600))
+
+
+def page_sizes(pdf):
+    return {(round(float(page.mediabox.width) / 72, 2), round(float(page.mediabox.height) / 72, 2)) for page in PdfReader(io.BytesIO(pdf)).pages}
+
+
+def measure(label, document):
+    start = time.perf_counter()
+    normalized = normalize_document(document)
+    elapsed = time.perf_counter() - start
+    if normalized is None:
+        print(f"{label:<28} {len(document) / 1e6:6.2f} MB -> unchanged ({elapsed:.2f}s)")
+        return
+    print(f"{label:<28} {len(document) / 1e6:6.2f} MB -> {len(normalized) / 1e6:5.2f} MB "
+          f"({len(document) / len(normalized):4.1f}x smaller) pages {sorted(page_sizes(normalized))} in. {elapsed:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--dpi", type=int, default=600)
+    args = parser.parse_args()
+
+    pages = [scanned_page(args.dpi, seed) for seed in range(args.pages)]
+    scanned_pdf = io.BytesIO()
+    pages[0].save(scanned_pdf, "PDF", resolution=args.dpi, save_all=True, append_images=pages[1:], quality=92)
+    photo = io.BytesIO()
+    pages[0].save(photo, "JPEG", quality=92)
+    print(f"{args.pages}-page scan at {args.dpi} dpi, normalized to {image_normalization.IMAGE_TARGET_DPI} dpi")
+
+    for color_mode in ("grayscale", "bilevel"):
+        image_normalization.IMAGE_COLOR_MODE = color_mode
+        measure(f"scanned PDF, {color_mode}", scanned_pdf.getvalue())
+        measure(f"JPEG photo, {color_mode}", photo.getvalue())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Latency and accuracy of each Document Intelligence model route.
+
+Offline (default) the recorded results in load_test/fixtures stand in for
+Azure: each route goes through the real ModelRouter and formatter, and is
+scored against w9_ground_truth.json. Reported per route: Azure calls per
+document (what the service bills and the latency a caller waits on), local
+processing time per document, and field accuracy.
+
+    python benchmarks/bench_model_routing.py [--repeat 200]
+
+Live, every PDF in a directory is analysed with each model against the
+configured AZURE_ENDPOINT(S), timing the whole extraction; PDFs with a
+<name>.expected.json next to them (same shape as w9_ground_truth.json
+entries) are scored as well.
+
+    python benchmarks/bench_model_routing.py --live pdfs/ --model prebuilt-document --model my-w9-model
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+from azure.ai.formrecognizer import AnalyzeResult
+from azure.ai.formrecognizer._generated.v2023_07_31.models import AnalyzeResult as GeneratedAnalyzeResult
+
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))  #needed to import the app modules from a checkout
+# Measure the models, not the local AcroForm fast path
+os.environ.setdefault("ACROFORM_FAST_PATH", "false")
+from app.services.model_routing import ModelRouter, KEY_VALUE_MODEL_ID
+from app.services.formatting_result import format_extracted_json
+from app.services.date_normalizer import normalize_date
+from app.services.result_cache import ResultCache
+
+FIXTURES_DIR = Path(__file__).parent / "load_test" / "fixtures"
+GROUND_TRUTH = FIXTURES_DIR / "w9_ground_truth.json"
+W9_MODEL_ID = "w9-custom"
+# Document -> model -> recorded AnalyzeResult
+CORPUS = {
+    "typed": {KEY_VALUE_MODEL_ID: "analyze_result_typed.json", W9_MODEL_ID: "analyze_result_w9_typed.json"},
+    "handwritten": {KEY_VALUE_MODEL_ID: "analyze_result_handwritten.json", W9_MODEL_ID: "analyze_result_w9_handwritten.json"},
+}
+ROUTES = (
+    ("key/value only", dict(model_id=None)),
+    ("W9 model", dict(model_id=W9_MODEL_ID)),
+    ("W9 model, always falling back", dict(model_id=W9_MODEL_ID, min_fields=99)),
+)
+
+
+def normalized(field, value):
+    if value is None or value == "":
+        return None
+    if field == "Date":
+        return normalize_date(value) or value
+    return re.sub(r"[^0-9a-z]", "", str(value).lower())
+
+
+def score(formatted, expected):
+    """(correct, total) over the ground-truth fields; Signature only has to be present or absent."""
+    correct = 0
+    for field, truth in expected.items():
+        value = (formatted.get(field) or {}).get("value")
+        if field == "Signature":
+            correct += bool(value) == truth
+        else:
+            correct += normalized(field, value) == normalized(field, truth)
+    return correct, len(expected)
+
+
+def load_result(name):
+    payload = json.loads((FIXTURES_DIR / name).read_text())["analyzeResult"]
+    return AnalyzeResult._from_generated(GeneratedAnalyzeResult.deserialize(payload))
+
+
+def run_offline(repeat):
+    ground_truth = json.loads(GROUND_TRUTH.read_text())
+    results = {document: {model: load_result(name) for model, name in models.items()} for document, models in CORPUS.items()}
+
+    print(f"{'route':<32} {'calls/doc':>9} {'local ms/doc':>13} {'accuracy':>9}")
+    for label, options in ROUTES:
+        router = ModelRouter(**options)
+        calls, correct, total = 0, 0, 0
+        for document, expected in ground_truth.items():
+            def analyze_with(model_id):
+                nonlocal calls
+                calls += 1
+                return results[document][model_id]
+
+            analysis = router.analyze(analyze_with)
+            doc_correct, doc_total = score(format_extracted_json(analysis, analysis.to_extracted_json()), expected)
+            correct, total = correct + doc_correct, total + doc_total
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for document in ground_truth:
+                analysis = router.analyze(lambda model_id: results[document][model_id])
+                format_extracted_json(analysis, analysis.to_extracted_json())
+        local_ms = (time.perf_counter() - start) * 1000 / (repeat * len(ground_truth))
+
+        print(f"{label:<32} {calls / len(ground_truth):>9.1f} {local_ms:>13.3f} {correct / total:>9.1%}")
+
+
+def run_live(pdf_dir, models):
+    from app.services.form_extraction import W9FormExtraction
+
+    pdfs = sorted(Path(pdf_dir).glob("*.pdf"))
+    if not pdfs:
+        raise SystemExit(f"No PDFs in {pdf_dir}")
+
+    print(f"{'model':<32} {'p50 ms':>9} {'max ms':>9} {'accuracy':>9}")
+    for model in models:
+        router = ModelRouter(model_id=None if model == KEY_VALUE_MODEL_ID else model)
+        # A fresh cache per model so every document is really analysed
+        extractor = W9FormExtraction(cache=ResultCache(name=f"Bench {model}"), model_router=router)
+        latencies, correct, total = [], 0, 0
+        for pdf in pdfs:
+            start = time.perf_counter()
+            formatted = extractor.extract_form_data(pdf)
+            latencies.append((time.perf_counter() - start) * 1000)
+            expected_path = pdf.with_suffix(".expected.json")
+            if expected_path.exists() and "error" not in formatted:
+                doc_correct, doc_total = score(formatted, json.loads(expected_path.read_text()))
+                correct, total = correct + doc_correct, total + doc_total
+        accuracy = f"{correct / total:.1%}" if total else "n/a"
+        print(f"{model:<32} {statistics.median(latencies):>9.0f} {max(latencies):>9.0f} {accuracy:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=200, help="offline: timing iterations over the corpus")
+    parser.add_argument("--live", metavar="PDF_DIR", help="analyse the PDFs in this directory against Azure instead")
+    parser.add_argument("--model", action="append", help="live: model id to compare (repeatable)")
+    args = parser.parse_args()
+
+    if args.live:
+        run_live(args.live, args.model or [KEY_VALUE_MODEL_ID])
+    else:
+        run_offline(args.repeat)
+
+
+if __name__ == "__main__":
+    main()
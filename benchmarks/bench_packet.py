@@ -0,0 +1,106 @@
+"""
+Wall-clock time of a multi-W9 packet analysed whole versus split into page chunks.
+
+Azure is simulated: every analysis takes --call-ms plus --page-ms per page it
+is given, so a packet analysed in one call waits on every page in turn while
+chunks analysed concurrently wait only on the slowest. Each simulated W9 has
+its name and "Rev." mark on its first page only, so the run also checks that
+the packet is cut into the right forms.
+
+    python benchmarks/bench_packet.py [--forms 12] [--pages-per-form 3] [--call-ms 800] [--page-ms 400]
+"""
+import argparse
+import asyncio
+import io
+import os
+import sys
+import time
+from PyPDF2 import PdfReader, PdfWriter
+
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))  #needed to import the app modules from a checkout
+from app.services.async_form_extraction import AsyncW9FormExtraction
+from app.services.analysis_record import CompactAnalysis, KeyValueRecord
+from app.services.result_cache import ResultCache, document_hash
+from app.services.request_coalescer import RequestCoalescer
+
+
+def blank_packet(page_count):
+    # Blank pages have no text layer, so preflight keeps all of them like a scanned packet.
+    # Each page's width is 600 + its page number, which tells the simulation where a chunk came from.
+    writer = PdfWriter()
+    for page in range(1, page_count + 1):
+        writer.add_blank_page(600 + page, 792)
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def simulated_analysis(packet_pages, pages_per_form):
+    """(page -> CompactAnalysis of that page alone) for a packet of pages_per_form-page W9s."""
+    analyses = {}
+    for page in packet_pages:
+        form, offset = divmod(page - 1, pages_per_form)
+        if offset == 0:
+            records = (
+                KeyValueRecord("1 Name (as shown on your income tax return)", f"Vendor {form + 1} LLC", 0.95, 1),
+                KeyValueRecord("Employer identification number", f"{form + 1:02d}-1234567", 0.95, 1),
+                KeyValueRecord("Address (number, street, and apt. or suite no.)", f"{form + 1} Main St", 0.95, 1),
+            )
+            analyses[page] = CompactAnalysis("Rev. March 2024", records, 1, {1: "Rev. March 2024"})
+        else:
+            records = (KeyValueRecord("Signature of U.S. person", "signed", 0.9, 1),)
+            analyses[page] = CompactAnalysis("", records, 1, {})
+    return analyses
+
+
+class PacketExtraction(AsyncW9FormExtraction):
+    """Answers run_analysis from the simulated pages instead of Azure, after a size-dependent delay."""
+
+    def __init__(self, chunk_pages, pages, call_seconds, page_seconds):
+        super().__init__(cache=ResultCache(), store=None, coalescer=RequestCoalescer(replay_seconds=0))
+        self.packet_chunk_pages = chunk_pages
+        self.pages = pages
+        self.call_seconds = call_seconds
+        self.page_seconds = page_seconds
+
+    async def run_analysis(self, document, analyze_kwargs):
+        reader = PdfReader(io.BytesIO(document) if isinstance(document, bytes) else document)
+        packet_pages = [int(page.mediabox.width) - 600 for page in reader.pages]
+        await asyncio.sleep(self.call_seconds + self.page_seconds * len(packet_pages))
+        return CompactAnalysis.merge([self.pages[page].renumbered([index]) for index, page in enumerate(packet_pages, start=1)])
+
+
+async def run(chunk_pages, packet, pages, call_seconds, page_seconds):
+    extractor = PacketExtraction(chunk_pages, pages, call_seconds, page_seconds)
+    start = time.perf_counter()
+    result = await extractor.extract_packet(packet, document_hash(packet))
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--forms", type=int, default=12)
+    parser.add_argument("--pages-per-form", type=int, default=3)
+    parser.add_argument("--call-ms", type=float, default=800)
+    parser.add_argument("--page-ms", type=float, default=400)
+    parser.add_argument("--chunk-pages", type=int, action="append", help="chunk sizes to compare (default: whole packet, 1, 2, 4)")
+    args = parser.parse_args()
+
+    page_count = args.forms * args.pages_per_form
+    packet = blank_packet(page_count)
+    pages = simulated_analysis(range(1, page_count + 1), args.pages_per_form)
+    for chunk_pages in args.chunk_pages or (page_count, 1, 2, 4):
+        elapsed, result = asyncio.run(run(chunk_pages, packet, pages, args.call_ms / 1000, args.page_ms / 1000))
+        forms = result["forms"]
+        correct = sum(
+            form["Entity Name"]["value"] == f"Vendor {index} LLC"
+            and form["Pages"] == f"{(index - 1) * args.pages_per_form + 1}-{index * args.pages_per_form}"
+            for index, form in enumerate(forms, start=1)
+        )
+        label = "whole packet" if chunk_pages >= page_count else f"{chunk_pages}-page chunks"
+        print(f"{label:<16} {result['chunks']:>3} calls  {elapsed:6.2f}s  {len(forms)}/{args.forms} forms found, {correct} correct")
+
+
+if __name__ == "__main__":
+    main()
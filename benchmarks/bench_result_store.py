@@ -0,0 +1,90 @@
+"""
+Lookup latency of the persistent result store.
+
+Fills a fresh store with synthetic formatted W9 results, then times reads by
+document hash, EIN/SSN, entity name, name prefix and form revision, and
+prints the query plan of each to show it is served by an index.
+
+    python benchmarks/bench_result_store.py [--rows 100000] [--lookups 2000]
+"""
+import argparse
+import hashlib
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))  #needed to import the app modules from a checkout
+from app.services.result_store import ResultStore, normalize_name
+
+REVISIONS = ("Rev. October 2018", "Rev. March 2024", "Rev. December 2014")
+WORDS = ("Northwind", "Contoso", "Fabrikam", "Tailspin", "Litware", "Adatum", "Proseware", "Wingtip", "Trey", "Fourth")
+
+
+def synthetic_result(index):
+    tin = f"{index % 10**9:09d}"
+    name = f"{WORDS[index % len(WORDS)]} {WORDS[(index // len(WORDS)) % len(WORDS)]} {index} LLC"
+    is_business = index % 3 != 0
+    field = lambda value: {"value": value, "confidence": 0.9}
+    return {
+        "Entity Name": field(name),
+        "Business Name": field(None),
+        "Address": field(f"{index} Main St"),
+        "City/State/Zip Code": field("Austin, TX 78701"),
+        "SSN": field(None if is_business else f"{tin[:3]}-{tin[3:5]}-{tin[5:]}"),
+        "EIN": field(f"{tin[:2]}-{tin[2:]}" if is_business else None),
+        "Date": field("2024-03-03"),
+        "Signature": field("signed"),
+        "W9 Form Revision": REVISIONS[index % len(REVISIONS)],
+        "Extraction Engine": "azure",
+    }
+
+
+def time_lookups(label, lookups, run):
+    samples = []
+    for argument in lookups:
+        start = time.perf_counter()
+        run(argument)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    print(f"{label:<14} p50 {statistics.median(samples):7.3f} ms   p99 {samples[int(len(samples) * 0.99) - 1]:7.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    store = ResultStore(os.path.join(tempfile.mkdtemp(prefix="w9-store-"), "results.db"), tin_key="bench-key")
+    version = "prebuilt-document:3"
+    start = time.perf_counter()
+    for index in range(args.rows):
+        store.save(hashlib.sha256(str(index).encode()).hexdigest(), version, synthetic_result(index))
+    print(f"saved {args.rows} results in {time.perf_counter() - start:.1f}s ({(time.perf_counter() - start) * 1e6 / args.rows:.0f} us each)")
+
+    picks = [random.randrange(args.rows) for _ in range(args.lookups)]
+    results = [synthetic_result(index) for index in picks]
+    time_lookups("document hash", picks, lambda index: store.get(hashlib.sha256(str(index).encode()).hexdigest(), version))
+    time_lookups("EIN/SSN", results, lambda result: store.query(tin=result["EIN"]["value"] or result["SSN"]["value"]))
+    time_lookups("entity name", results, lambda result: store.query(name=result["Entity Name"]["value"].upper()))
+    time_lookups("name prefix", results, lambda result: store.query(name_prefix=result["Entity Name"]["value"].split()[0], limit=20))
+    time_lookups("revision", picks[:200], lambda index: store.query(revision=REVISIONS[index % len(REVISIONS)], limit=20))
+
+    with store._lock:
+        conn = store._conn
+        for label, where, params in (
+            ("EIN/SSN", "tin_hash = ?", ("x",)),
+            ("entity name", "entity_name_key = ?", (normalize_name("Northwind"),)),
+            ("name prefix", "entity_name_key >= ? AND entity_name_key < ?", ("north", "north\U0010ffff")),
+            ("revision", "revision = ?", ("march 2024",)),
+        ):
+            plan = conn.execute(f"EXPLAIN QUERY PLAN SELECT * FROM results WHERE {where} ORDER BY stored_at DESC LIMIT 20", params).fetchall()
+            print(f"{label:<14} {'; '.join(row[-1] for row in plan)}")
+
+
+if __name__ == "__main__":
+    main()
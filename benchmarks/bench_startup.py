@@ -0,0 +1,159 @@
+"""
+Cold-start benchmark: how long until a fresh process can serve requests.
+
+Measures, in fresh interpreters with no .env or credentials needed:
+
+  import    time and peak RSS to import the app module
+  uvicorn   time from spawning `uvicorn <app>` to its first 200 response
+  gunicorn  the same for `gunicorn -c gunicorn_conf.py` with --workers workers,
+            plus the summed RSS of master and workers once every worker answers
+
+    python benchmarks/bench_startup.py [--app main2] [--runs 5] [--workers 2]
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+# Talk to the local server directly even when HTTP(S)_PROXY is set
+OPENER = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+IMPORT_PROBE = """
+import resource, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, len(sys.modules))
+"""
+
+
+def bench_env(work_dir):
+    env = dict(
+        os.environ,
+        AZURE_ENDPOINT="http://127.0.0.1:9/",
+        AZURE_API_KEY="bench-key",
+        AWS_ACCESS_KEY_ID="bench",
+        AWS_SECRET_ACCESS_KEY="bench",
+        JOB_QUEUE_DB_PATH=os.path.join(work_dir, "jobs.db"),
+        RESULT_STORE_DB_PATH=os.path.join(work_dir, "results.db"),
+        LOG_LEVEL="WARNING",
+        PYTHONPATH=str(REPO_ROOT),
+    )
+    # prometheus_client switches to multiprocess mode whenever the variable is set, even to ""
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    return env
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rss_mb(pids):
+    total = 0
+    for pid in pids:
+        try:
+            for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+                if line.startswith("VmRSS:"):
+                    total += int(line.split()[1])
+        except FileNotFoundError:
+            pass
+    return total / 1024
+
+
+def child_pids(pid):
+    children = Path(f"/proc/{pid}/task/{pid}/children")
+    return [int(child) for child in children.read_text().split()] if children.exists() else []
+
+
+def time_import(module, env, cwd):
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE.format(module=module)], env=env, cwd=cwd, capture_output=True, text=True, check=True
+    ).stdout.split()
+    return float(output[-3]), float(output[-2]), int(output[-1])
+
+
+def time_to_ready(command, port, env, cwd, workers=0, timeout=60):
+    """Spawns command and polls GET /metrics; returns (seconds to first 200, RSS of the process tree once `workers` child workers exist)."""
+    start = time.perf_counter()
+    process = subprocess.Popen(command, env=env, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        ready = None
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"{' '.join(command)} exited with code {process.returncode}")
+            try:
+                with OPENER.open(f"http://127.0.0.1:{port}/metrics", timeout=1) as response:
+                    if response.status == 200:
+                        ready = time.perf_counter() - start
+                        break
+            except OSError:
+                time.sleep(0.02)
+        if ready is None:
+            raise TimeoutError(f"{' '.join(command)} not ready after {timeout}s")
+
+        # Let every worker finish booting before sampling memory
+        deadline = time.perf_counter() + timeout
+        while len(child_pids(process.pid)) < workers and time.perf_counter() < deadline:
+            time.sleep(0.05)
+        time.sleep(0.5)
+        return ready, rss_mb([process.pid] + child_pids(process.pid))
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def summarize(label, samples, unit="s"):
+    values = [sample[0] for sample in samples]
+    extra = f"   rss {statistics.median(sample[1] for sample in samples):7.1f} MB"
+    print(f"{label:<10} median {statistics.median(values):6.3f} {unit}   min {min(values):6.3f} {unit}{extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--app", default="main2", help="module to import and serve (its `app` attribute)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--skip-gunicorn", action="store_true")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="w9-startup-")
+    env = bench_env(work_dir)
+
+    imports = [time_import(args.app, env, work_dir) for _ in range(args.runs)]
+    summarize("import", imports)
+    print(f"{'':<10} {imports[0][2]} modules loaded")
+
+    uvicorn_runs = []
+    for _ in range(args.runs):
+        port = free_port()
+        command = [sys.executable, "-m", "uvicorn", f"{args.app}:app", "--port", str(port), "--log-level", "warning"]
+        uvicorn_runs.append(time_to_ready(command, port, env, REPO_ROOT))
+    summarize("uvicorn", uvicorn_runs)
+
+    if not args.skip_gunicorn and (REPO_ROOT / "gunicorn_conf.py").exists():
+        gunicorn_runs = []
+        for _ in range(args.runs):
+            port = free_port()
+            command = [
+                sys.executable, "-m", "gunicorn", "-c", str(REPO_ROOT / "gunicorn_conf.py"),
+                "--bind", f"127.0.0.1:{port}", "--workers", str(args.workers),
+            ]
+            gunicorn_runs.append(time_to_ready(command, port, dict(env, GUNICORN_APP=f"{args.app}:app"), REPO_ROOT, args.workers))
+        summarize("gunicorn", gunicorn_runs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+"""Minimal app mounting form_upload_router so the load test can drive it on its own."""
+from fastapi import FastAPI
+from app.api.form_upload_router import router
+from app.api.metrics_router import router as metrics_router
+
+app = FastAPI()
+app.include_router(router)
+app.include_router(metrics_router)
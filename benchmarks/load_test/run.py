@@ -0,0 +1,258 @@
+"""
+Offline load test: drives one of the FastAPI apps against the recorded Azure/Bedrock stubs.
+
+Starts stub_servers.py and the target app (under uvicorn) as subprocesses,
+sends --requests uploads at --concurrency, and reports latency percentiles,
+throughput and the app process's CPU time and RSS. No credentials needed.
+
+    python benchmarks/load_test/run.py --target main2 --concurrency 32 --requests 500
+    python benchmarks/load_test/run.py --target router --fail-p95-ms 2500 --json-out result.json
+
+Targets:
+    main    main.py   POST /extract_w9   raw PDF body
+    main2   main2.py  POST /extract-w9   base64 PDF in JSON
+    router  app/api/form_upload_router.py mounted at POST /  multipart upload
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import aiohttp
+from PyPDF2 import PdfWriter
+
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+LOAD_TEST_DIR = Path(__file__).resolve().parent
+
+TARGETS = {
+    "main": ("main:app", "/extract_w9"),
+    "main2": ("main2:app", "/extract-w9"),
+    "router": ("benchmarks.load_test.router_app:app", "/"),
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def make_documents(count):
+    """Distinct one-page PDFs without a text layer, so neither the result cache nor preflight short-circuits Azure."""
+    documents = []
+    for index in range(count):
+        writer = PdfWriter()
+        writer.add_blank_page(612, 792)
+        writer.add_metadata({"/Subject": f"load-test-{index}"})
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        documents.append(buffer.getvalue())
+    return documents
+
+
+def build_request(target, document, index):
+    """Returns aiohttp request kwargs for one upload to target."""
+    if target == "main":
+        return {"data": document, "headers": {"Content-Type": "application/pdf"}}
+    if target == "main2":
+        return {"json": {"file_base64": base64.b64encode(document).decode()}}
+    form = aiohttp.FormData()
+    form.add_field("file", document, filename=f"w9-{index}.pdf", content_type="application/pdf")
+    return {"data": form}
+
+
+class ProcessSampler:
+    """Reads CPU time and RSS of a process from /proc (Linux)."""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.clock_ticks = os.sysconf("SC_CLK_TCK")
+
+    def cpu_seconds(self):
+        fields = Path(f"/proc/{self.pid}/stat").read_text().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / self.clock_ticks
+
+    def memory_mb(self):
+        status = dict(line.split(":", 1) for line in Path(f"/proc/{self.pid}/status").read_text().splitlines() if ":" in line)
+        to_mb = lambda value: int(value.split()[0]) / 1024
+        return to_mb(status["VmRSS"]), to_mb(status["VmHWM"])
+
+
+async def wait_until_listening(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{process.args[2:4]} exited with code {process.returncode}")
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise TimeoutError(f"Nothing listening on port {port} after {timeout}s")
+
+
+async def drive(url, target, documents, total_requests, concurrency, timeout):
+    """Sends total_requests uploads from `concurrency` workers; returns (latencies, errors, elapsed)."""
+    latencies, errors = [], {}
+    counter = iter(range(total_requests))
+
+    async def worker(session):
+        for index in counter:
+            document = documents[index % len(documents)]
+            start = time.perf_counter()
+            try:
+                async with session.post(url, **build_request(target, document, index)) as response:
+                    body = await response.read()
+                    failed = response.status != 200 or b'"error"' in body
+                    outcome = f"HTTP {response.status}" if response.status != 200 else "error in body"
+            except Exception as e:
+                failed, outcome = True, type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            if failed:
+                errors[outcome] = errors.get(outcome, 0) + 1
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        return latencies, errors, time.perf_counter() - start
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+
+async def run(args):
+    app_module, path = TARGETS[args.target]
+    stub_ports, app_port = [free_port() for _ in range(args.azure_endpoints)], free_port()
+    work_dir = tempfile.mkdtemp(prefix="w9-load-")
+    stub_urls = [f"http://127.0.0.1:{port}" for port in stub_ports]
+    stub_url = stub_urls[0]
+
+    env = dict(
+        os.environ,
+        AZURE_ENDPOINT=stub_url + "/",
+        AZURE_API_KEY="stub-key",
+        AZURE_ENDPOINTS=";".join(f"{url}/|stub-key" for url in stub_urls) if args.azure_endpoints > 1 else "",
+        BEDROCK_ENDPOINT_URL=stub_url,
+        W9_MODEL_ID=args.w9_model or "",
+        AWS_ACCESS_KEY_ID="stub",
+        AWS_SECRET_ACCESS_KEY="stub",
+        aws_access_key_id="stub",
+        aws_secret_access_key="stub",
+        JOB_QUEUE_DB_PATH=os.path.join(work_dir, "jobs.db"),
+        RESULT_STORE_DB_PATH=os.path.join(work_dir, "results.db"),
+        LOG_LEVEL=args.log_level,
+        PYTHONPATH=str(REPO_ROOT),
+    )
+    stub_command = [
+        sys.executable, str(LOAD_TEST_DIR / "stub_servers.py"),
+        "--azure-latency", args.azure_latency, "--bedrock-latency", args.bedrock_latency, "--error-rate", str(args.error_rate),
+        "--throttle-rate", str(args.throttle_rate),
+    ] + (["--unique-addresses"] if args.unique_addresses else [])
+    app_command = [
+        sys.executable, "-m", "uvicorn", app_module, "--port", str(app_port), "--log-level", "warning", "--no-access-log",
+    ]
+
+    stubs = [subprocess.Popen(stub_command + ["--port", str(port)], env=env, cwd=work_dir) for port in stub_ports]
+    app = subprocess.Popen(app_command, env=env, cwd=REPO_ROOT)
+    try:
+        for port, stub in zip(stub_ports, stubs):
+            await wait_until_listening(port, stub)
+        await wait_until_listening(app_port, app)
+        documents = make_documents(min(args.requests, args.unique_documents))
+        url = f"http://127.0.0.1:{app_port}{path}"
+
+        if args.warmup:
+            await drive(url, args.target, documents[-1:], args.warmup, min(args.warmup, args.concurrency), args.timeout)
+
+        sampler = ProcessSampler(app.pid)
+        cpu_before = sampler.cpu_seconds()
+        latencies, errors, elapsed = await drive(url, args.target, documents, args.requests, args.concurrency, args.timeout)
+        cpu_seconds = sampler.cpu_seconds() - cpu_before
+        rss_mb, peak_rss_mb = sampler.memory_mb()
+    finally:
+        for process in [app] + stubs:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    latencies.sort()
+    return {
+        "target": args.target,
+        "concurrency": args.concurrency,
+        "requests": len(latencies),
+        "errors": sum(errors.values()),
+        "error_breakdown": errors,
+        "elapsed_seconds": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "max_ms": round(latencies[-1] * 1000, 1) if latencies else None,
+        "cpu_seconds": round(cpu_seconds, 3),
+        "cpu_ms_per_request": round(cpu_seconds * 1000 / max(len(latencies), 1), 2),
+        "cpu_utilization": round(cpu_seconds / elapsed, 3),
+        "rss_mb": round(rss_mb, 1),
+        "peak_rss_mb": round(peak_rss_mb, 1),
+        "azure_endpoints": args.azure_endpoints,
+        "w9_model": args.w9_model,
+        "azure_latency": args.azure_latency,
+        "bedrock_latency": args.bedrock_latency,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--target", choices=sorted(TARGETS), default="main2")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=5, help="untimed requests sent first")
+    parser.add_argument("--unique-documents", type=int, default=10**6, help="cycle through this many distinct PDFs (lower it to exercise the result cache)")
+    parser.add_argument("--azure-latency", default="lognormal:1200,0.35", help="see stub_servers.Latency")
+    parser.add_argument("--bedrock-latency", default="lognormal:600,0.3")
+    parser.add_argument("--unique-addresses", action="store_true", help="defeat the address cache so Bedrock sees every low-confidence address")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of analyses the Azure stub fails with 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of analyses the Azure stub throttles with 429 + Retry-After")
+    parser.add_argument("--azure-endpoints", type=int, default=1, help="run this many Azure stubs and pass them all in AZURE_ENDPOINTS")
+    parser.add_argument("--w9-model", help="set W9_MODEL_ID so the app reads typed fields (the stub answers with recorded W9-model results)")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--log-level", default="WARNING", help="LOG_LEVEL for the app under test")
+    parser.add_argument("--json-out", help="also write the report to this file")
+    parser.add_argument("--fail-p95-ms", type=float, help="exit 1 when p95 latency exceeds this (for CI)")
+    parser.add_argument("--fail-cpu-ms", type=float, help="exit 1 when CPU per request exceeds this (for CI)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    for key, value in report.items():
+        print(f"{key:<22}{value}")
+    if args.json_out:
+        Path(args.json_out).write_text(json.dumps(report, indent=2))
+
+    failures = []
+    if report["errors"]:
+        failures.append(f"{report['errors']} failed requests")
+    if args.fail_p95_ms is not None and report["p95_ms"] > args.fail_p95_ms:
+        failures.append(f"p95 {report['p95_ms']} ms > {args.fail_p95_ms} ms")
+    if args.fail_cpu_ms is not None and report["cpu_ms_per_request"] > args.fail_cpu_ms:
+        failures.append(f"CPU {report['cpu_ms_per_request']} ms/request > {args.fail_cpu_ms} ms")
+    if failures and (args.fail_p95_ms is not None or args.fail_cpu_ms is not None):
+        print("FAILED: " + "; ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
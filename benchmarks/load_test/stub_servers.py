@@ -0,0 +1,147 @@
+"""
+Local stand-ins for Azure Document Intelligence and Bedrock, serving recorded responses.
+
+Speaks enough of both REST protocols for the real SDK clients:
+
+    POST /formrecognizer/documentModels/{model}:analyze          -> 202 + Operation-Location
+    GET  /formrecognizer/documentModels/{model}/analyzeResults/{id} -> recorded AnalyzeResult
+                                                                    (typed W9 fields for any model but prebuilt-document)
+    POST /model/{model_id}/invoke                                 -> recorded Claude message
+
+Analysis latency is applied when the result is polled (like a long-poll of the
+real service) and Bedrock latency before the response is sent; both are drawn
+from the configured distributions.
+
+    python benchmarks/load_test/stub_servers.py --port 8790 --azure-latency lognormal:1200,0.35
+"""
+import argparse
+import asyncio
+import copy
+import itertools
+import json
+import math
+import random
+import re
+from pathlib import Path
+from aiohttp import web
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+ANALYZE_FIXTURES = ("analyze_result_typed.json", "analyze_result_handwritten.json")
+W9_MODEL_FIXTURES = ("analyze_result_w9_typed.json", "analyze_result_w9_handwritten.json")
+KEY_VALUE_MODEL_ID = "prebuilt-document"
+BEDROCK_FIXTURE = "bedrock_address.json"
+
+ADDRESS_KEY = "City, state, and ZIP code"
+ADDRESS_FIELD = "CityStateZip"
+BATCH_COUNT_PATTERN = re.compile(r"each of the following (\d+) addresses")
+
+
+class Latency:
+    """
+    A latency distribution in milliseconds, parsed from "kind:params":
+
+        fixed:250             always 250 ms
+        uniform:100,400       uniform between 100 and 400 ms
+        lognormal:1200,0.35   lognormal with median 1200 ms and sigma 0.35
+    """
+
+    def __init__(self, spec):
+        self.spec = spec
+        kind, _, params = spec.partition(":")
+        values = [float(value) for value in params.split(",") if value]
+        if kind == "fixed" and len(values) == 1:
+            self._sample = lambda: values[0]
+        elif kind == "uniform" and len(values) == 2:
+            self._sample = lambda: random.uniform(values[0], values[1])
+        elif kind == "lognormal" and len(values) == 2:
+            self._sample = lambda: random.lognormvariate(math.log(values[0]), values[1])
+        else:
+            raise ValueError(f"Invalid latency spec: {spec}")
+
+    def sample_seconds(self):
+        return max(self._sample(), 0.0) / 1000
+
+
+def build_app(azure_latency, bedrock_latency, unique_addresses=False, error_rate=0.0, throttle_rate=0.0):
+    """
+    Returns the stub aiohttp application.
+
+    unique_addresses prefixes every City/State/ZIP value with the operation
+    number so the address cache cannot absorb the Bedrock traffic; error_rate
+    is the fraction of analyses answered with a 503 and throttle_rate the
+    fraction answered with a 429 carrying a Retry-After of one second.
+    """
+    analyze_results = [json.loads((FIXTURES_DIR / name).read_text()) for name in ANALYZE_FIXTURES]
+    w9_model_results = [json.loads((FIXTURES_DIR / name).read_text()) for name in W9_MODEL_FIXTURES]
+    bedrock_message = json.loads((FIXTURES_DIR / BEDROCK_FIXTURE).read_text())
+    operation_ids = itertools.count(1)
+    operations = {}
+
+    async def begin_analyze(request):
+        await request.read()
+        if random.random() < error_rate:
+            return web.json_response({"error": {"code": "ServiceUnavailable", "message": "stub error"}}, status=503)
+        if random.random() < throttle_rate:
+            return web.json_response({"error": {"code": "429", "message": "stub rate limit"}}, status=429, headers={"Retry-After": "1"})
+        operation_id = str(next(operation_ids))
+        model_id = request.match_info["model_id"]
+        operations[operation_id] = (asyncio.get_running_loop().time() + azure_latency.sample_seconds(), model_id)
+        location = f"{request.scheme}://{request.host}/formrecognizer/documentModels/{model_id}/analyzeResults/{operation_id}?api-version=2023-07-31"
+        return web.Response(status=202, headers={"Operation-Location": location, "Retry-After": "0"})
+
+    async def get_analyze_result(request):
+        operation_id = request.match_info["operation_id"]
+        operation = operations.pop(operation_id, None)
+        if operation is None:
+            return web.json_response({"error": {"code": "NotFound", "message": "unknown operation"}}, status=404)
+        ready_at, model_id = operation
+        await asyncio.sleep(max(ready_at - asyncio.get_running_loop().time(), 0))
+
+        results = analyze_results if model_id == KEY_VALUE_MODEL_ID else w9_model_results
+        body = results[int(operation_id) % len(results)]
+        if unique_addresses:
+            body = copy.deepcopy(body)
+            for pair in body["analyzeResult"]["keyValuePairs"]:
+                if ADDRESS_KEY in pair["key"]["content"]:
+                    pair["value"]["content"] = f"Unit {operation_id}, {pair['value']['content']}"
+            for document in body["analyzeResult"].get("documents", ()):
+                field = document["fields"].get(ADDRESS_FIELD)
+                if field:
+                    field["content"] = field["valueString"] = f"Unit {operation_id}, {field['content']}"
+        return web.json_response(body)
+
+    async def invoke_model(request):
+        payload = await request.json()
+        await asyncio.sleep(bedrock_latency.sample_seconds())
+        message = copy.deepcopy(bedrock_message)
+        prompt = payload["messages"][0]["content"]
+        batch = BATCH_COUNT_PATTERN.search(prompt)
+        if batch:
+            answer = json.loads(message["content"][0]["text"])
+            message["content"][0]["text"] = json.dumps([answer] * int(batch.group(1)), indent=4)
+        return web.json_response(message)
+
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.router.add_post("/formrecognizer/documentModels/{model_id}:analyze", begin_analyze)
+    app.router.add_get("/formrecognizer/documentModels/{model_id}/analyzeResults/{operation_id}", get_analyze_result)
+    app.router.add_post("/model/{model_id}/invoke", invoke_model)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--azure-latency", type=Latency, default=Latency("lognormal:1200,0.35"))
+    parser.add_argument("--bedrock-latency", type=Latency, default=Latency("lognormal:600,0.3"))
+    parser.add_argument("--unique-addresses", action="store_true")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    app = build_app(args.azure_latency, args.bedrock_latency, args.unique_addresses, args.error_rate, args.throttle_rate)
+    web.run_app(app, host=args.host, port=args.port, access_log=None, print=None)
+
+
+if __name__ == "__main__":
+    main()
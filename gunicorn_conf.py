@@ -0,0 +1,43 @@
+"""
+Production server: gunicorn supervising uvicorn workers.
+
+    gunicorn -c gunicorn_conf.py
+
+The app is imported once in the master (preload_app) and forked, so workers
+start without re-importing FastAPI, the Azure SDK and pydantic, and share
+those pages copy-on-write. Nothing opens a socket, thread or SQLite
+connection at import time; each worker builds its Azure and Bedrock clients
+in the app's lifespan, after the fork.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+from app.configuration.environment import load_environment
+
+load_environment()
+
+# Every worker writes its metrics here and /metrics aggregates them. Prepared here, before the preloaded
+# app imports prometheus_client; samples left by a previous run's workers would otherwise be summed in.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "w9-prometheus"))
+shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+wsgi_app = os.getenv("GUNICORN_APP", "main2:app")
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+# Async workers: one per core is enough, the Azure/Bedrock waits do not hold a worker
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# Recycle workers after this many requests (0 = never), staggered so they do not all restart at once
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "50"))
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,57 +1,113 @@
+from app.configuration.environment import load_environment
+
+load_environment()
+
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.responses import JSONResponse
-from azure.core.credentials import AzureKeyCredential
-from azure.ai.formrecognizer import DocumentAnalysisClient
-from dotenv import load_dotenv
-import tempfile
-import os
+from contextlib import asynccontextmanager
 from typing import Dict
-import json
-
-app = FastAPI()
-load_dotenv()
+from app.services.client_registry import get_async_document_analysis_client, close_all_async_clients
+from app.services.result_cache import result_cache, make_cache_key
+from app.services.upload_stream import spool_request_stream, ResendableStream, UploadTooLarge
+from app.api.upload_limits import MaxBodySizeMiddleware, upload_too_large_handler
+from app.api.metrics_router import router as metrics_router, MetricsMiddleware
+from app.services.metrics import track_stage
+from app.services.resilience import azure_backend, BackendUnavailable
+from app.services.endpoint_pool import azure_endpoint_pool
+from app.services.model_routing import w9_model_router
+from app.services.async_form_extraction import wait_for_analysis_async
+from app.services.request_coalescer import request_coalescer
+from app.api.backend_errors import backend_unavailable_handler
 
-AZURE_ENDPOINT = os.getenv("AZURE_ENDPOINT")
-AZURE_API_KEY = os.getenv("AZURE_API_KEY")
+# Version of the raw key/value output below; bump when it changes so cached results are not reused
+RAW_FORMAT_VERSION = "raw-kv-1"
 
-if not AZURE_ENDPOINT or not AZURE_API_KEY:
+if not azure_endpoint_pool.endpoints:
     raise ValueError("Azure endpoint or key is missing. Check your .env file.")
 
-document_analysis_client = DocumentAnalysisClient(
-    AZURE_ENDPOINT, AzureKeyCredential(AZURE_API_KEY)
-)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the pooled clients up front so the first request does not pay for them
+    for endpoint in azure_endpoint_pool.endpoints:
+        get_async_document_analysis_client(endpoint.endpoint, endpoint.api_key)
+    yield
+    await close_all_async_clients()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MaxBodySizeMiddleware)
+app.add_exception_handler(UploadTooLarge, upload_too_large_handler)
+app.add_exception_handler(BackendUnavailable, backend_unavailable_handler)
+app.add_middleware(MetricsMiddleware)
+app.include_router(metrics_router)
+
+
+async def analyze_document(document):
+    """One attempt at an Azure analysis, W9 model first when configured, failing over across the endpoint pool; retried by azure_backend."""
+
+    async def analyze_with(model_id):
+        async def analyze_on(endpoint):
+            document_analysis_client = get_async_document_analysis_client(endpoint.endpoint, endpoint.api_key)
+            # Every try resends the spooled file from the start
+            poller = await document_analysis_client.begin_analyze_document(model_id, document=ResendableStream(document))
+            return await wait_for_analysis_async(poller)
+
+        return await azure_endpoint_pool.call_async(analyze_on)
+
+    # Keep only the key/value records; each AnalyzeResult is freed as soon as the router has read it
+    return await w9_model_router.analyze_async(analyze_with)
 
 
-def process_w9_from_bytes(file_bytes: bytes) -> Dict:
-    poller = document_analysis_client.begin_analyze_document(
-        "prebuilt-document", document=file_bytes
-    )
-    result = poller.result()
+async def process_w9_document(document, digest: str) -> Dict:
+    cache_key = make_cache_key(digest, w9_model_router.cache_model_id, RAW_FORMAT_VERSION)
+    # Identical uploads arriving together (client retries) share one analysis, which may outlive
+    # this request: the coalescer closes the spooled file once that analysis is done with it
+    return await request_coalescer.run_async(cache_key, lambda: extract_raw(document, cache_key), cache_key, document)
+
+
+async def extract_raw(document, cache_key: str) -> Dict:
+    cached_data = result_cache.get(cache_key)
+    if cached_data is not None:
+        return cached_data
+
+    with track_stage("azure_analysis"):
+        result = await azure_backend.call_async(analyze_document, document)
 
     extracted_data = {}
-    for kv_pair in result.key_value_pairs:
-        key = kv_pair.key.content.strip() if kv_pair.key else None
-        value = kv_pair.value.content.strip() if kv_pair.value else None
-        if key and value:
-            extracted_data[key] = value
+    for record in result.key_value_pairs:
+        if record.key and record.value:
+            extracted_data[record.key] = record.value
 
+    result_cache.set(cache_key, extracted_data)
     return extracted_data
 
 
 @app.post("/extract_w9")
 async def extract_w9_data(request: Request):
-    try:
-        file_bytes = await request.body()
-
-        # Optional: Save for debugging or logging
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
-            temp_file.write(file_bytes)
-            temp_path = temp_file.name
+    # Spool the body as it arrives (hashing on the way) instead of buffering it and writing a temp copy
+    with track_stage("upload_spool"):
+        document, digest = await spool_request_stream(request.stream())
 
-        # Process the file bytes
-        extracted_data = process_w9_from_bytes(file_bytes)
+    try:
+        extracted_data = await process_w9_document(document, digest)
 
         return JSONResponse(content={"extracted_data": extracted_data})
 
+    except BackendUnavailable:
+        raise
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/cache-stats")
+def cache_stats():
+    """Reports result cache hits and misses."""
+    return result_cache.stats()
+
+
+@app.get("/endpoint-stats")
+def endpoint_stats():
+    """Reports outstanding requests and ejection state for each Azure endpoint in the pool."""
+    return azure_endpoint_pool.status()
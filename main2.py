@@ -1,350 +1,178 @@
-import os
-import sys
+from app.configuration.environment import load_environment
+
+load_environment()
+
+import asyncio
 import base64
-import tempfile
-from pathlib import Path
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import APIRouter, FastAPI, Header, HTTPException
 from pydantic import BaseModel
-from azure.ai.formrecognizer import DocumentAnalysisClient
-from azure.core.credentials import AzureKeyCredential
-from dotenv import load_dotenv
-from app.services.city_state_extraction import extract_city_state_zip
-import logging
+from app.services.city_state_extraction import resolve_city_state_zip, resolve_city_state_zip_async, get_bedrock_client
+from app.services.async_form_extraction import AsyncW9FormExtraction
+from app.services.field_mapper import FieldMapper
+from app.services.formatting_result import W9_FIELD_TABLE
+from app.services.date_normalizer import normalize_date
+from app.services.metrics import timed
+from app.services.client_registry import close_all_clients, close_all_async_clients, get_async_document_analysis_client
+from app.services.endpoint_pool import azure_endpoint_pool
+from app.services.result_cache import result_cache
+from app.services.result_store import result_store
+from app.services.request_coalescer import IdempotencyKeyReused
+from app.services.upload_stream import UploadTooLarge, MAX_UPLOAD_BYTES
+from app.api.job_router import router as job_router
+from app.api.form_upload_router import router as form_upload_router
+from app.api.batch_upload_router import router as batch_upload_router, BATCH_MAX_BODY_BYTES
+from app.api.result_store_router import router as result_store_router
+from app.api.packet_router import router as packet_router
+from app.api.upload_limits import MaxBodySizeMiddleware, upload_too_large_handler
+from app.api.backend_errors import backend_unavailable_handler
+from app.services.resilience import BackendUnavailable
+from app.api.metrics_router import router as metrics_router, MetricsMiddleware
+from app.configuration.logger_setup import Logger
 import re
 
-load_dotenv()
-
-# Logger setup
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
-app = FastAPI()
 
-STATE_NAME_TO_ABBR = {
-    # US States
-    "Alabama": "AL", "Alaska": "AK", "Arizona": "AZ", "Arkansas": "AR", 
-    "California": "CA", "Colorado": "CO", "Connecticut": "CT", "Delaware": "DE",
-    "Florida": "FL", "Georgia": "GA", "Hawaii": "HI", "Idaho": "ID",
-    "Illinois": "IL", "Indiana": "IN", "Iowa": "IA", "Kansas": "KS",
-    "Kentucky": "KY", "Louisiana": "LA", "Maine": "ME", "Maryland": "MD",
-    "Massachusetts": "MA", "Michigan": "MI", "Minnesota": "MN", "Mississippi": "MS",
-    "Missouri": "MO", "Montana": "MT", "Nebraska": "NE", "Nevada": "NV",
-    "New Hampshire": "NH", "New Jersey": "NJ", "New Mexico": "NM", "New York": "NY",
-    "North Carolina": "NC", "North Dakota": "ND", "Ohio": "OH", "Oklahoma": "OK",
-    "Oregon": "OR", "Pennsylvania": "PA", "Rhode Island": "RI", "South Carolina": "SC",
-    "South Dakota": "SD", "Tennessee": "TN", "Texas": "TX", "Utah": "UT",
-    "Vermont": "VT", "Virginia": "VA", "Washington": "WA", "West Virginia": "WV",
-    "Wisconsin": "WI", "Wyoming": "WY", "District of Columbia": "DC",
-    
-    # Indian States
-    "Rajasthan": "RJ",
-    "Andhra Pradesh": "AP", "Arunachal Pradesh": "AR", "Assam": "AS", "Bihar": "BR", 
-    "Chhattisgarh": "CG", "Goa": "GA", "Gujarat": "GJ", "Haryana": "HR", 
-    "Himachal Pradesh": "HP", "Jharkhand": "JH", "Karnataka": "KA", "Kerala": "KL", 
-    "Madhya Pradesh": "MP", "Maharashtra": "MH", "Manipur": "MN", "Meghalaya": "ML", 
-    "Mizoram": "MZ", "Nagaland": "NL", "Odisha": "OD", "Punjab": "PB", 
-    "Sikkim": "SK", "Tamil Nadu": "TN", "Telangana": "TG", "Tripura": "TR", 
-    "Uttar Pradesh": "UP", "Uttarakhand": "UK", "West Bengal": "WB"
-}
+# Bump whenever the output of this module's format_extracted_json changes so cached results are not reused
+FORMATTER_VERSION = "main2-5"
 
-# List of US States (Full Names and Abbreviations)
-STATES = {
-    "Alabama", "Alaska", "Arizona", "Arkansas", "California", "Colorado", "Connecticut",
-    "Delaware", "Florida", "Georgia", "Hawaii", "Idaho", "Illinois", "Indiana", "Iowa",
-    "Kansas", "Kentucky", "Louisiana", "Maine", "Maryland", "Massachusetts", "Michigan",
-    "Minnesota", "Mississippi", "Missouri", "Montana", "Nebraska", "Nevada", "New Hampshire",
-    "New Jersey", "New Mexico", "New York", "North Carolina", "North Dakota", "Ohio",
-    "Oklahoma", "Oregon", "Pennsylvania", "Rhode Island", "South Carolina", "South Dakota",
-    "Tennessee", "Texas", "Utah", "Vermont", "Virginia", "Washington", "West Virginia","Rajasthan",
-    "Wisconsin", "Wyoming", "District of Columbia"
-}
+# Same key table as formatting_result; only the output fields differ (City/State/ZipCode are split)
+W9_OUTPUT_FIELDS = ("Entity Name", "Business Name", "Address", "City", "State", "ZipCode", "SSN", "EIN", "Date", "Signature")
+# Mapped key whose value is split into City/State/ZipCode instead of being copied as is
+ADDRESS_FIELD = "City/State/Zip Code"
 
-STATE_ABBREVIATIONS = {
-    "AL", "AK", "AZ", "AR", "CA", "CO", "CT", "DE", "FL", "GA", "HI", "ID", "IL", "IN", "IA",
-    "KS", "KY", "LA", "ME", "MD", "MA", "MI", "MN", "MS", "MO", "MT", "NE", "NV", "NH", "NJ",
-    "NM", "NY", "NC", "ND", "OH", "OK", "OR", "PA", "RI", "SC", "SD", "TN", "TX", "UT", "VT","RJ",
-    "VA", "WA", "WV", "WI", "WY", "DC"
-}
+W9_FIELD_MAPPER = FieldMapper(W9_FIELD_TABLE, W9_OUTPUT_FIELDS)
+REVISION_PATTERN = re.compile(r"\bRev\.\s*([A-Za-z]+)\s*(\d{4})", re.IGNORECASE)
 
-INDIAN_STATES = {
-    "Andhra Pradesh", "Arunachal Pradesh", "Assam", "Bihar", "Chhattisgarh", "Goa", "Gujarat",
-    "Haryana", "Himachal Pradesh", "Jharkhand", "Karnataka", "Kerala", "Madhya Pradesh",
-    "Maharashtra", "Manipur", "Meghalaya", "Mizoram", "Nagaland", "Odisha", "Punjab",
-    "Rajasthan", "Sikkim", "Tamil Nadu", "Telangana", "Tripura", "Uttar Pradesh",
-    "Uttarakhand", "West Bengal"
-}
-
-# Create combined sets for easier validation
-ALL_STATES = STATES.union(STATE_ABBREVIATIONS).union(INDIAN_STATES)
-
-def parse_address(address_str):
-    """
-    Parses an address string and extracts City, State, and Zip Code.
-    
-    :param address_str: A string containing city, state, and zip code.
-    :return: A dictionary with 'City', 'State', and 'ZipCode' or an error message.
-    """
-    result = {
-        "City": {"value": None, "confidence": None},
-        "State": {"value": None, "confidence": None},
-        "ZipCode": {"value": None, "confidence": None}
-    }
-    
-    if not address_str:
-        return result
-    
-    # First, try to extract the zip code from the end of the string
-    zip_pattern = re.compile(r'(\d{5,6}(?:-\d{4})?)$')
-    zip_match = zip_pattern.search(address_str)
-    
-    if not zip_match:
-        logger.warning(f"No valid ZIP code found in: {address_str}")
-        return result
-    
-    zip_code = zip_match.group(1)
-    result["ZipCode"]["value"] = zip_code
-    
-    # Remove the zip code from the original string
-    address_without_zip = address_str[:zip_match.start()].strip()
-    
-    # Now try to find a valid state in what's left
-    remaining_parts = address_without_zip.replace(",", " ").split()
-    
-    # Try to find valid state working backwards
-    state_found = False
-    for i in range(len(remaining_parts), 0, -1):
-        # Check individual words
-        if remaining_parts[i-1] in ALL_STATES:
-            state = remaining_parts[i-1]
-            city = " ".join(remaining_parts[:i-1])
-            state_found = True
-            break
-        
-        # Check two-word states (like New York)
-        if i >= 2 and " ".join(remaining_parts[i-2:i]) in ALL_STATES:
-            state = " ".join(remaining_parts[i-2:i])
-            city = " ".join(remaining_parts[:i-2])
-            state_found = True
-            break
-        
-        # Check three-word states (like North/South Carolina/Dakota)
-        if i >= 3 and " ".join(remaining_parts[i-3:i]) in ALL_STATES:
-            state = " ".join(remaining_parts[i-3:i])
-            city = " ".join(remaining_parts[:i-3])
-            state_found = True
-            break
-    
-    if state_found:
-        result["City"]["value"] = city.strip()
-        # Convert state name to abbreviation if it's a full name
-        if state in STATE_NAME_TO_ABBR:
-            result["State"]["value"] = STATE_NAME_TO_ABBR[state]
-        # If it's already an abbreviation, keep it as is
-        elif state in STATE_ABBREVIATIONS:
-            result["State"]["value"] = state
-        # Otherwise, store the original value
-        else:
-            result["State"]["value"] = state
-    else:
-        logger.warning(f"No valid state found in: {address_without_zip}")
-    
-    return result
 
-class W9FormExtraction:
-    def __init__(self):
-        self.azure_endpoint = os.getenv("AZURE_ENDPOINT")
-        self.azure_api_key = os.getenv("AZURE_API_KEY")
+class W9FormExtraction(AsyncW9FormExtraction):
+    """Async extractor producing this module's split City/State/ZipCode output."""
 
-    def client(self):
-        """Initialize Azure Form Recognizer client"""
-        return DocumentAnalysisClient(self.azure_endpoint, AzureKeyCredential(self.azure_api_key))
+    formatter_version = FORMATTER_VERSION
 
-    def extract_form_data(self, pdf_path):
-        try:
-            document_ai_client = self.client()
-            with open(pdf_path, "rb") as file:
-                poller = document_ai_client.begin_analyze_document("prebuilt-document", document=file)
-            result = poller.result(timeout=30)
-            
-            extracted_json = {}
-            for kv_pair in result.key_value_pairs:
-                key = kv_pair.key.content.strip() if kv_pair.key and kv_pair.key.content else None
-                value = kv_pair.value.content.strip() if kv_pair.value and kv_pair.value.content else None
-                confidence = kv_pair.confidence
-                
-                if key:
-                    extracted_json[key] = {"value": value, "confidence": confidence}
-            
-            logger.info(f"Extracted JSON: {extracted_json}")
-            formatted_json = format_extracted_json(result, extracted_json)
-            return formatted_json
-        except Exception as e:
-            logger.error(f"Error extracting form: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Error extracting form: {str(e)}")
+    async def format_result(self, result, extracted_json):
+        # Resolve City/State/Zip up front (locally, or concurrently on Bedrock) so formatting never blocks the event loop
+        address_keys = [k for k in extracted_json if W9_FIELD_MAPPER.match(k) == ADDRESS_FIELD]
+        parsed_addresses = await asyncio.gather(
+            *(resolve_city_state_zip_async(extracted_json[k]["value"]) for k in address_keys)
+        )
+        return format_extracted_json(result, extracted_json, dict(zip(address_keys, parsed_addresses)))
 
 
-def format_extracted_json(result, extracted_json):
+@timed("formatting")
+def format_extracted_json(result, extracted_json, parsed_addresses=None):
     try:
-        pattern = r"\bRev\.\s*([A-Za-z]+)\s*(\d{4})"
-        match = re.search(pattern, result.content, re.IGNORECASE)
+        match = REVISION_PATTERN.search(result.content)
         revision = f"{match.group(1)} {match.group(2)}" if match else ""
-        
-        formatted_json = {
-            "Entity Name": {"value": None, "confidence": None},
-            "Business Name": {"value": None, "confidence": None},
-            "Address": {"value": None, "confidence": None},
-            "City": {"value": None, "confidence": None},
-            "State": {"value": None, "confidence": None},
-            "ZipCode": {"value": None, "confidence": None},
-            "SSN": {"value": None, "confidence": None},
-            "EIN": {"value": None, "confidence": None},
-            "Date": {"value": None, "confidence": None},
-            "Signature": {"value": None, "confidence": None},
-            "W9 Form Revision": revision
-        }
+
+        formatted_json = W9_FIELD_MAPPER.empty_record()
+        formatted_json["W9 Form Revision"] = revision
 
         for k, v in extracted_json.items():
-            if "Name" in k:
-                formatted_json["Entity Name"]["value"] = v["value"]
-                formatted_json["Entity Name"]["confidence"] = v["confidence"]
-            elif "Business name" in k:
-                formatted_json["Business Name"]["value"] = v["value"]
-                formatted_json["Business Name"]["confidence"] = v["confidence"]
-            elif "City, state, and ZIP code" in k:
-                parsed_address = extract_city_state_zip(v["value"])  # Use AWS Bedrock
+            field = W9_FIELD_MAPPER.match(k)
+            if field is None:
+                continue
+            if field == ADDRESS_FIELD:
+                if parsed_addresses and k in parsed_addresses:
+                    parsed_address = parsed_addresses[k]
+                else:
+                    parsed_address = resolve_city_state_zip(v["value"])  # Local parser, Bedrock when unsure
                 confidence = v["confidence"]
                 if parsed_address:
                     formatted_json["City"] = {"value": parsed_address.get("City", None), "confidence": confidence}
                     formatted_json["State"] = {"value": parsed_address.get("State", None), "confidence": confidence}
                     formatted_json["ZipCode"] = {"value": parsed_address.get("Zip Code", None), "confidence": confidence}
                 else:
-                    Logger.warning(f"Bedrock failed to parse City/State/Zip from: {v['value']}")
-            elif "Employer identification number" in k:
-                formatted_json["EIN"]["value"] = v["value"]
-                formatted_json["EIN"]["confidence"] = v["confidence"]
-            elif "Social security number" in k:
-                formatted_json["SSN"]["value"] = v["value"]
-                formatted_json["SSN"]["confidence"] = v["confidence"]
-            elif "Date" in k:
-                # Format the date as YYYY-MM-DD (with hyphens)
-                if v["value"]:
-                    original_date = v["value"].strip()
-                    logger.info(f"Attempting to parse date: {original_date}")
-                    
-                    try:
-                        # First try a direct approach for the most common formats
-                        date_str = original_date
-                        
-                        # Specific handling for "Month DD, YYYY" format (including abbreviated months)
-                        month_pattern = re.compile(r'(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\.?\s+(\d{1,2})(?:st|nd|rd|th)?,?\s+(\d{4})', re.IGNORECASE)
-                        month_match = month_pattern.search(date_str)
-                        
-                        if month_match:
-                            logger.info(f"Found month pattern match: {month_match.groups()}")
-                            month_abbr = month_match.group(1).lower()
-                            day = int(month_match.group(2))
-                            year = month_match.group(3)
-                            
-                            # Map month abbreviation to number
-                            month_map = {
-                                "jan": "01", "feb": "02", "mar": "03", "apr": "04", "may": "05", "jun": "06",
-                                "jul": "07", "aug": "08", "sep": "09", "oct": "10", "nov": "11", "dec": "12"
-                            }
-                            
-                            month = month_map.get(month_abbr.lower())
-                            if month:
-                                formatted_date = f"{year}-{month}-{str(day).zfill(2)}"
-                                logger.info(f"Successfully parsed date to: {formatted_date}")
-                                formatted_json["Date"]["value"] = formatted_date
-                            else:
-                                logger.warning(f"Could not map month abbreviation: {month_abbr}")
-                                formatted_json["Date"]["value"] = original_date
-                        else:
-                            # If the specific pattern didn't match, try standard datetime parsing
-                            from datetime import datetime
-                            
-                            # Common date formats to try
-                            date_formats = [
-                                "%m/%d/%Y", "%d/%m/%Y", "%m-%d-%Y", "%d-%m-%Y", "%B %d, %Y",
-                                "%d %B %Y", "%Y/%m/%d", "%Y-%m-%d", "%d.%m.%Y", "%m.%d.%Y", "%Y.%m.%d",
-                                "%m-%d-%y", "%d-%m-%y", "%m/%d/%y", "%d/%m/%y", 
-                                "%b %d, %Y", "%d %b %Y", "%b %d %Y", "%Y %b %d"
-                            ]
-                            
-                            parsed_date = None
-                            
-                            for fmt in date_formats:
-                                try:
-                                    logger.info(f"Trying format: {fmt}")
-                                    parsed_date = datetime.strptime(date_str, fmt)
-                                    logger.info(f"Success with format: {fmt}")
-                                    break
-                                except ValueError:
-                                    continue
-                            
-                            if parsed_date:
-                                # Format in YYYY-MM-DD with hyphens
-                                formatted_date = parsed_date.strftime("%Y-%m-%d")
-                                logger.info(f"Successfully parsed date to: {formatted_date}")
-                                formatted_json["Date"]["value"] = formatted_date
-                            else:
-                                # Last resort: try to extract just digits
-                                logger.warning(f"All standard date parsing failed for: {date_str}")
-                                digits = re.findall(r'\d+', date_str)
-                                
-                                if len(digits) == 3:
-                                    logger.info(f"Found 3 digits: {digits}")
-                                    # Assume day, month, year if first number is ≤ 31 and second is ≤ 12
-                                    if len(digits[0]) <= 2 and int(digits[0]) <= 31 and len(digits[1]) <= 2 and int(digits[1]) <= 12:
-                                        # Make sure year is 4 digits
-                                        year = digits[2]
-                                        if len(year) == 2:
-                                            prefix = "20" if int(year) < 50 else "19"
-                                            year = prefix + year
-                                        
-                                        day = digits[0].zfill(2)
-                                        month = digits[1].zfill(2)
-                                        formatted_date = f"{year}-{month}-{day}"
-                                        logger.info(f"Parsed from digits to: {formatted_date}")
-                                        formatted_json["Date"]["value"] = formatted_date
-                                    else:
-                                        logger.warning(f"Digit pattern didn't match expected ranges")
-                                        formatted_json["Date"]["value"] = original_date
-                                else:
-                                    logger.warning(f"Could not parse date: {date_str}")
-                                    formatted_json["Date"]["value"] = original_date
-                    
-                    except Exception as e:
-                        logger.error(f"Error parsing date {original_date}: {str(e)}")
-                        formatted_json["Date"]["value"] = original_date
-                formatted_json["Date"]["confidence"] = v["confidence"]       
-            elif "Signature" in k:
-                formatted_json["Signature"]["value"] = v["value"]
-                formatted_json["Signature"]["confidence"] = v["confidence"]
-            elif "Address" in k:
-                formatted_json["Address"]["value"] = v["value"]
-                formatted_json["Address"]["confidence"] = v["confidence"]
-        
+                    Logger.warning("Bedrock failed to parse City/State/Zip from: %s", v["value"])
+            elif field == "Date":
+                value = normalize_date(v["value"]) if v["value"] else formatted_json["Date"]["value"]
+                formatted_json["Date"] = {"value": value, "confidence": v["confidence"]}
+            else:
+                formatted_json[field] = {"value": v["value"], "confidence": v["confidence"]}
+
         return formatted_json
     except Exception as e:
-        logger.error(f"Error during formatting: {str(e)}")
+        Logger.error("Error during formatting: %s", e)
         return {"error": f"Error during formatting: {str(e)}"}
 
+
+w9_form_extractor = W9FormExtraction()
+
+
+router = APIRouter()
+
+
 class FileBase64Request(BaseModel):
     file_base64: str
 
-@app.post("/extract-w9")
-async def extract_w9(request: FileBase64Request):
+@router.post("/extract-w9")
+async def extract_w9(request: FileBase64Request, idempotency_key: Optional[str] = Header(None)):
+    """
+    Extracts a base64-encoded W9. A retry carrying the same Idempotency-Key (or
+    the same document) while the first is still running waits for its result
+    instead of starting another analysis.
+    """
     try:
         file_bytes = base64.b64decode(request.file_base64)
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_pdf:
-            temp_pdf.write(file_bytes)
-            temp_pdf_path = temp_pdf.name
-        
-        extractor = W9FormExtraction()
-        result = extractor.extract_form_data(temp_pdf_path)
-        os.remove(temp_pdf_path)  # Clean up temp file
-        return {"extracted_data": result}
+        if len(file_bytes) > MAX_UPLOAD_BYTES:
+            raise UploadTooLarge(MAX_UPLOAD_BYTES)
+        result = await w9_form_extractor.extract_form_bytes(file_bytes, idempotency_key)
+    except (UploadTooLarge, BackendUnavailable):
+        raise
+    except IdempotencyKeyReused as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
-        logger.error(f"Error processing file: {str(e)}")
+        Logger.error("Error processing file: %s", e)
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
+
+    if "error" in result:
+        raise HTTPException(status_code=500, detail=result["error"])
+    return {"extracted_data": result}
+
+
+@router.get("/cache-stats")
+def cache_stats():
+    """Reports result cache hits and misses."""
+    return result_cache.stats()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs in every worker after it is forked, so each builds its own pooled Azure clients before taking traffic
+    for endpoint in azure_endpoint_pool.endpoints:
+        get_async_document_analysis_client(endpoint.endpoint, endpoint.api_key)
+    # Bedrock is only needed for low-confidence addresses; build it in the background rather than delay readiness
+    asyncio.get_running_loop().run_in_executor(None, get_bedrock_client)
+    yield
+    await close_all_async_clients()
+    close_all_clients()
+    if result_store is not None:
+        result_store.close()
+
+
+def create_app():
+    """
+    Builds the API with every router mounted. Called once below: gunicorn_conf.py
+    and `uvicorn main2:app` both serve the module-level app.
+    """
+    app = FastAPI(lifespan=lifespan)
+    # The PDF arrives base64-encoded inside JSON, so allow for the 4/3 expansion plus the envelope
+    app.add_middleware(
+        MaxBodySizeMiddleware,
+        max_bytes=MAX_UPLOAD_BYTES * 4 // 3 + 1024,
+        route_max_bytes={"/batch": BATCH_MAX_BODY_BYTES},
+    )
+    app.add_exception_handler(UploadTooLarge, upload_too_large_handler)
+    app.add_exception_handler(BackendUnavailable, backend_unavailable_handler)
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(router)
+    app.include_router(form_upload_router)
+    app.include_router(batch_upload_router)
+    app.include_router(job_router)
+    app.include_router(result_store_router)
+    app.include_router(packet_router)
+    app.include_router(metrics_router)
+    return app
+
+
+app = create_app()
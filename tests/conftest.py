@@ -0,0 +1,22 @@
+import base64
+import os
+
+import pytest
+
+# Keep the result store from opening w9_results.db in the working directory when app modules are imported
+os.environ.setdefault("RESULT_STORE_DB_PATH", "")
+
+
+class FakeCipher:
+    """Same interface as cryptography's Fernet, which is not needed to run the tests; base64 stands in for the encryption."""
+
+    def encrypt(self, data):
+        return base64.b64encode(data[::-1])
+
+    def decrypt(self, token):
+        return base64.b64decode(token)[::-1]
+
+
+@pytest.fixture
+def tin_cipher():
+    return FakeCipher()
@@ -0,0 +1,99 @@
+import asyncio
+import io
+import zipfile
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import batch_upload_router
+
+
+class FakeExtractor:
+    """Answers with the document's text as the EIN; documents starting with "bad" fail."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def extract_form_bytes(self, file_bytes):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            # Later files finish first, so the response order cannot come from completion order
+            await asyncio.sleep(0.01 / len(file_bytes))
+            if file_bytes.startswith(b"bad"):
+                return {"error": "Error extracting form: bad page"}
+            return {"EIN": file_bytes.decode()}
+        finally:
+            self.in_flight -= 1
+
+
+async def no_rate_limit(tenant_id):
+    pass
+
+
+@pytest.fixture
+def extractor(monkeypatch):
+    extractor = FakeExtractor()
+    monkeypatch.setattr(batch_upload_router, "w9_form_extractor", extractor)
+    monkeypatch.setattr(batch_upload_router.tenant_rate_limiter, "acquire", no_rate_limit)
+    return extractor
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(batch_upload_router.router)
+    return TestClient(app)
+
+
+def zip_of(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data in members:
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def test_results_come_back_in_input_order(extractor, client):
+    files = [
+        ("files", ("a.pdf", b"a")),
+        ("files", ("notes.txt", b"text")),
+        ("files", ("forms.zip", zip_of([("b.pdf", b"bb"), ("readme.md", b"#"), ("c.pdf", b"bad-ccc")]))),
+        ("files", ("d.pdf", b"dddd")),
+        ("files", ("broken.zip", b"not a zip")),
+    ]
+    response = client.post("/batch", files=files)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [(entry["filename"], entry["status"]) for entry in body["results"]] == [
+        ("a.pdf", "succeeded"),
+        ("notes.txt", "failed"),
+        ("forms.zip/b.pdf", "succeeded"),
+        ("forms.zip/readme.md", "failed"),
+        ("forms.zip/c.pdf", "failed"),
+        ("d.pdf", "succeeded"),
+        ("broken.zip", "failed"),
+    ]
+    assert body["results"][2]["extracted_data"] == {"EIN": "bb"}
+    assert (body["total"], body["succeeded"], body["failed"]) == (7, 3, 4)
+
+
+def test_files_are_read_and_extracted_at_most_concurrency_at_a_time(extractor, client, monkeypatch):
+    monkeypatch.setattr(batch_upload_router, "BATCH_MAX_CONCURRENCY", 2)
+    files = [("files", (f"{index}.pdf", b"x" * (index + 1))) for index in range(6)]
+    response = client.post("/batch", files=files)
+
+    assert response.json()["succeeded"] == 6
+    assert extractor.max_in_flight == 2
+
+
+def test_oversized_file_fails_alone(extractor, client, monkeypatch):
+    monkeypatch.setattr(batch_upload_router, "BATCH_MAX_FILE_BYTES", 3)
+    files = [("files", ("small.pdf", b"ok")), ("files", ("large.zip", zip_of([("large.pdf", b"xxxx")])))]
+    results = client.post("/batch", files=files).json()["results"]
+
+    assert [entry["status"] for entry in results] == ["succeeded", "failed"]
+    assert results[1]["error"] == "File exceeds the maximum allowed size."
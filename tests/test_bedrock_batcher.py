@@ -0,0 +1,89 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.services import city_state_extraction
+from app.services.bedrock_batcher import AddressBatcher
+
+
+def parsed(text):
+    city, state = text.split(", ")
+    return {"City": city, "State": state, "Zip Code": None}
+
+
+class FakeBedrock:
+    def __init__(self, batch_answer=None):
+        self.batch_answer = batch_answer
+        self.batches = []
+        self.singles = []
+        self._lock = threading.Lock()
+
+    def invoke_batch(self, texts):
+        self.batches.append(texts)
+        return self.batch_answer(texts) if self.batch_answer else [parsed(text) for text in texts]
+
+    def invoke_single(self, text):
+        with self._lock:
+            self.singles.append(text)
+        return parsed(text)
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        yield executor
+
+
+def submit_all(bedrock, executor, texts):
+    # The batch is sent as soon as every text is in, well inside the window
+    batcher = AddressBatcher(bedrock.invoke_batch, bedrock.invoke_single, executor, window_ms=2000, max_items=len(texts))
+    futures = [batcher.submit(text) for text in texts]
+    return [future.result(timeout=5) for future in futures]
+
+
+def test_addresses_are_resolved_in_one_batch(executor):
+    bedrock = FakeBedrock()
+    texts = ["Austin, TX", "Boise, ID", "Austin, TX"]
+    assert submit_all(bedrock, executor, texts) == [parsed(text) for text in texts]
+    # The repeated address is only sent once
+    assert bedrock.batches == [["Austin, TX", "Boise, ID"]]
+    assert bedrock.singles == []
+
+
+def test_malformed_batch_falls_back_to_one_call_per_address(executor):
+    bedrock = FakeBedrock(batch_answer=lambda texts: None)
+    texts = ["Austin, TX", "Boise, ID", "Denver, CO"]
+    assert submit_all(bedrock, executor, texts) == [parsed(text) for text in texts]
+    assert len(bedrock.batches) == 1
+    assert sorted(bedrock.singles) == sorted(texts)
+
+
+def test_batch_errors_reach_every_waiter(executor):
+    def fail(texts):
+        raise RuntimeError("bedrock down")
+
+    bedrock = FakeBedrock(batch_answer=fail)
+    batcher = AddressBatcher(bedrock.invoke_batch, bedrock.invoke_single, executor, window_ms=2000, max_items=2)
+    futures = [batcher.submit("Austin, TX"), batcher.submit("Boise, ID")]
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result(timeout=5)
+
+
+@pytest.mark.parametrize("answer", [
+    "not json at all",
+    '[{"City": "Austin", "State": "TX", "Zip Code": "78701"}]',
+    '[{"City": "Austin", "State": "TX", "Zip Code": "78701"}, "Boise"]',
+], ids=["unparseable", "too-short", "not-objects"])
+def test_batch_response_that_is_not_one_object_per_address_is_rejected(monkeypatch, answer):
+    monkeypatch.setattr(city_state_extraction, "invoke_claude", lambda prompt, max_tokens: answer)
+    assert city_state_extraction.invoke_bedrock_city_state_zip_batch(["Austin, TX 78701", "Boise, ID 83702"]) is None
+
+
+def test_batch_response_is_read_from_around_the_array(monkeypatch):
+    addresses = [{"City": "Austin", "State": "TX", "Zip Code": "78701"}, {"City": "Boise", "State": "ID", "Zip Code": "83702"}]
+    answer = f"Here are the addresses:\n```json\n{json.dumps(addresses)}\n```"
+    monkeypatch.setattr(city_state_extraction, "invoke_claude", lambda prompt, max_tokens: answer)
+    assert city_state_extraction.invoke_bedrock_city_state_zip_batch(["Austin, TX 78701", "Boise, ID 83702"]) == addresses
@@ -0,0 +1,163 @@
+import asyncio
+import io
+
+import pytest
+
+from app.services import async_form_extraction, form_extraction
+from app.services.async_form_extraction import AsyncW9FormExtraction
+from app.services.form_extraction import W9FormExtraction
+from app.services.pdf_preflight import NotW9Document
+from app.services.request_coalescer import RequestCoalescer
+from app.services.resilience import BackendUnavailable
+from app.services.result_cache import ResultCache
+
+
+class FakeAnalysis:
+    def __init__(self, ein):
+        self.ein = ein
+
+    def to_extracted_json(self):
+        return {"Employer identification number": {"value": self.ein, "confidence": 0.9}}
+
+
+class FakePoller:
+    def __init__(self, analysis):
+        self.analysis = analysis
+
+    def wait(self, timeout=None):
+        pass
+
+    def done(self):
+        return True
+
+    def result(self):
+        return self.analysis
+
+
+class FakeAsyncPoller(FakePoller):
+    async def result(self):
+        return self.analysis
+
+
+class FakeClient:
+    def __init__(self, poller_class, outcome):
+        self.poller_class = poller_class
+        self.outcome = outcome
+        self.calls = 0
+
+    def begin_analyze_document(self, model_id, document, **kwargs):
+        self.calls += 1
+        if isinstance(self.outcome, Exception):
+            raise self.outcome
+        return self.poller_class(self.outcome)
+
+
+class FakeAsyncClient(FakeClient):
+    async def begin_analyze_document(self, model_id, document, **kwargs):
+        return super().begin_analyze_document(model_id, document, **kwargs)
+
+
+class FakePool:
+    def call(self, function):
+        return function("endpoint")
+
+    async def call_async(self, function):
+        return await function("endpoint")
+
+
+class FakeRouter:
+    cache_model_id = "fake-model"
+
+    def analyze(self, analyze_with):
+        return analyze_with("fake-model")
+
+    async def analyze_async(self, analyze_with):
+        return await analyze_with("fake-model")
+
+
+def format_ein(result, extracted_json):
+    return {"EIN": extracted_json["Employer identification number"]}
+
+
+class SyncExtractor(W9FormExtraction):
+    def __init__(self, client):
+        super().__init__(cache=ResultCache(), endpoint_pool=FakePool(), model_router=FakeRouter(), store=None, coalescer=RequestCoalescer(replay_seconds=0))
+        self.fake_client = client
+
+    def client(self, endpoint):
+        return self.fake_client
+
+    def format_result(self, result, extracted_json):
+        return format_ein(result, extracted_json)
+
+
+class AsyncExtractor(AsyncW9FormExtraction):
+    def __init__(self, client):
+        super().__init__(cache=ResultCache(), endpoint_pool=FakePool(), model_router=FakeRouter(), store=None, coalescer=RequestCoalescer(replay_seconds=0))
+        self.fake_client = client
+
+    def client(self, endpoint):
+        return self.fake_client
+
+    async def format_result(self, result, extracted_json):
+        return format_ein(result, extracted_json)
+
+
+@pytest.fixture(autouse=True)
+def azure_only(monkeypatch):
+    # Straight to Azure: no image normalization, AcroForm fast path or preflight on the fake bytes
+    for module in (form_extraction, async_form_extraction):
+        monkeypatch.setattr(module, "IMAGE_NORMALIZATION_ENABLED", False)
+        monkeypatch.setattr(module, "ACROFORM_ENABLED", False)
+        monkeypatch.setattr(module, "PREFLIGHT_ENABLED", False)
+
+
+def run_sync(outcome):
+    client = FakeClient(FakePoller, outcome)
+    extractor = SyncExtractor(client)
+    return client, lambda: extractor.extract_form_bytes(b"%PDF-1.4 fake")
+
+
+def run_async(outcome):
+    client = FakeAsyncClient(FakeAsyncPoller, outcome)
+    extractor = AsyncExtractor(client)
+    return client, lambda: asyncio.run(extractor.extract_form_bytes(b"%PDF-1.4 fake"))
+
+
+@pytest.fixture(params=[run_sync, run_async], ids=["sync", "async"])
+def extraction(request):
+    return request.param
+
+
+def test_result_is_tagged_with_engine_and_cached(extraction):
+    client, extract = extraction(FakeAnalysis("12-3456789"))
+    first = extract()
+    assert first == {"EIN": {"value": "12-3456789", "confidence": 0.9}, "Extraction Engine": "azure"}
+    assert extract() == first
+    assert client.calls == 1
+
+
+def test_not_a_w9_becomes_an_error_body(extraction):
+    client, extract = extraction(NotW9Document("Document does not appear to be a W9 form"))
+    assert extract() == {"error": "Document does not appear to be a W9 form"}
+
+
+def test_other_errors_become_an_error_body_and_are_not_cached(extraction):
+    client, extract = extraction(ValueError("bad page"))
+    assert extract() == {"error": "Error extracting form: bad page"}
+    extract()
+    assert client.calls == 2
+
+
+def test_backend_unavailable_is_raised(extraction):
+    client, extract = extraction(BackendUnavailable("azure", retry_after=5))
+    with pytest.raises(BackendUnavailable):
+        extract()
+
+
+def test_async_extractor_closes_the_stream_it_was_given():
+    client = FakeAsyncClient(FakeAsyncPoller, FakeAnalysis("12-3456789"))
+    stream = io.BytesIO(b"%PDF-1.4 fake")
+    result = asyncio.run(AsyncExtractor(client).extract_document(stream, "digest"))
+    assert result["EIN"]["value"] == "12-3456789"
+    assert stream.closed
@@ -0,0 +1,95 @@
+import pytest
+
+from app.services import job_queue
+from app.services.job_queue import JobQueue, JOB_MAX_ATTEMPTS, QUEUED, RUNNING, SUCCEEDED, FAILED
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    yield queue
+    queue.close()
+
+
+def test_claim_takes_the_oldest_job_once(queue):
+    first = queue.submit(b"%PDF first", "first.pdf")
+    second = queue.submit(b"%PDF second", "second.pdf")
+
+    job = queue.claim()
+    assert (job["id"], job["document"]) == (first, b"%PDF first")
+    assert queue.claim()["id"] == second
+    assert queue.claim() is None
+    assert queue.get(first)["status"] == RUNNING
+
+
+def test_complete_stores_the_result_and_drops_the_document(queue):
+    job_id = queue.submit(b"%PDF")
+    queue.claim()
+    queue.complete(job_id, {"EIN": {"value": "12-3456789", "confidence": 0.9}})
+
+    job = queue.get(job_id)
+    assert job["status"] == SUCCEEDED
+    assert job["result"] == {"EIN": {"value": "12-3456789", "confidence": 0.9}}
+    assert queue._conn.execute("SELECT document FROM jobs WHERE id = ?", (job_id,)).fetchone()["document"] is None
+
+
+def test_failed_attempts_are_retried_until_the_last(queue):
+    job_id = queue.submit(b"%PDF")
+    for attempt in range(1, JOB_MAX_ATTEMPTS + 1):
+        assert queue.claim()["id"] == job_id
+        finished = queue.fail(job_id, "bad page")
+        assert finished == (attempt == JOB_MAX_ATTEMPTS)
+
+    job = queue.get(job_id)
+    assert (job["status"], job["error"], job["attempts"]) == (FAILED, "bad page", JOB_MAX_ATTEMPTS)
+    assert queue.claim() is None
+
+
+def test_deferred_job_waits_without_spending_an_attempt(queue):
+    job_id = queue.submit(b"%PDF")
+    queue.claim()
+    queue.defer(job_id, "Azure unavailable", delay_seconds=60)
+
+    assert queue.claim() is None
+    job = queue.get(job_id)
+    assert (job["status"], job["attempts"]) == (QUEUED, 0)
+
+    queue.defer(job_id, "Azure unavailable", delay_seconds=0)
+    assert queue.claim()["id"] == job_id
+
+
+def test_requeue_stale_returns_abandoned_jobs_to_the_queue(queue):
+    stale = queue.submit(b"%PDF stale")
+    fresh = queue.submit(b"%PDF fresh")
+    queue.claim()
+    queue.claim()
+    queue._conn.execute("UPDATE jobs SET claimed_at = claimed_at - 3600 WHERE id = ?", (stale,))
+
+    assert queue.requeue_stale(stale_after_seconds=600) == (1, [])
+    assert queue.get(stale)["status"] == QUEUED
+    assert queue.get(fresh)["status"] == RUNNING
+    assert queue.claim()["id"] == stale
+
+
+def test_requeue_stale_fails_a_job_that_used_all_its_attempts(queue):
+    job_id = queue.submit(b"%PDF poison")
+    for _ in range(JOB_MAX_ATTEMPTS):
+        queue.claim()
+        queue._conn.execute("UPDATE jobs SET claimed_at = claimed_at - 3600 WHERE id = ?", (job_id,))
+        queue.requeue_stale(stale_after_seconds=600)
+
+    job = queue.get(job_id)
+    assert job["status"] == FAILED
+    assert job["attempts"] == JOB_MAX_ATTEMPTS
+    assert queue.claim() is None
+
+
+def test_requeue_stale_jobs_notifies_the_webhook_of_failed_jobs(queue, monkeypatch):
+    monkeypatch.setattr(job_queue, "WEBHOOK_ALLOWED_HOSTS", {"hooks.example.com"})
+    sent = []
+    monkeypatch.setattr(job_queue, "send_webhook", lambda job: sent.append((job["id"], job["status"])))
+    job_id = queue.submit(b"%PDF poison", webhook_url="https://hooks.example.com/w9")
+    queue._conn.execute("UPDATE jobs SET status = ?, attempts = ?, claimed_at = 0 WHERE id = ?", (RUNNING, JOB_MAX_ATTEMPTS, job_id))
+
+    job_queue.requeue_stale_jobs(queue)
+    assert sent == [(job_id, FAILED)]
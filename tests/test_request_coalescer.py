@@ -0,0 +1,113 @@
+import asyncio
+import io
+import threading
+
+import pytest
+
+from app.services.request_coalescer import RequestCoalescer, IdempotencyKeyReused
+
+
+def test_concurrent_calls_share_one_run():
+    coalescer = RequestCoalescer()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def extract():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"EIN": "12-3456789"}
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(coalescer.run("key", extract, "doc")))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=lambda: results.append(coalescer.run("key", extract, "doc")))
+    follower.start()
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert len(calls) == 1
+    assert results == [{"EIN": "12-3456789"}] * 2
+
+
+def test_async_calls_share_one_run_and_replay_the_result():
+    coalescer = RequestCoalescer()
+    calls = []
+
+    async def extract():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"EIN": "12-3456789"}
+
+    async def main():
+        together = await asyncio.gather(*(coalescer.run_async("key", extract, "doc") for _ in range(3)))
+        return together, await coalescer.run_async("key", extract, "doc")
+
+    together, replayed = asyncio.run(main())
+    assert len(calls) == 1
+    assert together == [{"EIN": "12-3456789"}] * 3
+    assert replayed == {"EIN": "12-3456789"}
+
+
+def test_errors_are_shared_but_not_replayed():
+    coalescer = RequestCoalescer()
+    calls = []
+
+    def extract():
+        calls.append(1)
+        raise ValueError("bad page")
+
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            coalescer.run("key", extract, "doc")
+    assert len(calls) == 2
+
+
+def test_idempotency_key_reused_for_another_document():
+    coalescer = RequestCoalescer()
+    coalescer.run("idempotency:abc", lambda: {"EIN": "12-3456789"}, "doc-1")
+    with pytest.raises(IdempotencyKeyReused):
+        coalescer.run("idempotency:abc", lambda: {"EIN": "98-7654321"}, "doc-2")
+
+
+def test_idempotency_key_reused_while_in_flight():
+    coalescer = RequestCoalescer()
+
+    async def extract():
+        await asyncio.sleep(0.01)
+        return {"EIN": "12-3456789"}
+
+    async def main():
+        leader = asyncio.ensure_future(coalescer.run_async("idempotency:abc", extract, "doc-1"))
+        await asyncio.sleep(0)
+        with pytest.raises(IdempotencyKeyReused):
+            await coalescer.run_async("idempotency:abc", extract, "doc-2")
+        return await leader
+
+    assert asyncio.run(main()) == {"EIN": "12-3456789"}
+
+
+def test_owned_stream_stays_open_until_the_shared_run_is_done():
+    coalescer = RequestCoalescer()
+    leader_stream, follower_stream = io.BytesIO(b"%PDF"), io.BytesIO(b"%PDF")
+    read = []
+
+    async def extract():
+        await asyncio.sleep(0.01)
+        read.append(leader_stream.read())
+        return {"EIN": "12-3456789"}
+
+    async def main():
+        leader = asyncio.ensure_future(coalescer.run_async("key", extract, "doc", leader_stream))
+        await asyncio.sleep(0)
+        # The request that started the run goes away; the run carries on for the follower
+        leader.cancel()
+        result = await coalescer.run_async("key", extract, "doc", follower_stream)
+        assert follower_stream.closed
+        return result
+
+    assert asyncio.run(main()) == {"EIN": "12-3456789"}
+    assert read == [b"%PDF"]
+    assert leader_stream.closed
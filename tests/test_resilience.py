@@ -0,0 +1,141 @@
+import asyncio
+import time
+
+import pytest
+from azure.core.exceptions import HttpResponseError, ServiceResponseError
+from tenacity import wait_none
+
+from app.services import resilience
+from app.services.endpoint_pool import AzureEndpoint, EndpointPool
+from app.services.resilience import AdaptiveConcurrencyLimiter, BackendUnavailable, CircuitBreaker, ResilientBackend
+
+
+class FakeResponse:
+    reason = "Fake"
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def text(self):
+        return ""
+
+
+def http_error(status_code, headers=None):
+    return HttpResponseError(f"HTTP {status_code}", response=FakeResponse(status_code, headers))
+
+
+class Flaky:
+    """Raises the given errors in turn, then returns "ok"; counts its calls."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self, *args):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(resilience, "wait_retry_after", wait_none)
+
+
+def make_backend(max_attempts=3, failure_threshold=5, reset_seconds=30):
+    return ResilientBackend(
+        "test",
+        max_attempts=max_attempts,
+        limiter=AdaptiveConcurrencyLimiter("test", initial=4),
+        breaker=CircuitBreaker("test", failure_threshold=failure_threshold, reset_seconds=reset_seconds),
+    )
+
+
+def test_transient_errors_are_retried():
+    backend = make_backend()
+    function = Flaky(ServiceResponseError("connection reset"), http_error(503))
+    assert backend.call(function) == "ok"
+    assert function.calls == 3
+    assert backend.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_retries_run_out_as_backend_unavailable():
+    backend = make_backend(max_attempts=2)
+    function = Flaky(*[http_error(503)] * 3)
+    with pytest.raises(BackendUnavailable):
+        backend.call(function)
+    assert function.calls == 2
+
+
+def test_other_errors_are_raised_without_retrying():
+    backend = make_backend()
+    function = Flaky(http_error(400))
+    with pytest.raises(HttpResponseError):
+        backend.call(function)
+    assert function.calls == 1
+    assert backend.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_throttled_endpoint_fails_over_and_is_ejected():
+    first, second = AzureEndpoint("https://first.example.com", "key"), AzureEndpoint("https://second.example.com", "key")
+    pool = EndpointPool([first, second])
+    seen = []
+
+    def analyze_on(endpoint):
+        seen.append(endpoint)
+        if endpoint is first:
+            raise http_error(429, {"Retry-After": "30"})
+        return "ok"
+
+    assert pool.call(analyze_on) == "ok"
+    assert seen == [first, second]
+    assert not first.is_healthy(time.monotonic())
+    # While ejected, the first endpoint is not picked again
+    assert pool.call(analyze_on) == "ok"
+    assert seen[-1] is second
+
+
+def test_retries_then_failover_then_the_circuit_opens():
+    endpoints = [AzureEndpoint("https://first.example.com", "key"), AzureEndpoint("https://second.example.com", "key")]
+    pool = EndpointPool(endpoints, eject_seconds=0)
+    backend = make_backend(max_attempts=2, failure_threshold=2)
+    attempts = []
+
+    async def analyze_on(endpoint):
+        attempts.append(endpoint)
+        raise http_error(503)
+
+    async def analyze():
+        return await pool.call_async(analyze_on)
+
+    with pytest.raises(BackendUnavailable):
+        asyncio.run(backend.call_async(analyze))
+    # Each of the two retried attempts failed over across both endpoints
+    assert attempts == endpoints * 2
+    assert backend.breaker.state == CircuitBreaker.OPEN
+
+    # An open circuit answers at once, without calling the backend
+    with pytest.raises(BackendUnavailable) as raised:
+        asyncio.run(backend.call_async(analyze))
+    assert raised.value.retry_after > 0
+    assert len(attempts) == 4
+
+
+def test_half_open_probe_closes_the_circuit():
+    backend = make_backend(max_attempts=1, failure_threshold=1, reset_seconds=0)
+    with pytest.raises(BackendUnavailable):
+        backend.call(Flaky(http_error(503)))
+    assert backend.breaker.state == CircuitBreaker.OPEN
+
+    assert backend.call(Flaky()) == "ok"
+    assert backend.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_throttling_halves_the_concurrency_limit_without_opening_the_circuit():
+    backend = make_backend(max_attempts=1, failure_threshold=1)
+    with pytest.raises(BackendUnavailable):
+        backend.call(Flaky(http_error(429)))
+    assert backend.limiter.limit == 2
+    assert backend.breaker.state == CircuitBreaker.CLOSED
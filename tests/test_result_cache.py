@@ -0,0 +1,56 @@
+import sqlite3
+
+import pytest
+
+from app.services.result_cache import ResultCache, TinSealingCacheTier
+
+RESULT = {
+    "Entity Name": {"value": "Acme LLC", "confidence": 0.9},
+    "EIN": {"value": "12-3456789", "confidence": 0.9},
+    "SSN": {"value": "", "confidence": 0.0},
+}
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "cache.db")
+
+
+def stored_values(db_path):
+    with sqlite3.connect(db_path) as conn:
+        if conn.execute("SELECT name FROM sqlite_master WHERE name = 'result_cache'").fetchone() is None:
+            return []  # the tier never even opened its table
+        return [value for (value,) in conn.execute("SELECT value FROM result_cache")]
+
+
+def test_tin_is_sealed_on_disk_and_restored(db_path, tin_cipher):
+    TinSealingCacheTier(db_path, tin_cipher).set("key", RESULT)
+
+    (stored,) = stored_values(db_path)
+    assert "3456789" not in stored
+    assert "*****6789" in stored
+    # A new process (a fresh tier on the same file) gets the full TIN back
+    assert TinSealingCacheTier(db_path, tin_cipher).get("key") == RESULT
+
+
+def test_tin_bearing_result_stays_in_memory_without_a_key(db_path):
+    cache = ResultCache(disk_tier=TinSealingCacheTier(db_path), name="Test")
+    cache.set("key", RESULT)
+
+    assert cache.get("key") == RESULT
+    assert stored_values(db_path) == []
+
+
+def test_results_without_a_tin_are_stored_as_they_are(db_path):
+    tier = TinSealingCacheTier(db_path)
+    tier.set("key", {"Entity Name": {"value": "Acme LLC", "confidence": 0.9}})
+    assert tier.get("key") == {"Entity Name": {"value": "Acme LLC", "confidence": 0.9}}
+
+
+def test_clear_text_entries_written_before_are_misses(db_path, tin_cipher):
+    tier = TinSealingCacheTier(db_path, tin_cipher)
+    tier.set("key", {"Entity Name": {"value": "Acme LLC", "confidence": 0.9}})
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("UPDATE result_cache SET value = ? WHERE key = 'key'", ('{"EIN": {"value": "12-3456789", "confidence": 0.9}}',))
+
+    assert TinSealingCacheTier(db_path, tin_cipher).get("key") is None
@@ -0,0 +1,70 @@
+import sqlite3
+
+import pytest
+
+from app.services import result_store
+from app.services.result_store import ResultStore
+
+VERSION = "prebuilt-document:v1"
+
+
+def form(name, ein):
+    return {
+        "Entity Name": {"value": name, "confidence": 0.9},
+        "EIN": {"value": ein, "confidence": 0.9},
+        "W9 Form Revision": "March 2024",
+    }
+
+
+@pytest.fixture
+def make_store(tmp_path, monkeypatch, tin_cipher):
+    monkeypatch.setattr(result_store, "build_tin_cipher", lambda key: tin_cipher if key else None)
+    stores = []
+
+    def make_store(encryption_key="key"):
+        store = ResultStore(str(tmp_path / "results.db"), tin_key="secret", encryption_key=encryption_key)
+        stores.append(store)
+        return store
+
+    yield make_store
+    for store in stores:
+        store.close()
+
+
+def test_result_is_served_back_with_its_full_tin(make_store, tmp_path):
+    store = make_store()
+    store.save("doc", VERSION, form("Acme LLC", "12-3456789"))
+
+    assert store.get("doc", VERSION) == form("Acme LLC", "12-3456789")
+    assert store.get("doc", "other-version") is None
+    with sqlite3.connect(tmp_path / "results.db") as conn:
+        (stored,) = conn.execute("SELECT result FROM results").fetchone()
+    assert "3456789" not in stored
+
+
+def test_without_an_encryption_key_results_with_a_tin_are_for_lookups_only(make_store):
+    store = make_store(encryption_key=None)
+    assert not store.serves_tins
+    store.save("doc", VERSION, form("Acme LLC", "12-3456789"))
+
+    assert store.get("doc", VERSION) is None
+    (found,) = store.query(tin="123456789")
+    assert found["result"]["EIN"]["value"] == "*****6789"
+
+
+def test_packet_is_served_back_and_its_forms_are_found_by_lookups(make_store):
+    store = make_store()
+    packet = {"page_count": 5, "chunks": 2, "forms": [dict(form("Acme LLC", "12-3456789"), Pages="1"), dict(form("Beta Inc", "98-7654321"), Pages="3-4")]}
+    store.save_packet("packet", VERSION, packet)
+
+    assert store.get_packet("packet", VERSION) == packet
+    assert [found["entity_name"] for found in store.query(name_prefix="bet")] == ["Beta Inc"]
+
+
+def test_packet_with_a_missing_form_is_not_served(make_store):
+    store = make_store()
+    store.save_packet("packet", VERSION, {"page_count": 2, "chunks": 1, "forms": [form("Acme LLC", "12-3456789")]})
+    store._conn.execute("DELETE FROM results WHERE result_version = ?", (f"{VERSION}:packet:1",))
+
+    assert store.get_packet("packet", VERSION) is None
+    assert store.get_packet("unknown", VERSION) is None
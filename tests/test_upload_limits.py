@@ -0,0 +1,69 @@
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from app.api.upload_limits import MaxBodySizeMiddleware, upload_too_large_handler
+from app.services.upload_stream import UploadTooLarge
+
+
+def make_client(max_bytes=1000, route_max_bytes=None):
+    app = FastAPI()
+    app.add_middleware(MaxBodySizeMiddleware, max_bytes=max_bytes, route_max_bytes=route_max_bytes)
+    app.add_exception_handler(UploadTooLarge, upload_too_large_handler)
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        return {"size": len(await file.read())}
+
+    @app.post("/batch")
+    async def batch(file: UploadFile = File(...)):
+        return {"size": len(await file.read())}
+
+    return TestClient(app)
+
+
+def multipart(size):
+    boundary = "limit-test"
+    return (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"w9.pdf\"\r\n"
+        f"Content-Type: application/pdf\r\n\r\n".encode() + b"x" * size + f"\r\n--{boundary}--\r\n".encode()
+    ), {"content-type": f"multipart/form-data; boundary={boundary}"}
+
+
+def chunked(body, size=100):
+    # A generator body is sent with Transfer-Encoding: chunked and no Content-Length
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+def test_small_upload_passes():
+    body, headers = multipart(500)
+    response = make_client().post("/upload", content=body, headers=headers)
+    assert response.status_code == 200
+    assert response.json() == {"size": 500}
+
+
+def test_declared_content_length_over_limit_is_413():
+    body, headers = multipart(2000)
+    response = make_client().post("/upload", content=body, headers=headers)
+    assert response.status_code == 413
+    assert "1000 bytes" in response.json()["detail"]
+
+
+def test_chunked_body_over_limit_is_413_not_a_parse_error():
+    body, headers = multipart(2000)
+    response = make_client().post("/upload", content=chunked(body), headers=headers)
+    assert response.status_code == 413
+    assert "1000 bytes" in response.json()["detail"]
+
+
+def test_chunked_body_under_limit_passes():
+    body, headers = multipart(500)
+    response = make_client().post("/upload", content=chunked(body), headers=headers)
+    assert response.status_code == 200
+
+
+def test_route_limit_overrides_the_default():
+    body, headers = multipart(2000)
+    client = make_client(route_max_bytes={"/batch": 10_000})
+    assert client.post("/batch", content=chunked(body), headers=headers).status_code == 200
+    assert client.post("/upload", content=chunked(body), headers=headers).status_code == 413